@@ -144,6 +144,25 @@ DATABASES = {
     }
 }
 
+# Optional separate database for reporting data, so that log ingestion doesn't
+# hold the write lock of the default SQLite database. Set REPORTING_DB_NAME to
+# enable it. PostgreSQL (the default engine) enables COPY bulk loading and
+# BRIN indexes. Migrate it with `manage.py migrate --database reporting`.
+# Existing reporting data (including Galaxy servers' API tokens) is not moved
+# automatically - see .env.sample for the steps to copy it.
+REPORTING_DATABASE = {
+    'ENGINE': os.getenv(
+        'REPORTING_DB_ENGINE', 'django.db.backends.postgresql'),
+    'NAME': os.getenv('REPORTING_DB_NAME'),
+    'USER': os.getenv('REPORTING_DB_USER', ''),
+    'PASSWORD': os.getenv('REPORTING_DB_PASSWORD', ''),
+    'HOST': os.getenv('REPORTING_DB_HOST', ''),
+    'PORT': os.getenv('REPORTING_DB_PORT', ''),
+} if os.getenv('REPORTING_DB_NAME') else None
+if REPORTING_DATABASE:
+    DATABASES['reporting'] = REPORTING_DATABASE
+DATABASE_ROUTERS = ['labs_engine.reporting.db.ReportingRouter']
+
 CACHE_TABLE_NAME = 'django_cache'
 CACHES = {
     'default': {
@@ -152,6 +171,31 @@ CACHES = {
     }
 }
 
+# Rendered lab pages are cached in each worker's memory, then in Redis (if
+# LABS_CACHE_REDIS_URL is set), then in the default database cache. Use a
+# separate Redis database from RQ, because clearing the cache flushes it.
+LABS_CACHE_REDIS_URL = os.getenv('LABS_CACHE_REDIS_URL')
+if LABS_CACHE_REDIS_URL:
+    CACHES['redis'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': LABS_CACHE_REDIS_URL,
+    }
+CACHES['labs'] = {
+    'BACKEND': 'labs_engine.labs.tiered_cache.TieredCache',
+    'LOCATION': 'labs',
+    'TIMEOUT': None,
+    'OPTIONS': {
+        'TIERS': ['redis', 'default'] if LABS_CACHE_REDIS_URL else ['default'],
+        # Memory for lab pages in each worker process
+        'MAX_BYTES': int(os.getenv('LABS_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+        # Pages changed by another process may be served for this long
+        'SYNC_SECONDS': 1,
+        # Pages are read from the shared tiers at least this often, in case
+        # an invalidation is missed
+        'LOCAL_TIMEOUT': 60,
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -191,6 +235,31 @@ RECAPTCHA_PUBLIC_KEY = os.environ.get('RECAPTCHA_SITE_KEY', '')
 RECAPTCHA_PRIVATE_KEY = os.environ.get('RECAPTCHA_SECRET_KEY', '')
 
 GITHUB_API_TOKEN = os.getenv('GITHUB_API_TOKEN')
+# Pool of GitHub API tokens - requests use whichever has most rate limit left
+GITHUB_API_TOKENS = list(dict.fromkeys(
+    token.strip()
+    for token in [
+        GITHUB_API_TOKEN or '',
+        *os.getenv('GITHUB_API_TOKENS', '').split(','),
+    ]
+    if token.strip()
+))
+# Requests left per token which are kept in reserve, as concurrent workers
+# may spend the budget before they see each other's responses
+GITHUB_RATE_LIMIT_RESERVE = 5
+
+# Lab contributors' GitHub profiles are requested with this backend: 'graphql',
+# 'rest' or 'local' (see labs/github.py). The default is 'graphql' if
+# GITHUB_API_TOKENS is set, otherwise 'rest'.
+GITHUB_USERS_BACKEND = os.getenv('GITHUB_USERS_BACKEND')
+# Days before stored profiles, and users not found, are requested again
+GITHUB_USER_REFRESH_DAYS = 30
+GITHUB_USER_NOT_FOUND_REFRESH_DAYS = 7
+# Serve contributor avatars from this site, rather than linking to GitHub
+GITHUB_AVATAR_PROXY = (
+    os.getenv('GITHUB_AVATAR_PROXY', '').lower() in ('1', 'true'))
+GITHUB_AVATAR_SIZE = 96
+GITHUB_AVATAR_CACHE_SECONDS = 60 * 60 * 24 * 7
 
 # OpenAI API key used by the AI-powered "Bootstrap a Lab" feature.
 OPENAI_API_KEY = os.getenv('GALAXY_OPENAI_API_KEY')
@@ -208,10 +277,76 @@ RQ_QUEUES = {
 # (automated by GH workflow in galaxyproject/galaxy_codex)
 CACHE_TIMEOUT = None
 
+# Seconds that browsers and proxies may reuse a cached lab page before
+# revalidating it with its ETag (at most CACHE_TIMEOUT)
+CACHE_CONTROL_MAX_AGE = 60 * 5
+
+# Labs are rendered to static files here by the bake_labs command, for nginx
+# to serve directly. nginx must be reloaded to pick up newly baked labs.
+LABS_BAKE_ROOT = Path(os.getenv('LABS_BAKE_ROOT', BASE_DIR / 'baked'))
+
 # Labs that haven't been requested in more than this many days will be deleted
 # from the cache during a cache update.
 CACHE_UPDATE_RETAIN_DAYS = 30
 
+# Cached labs are evicted, least frequently ('lfu') or least recently ('lru')
+# used first, when their total compressed size exceeds this many bytes
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_EVICTION_POLICY = 'lfu'
+
+# A lab is only cached once it has been requested this many times within
+# CACHE_ADMISSION_WINDOW_SECONDS, so that typos and probes aren't cached
+CACHE_ADMIT_AFTER_REQUESTS = 2
+CACHE_ADMISSION_WINDOW_SECONDS = 60 * 60 * 24
+
+# The warm_cache command renders this many labs, ranked by cache hits and
+# visits over this many days
+CACHE_WARM_TOP_LABS = 50
+CACHE_WARM_TRAFFIC_DAYS = 7
+# Written by warm_cache to mark the deployment ready (see /ready). It must not
+# outlive the container, so it is kept out of any mounted volume.
+CACHE_WARM_MARKER = Path(
+    os.getenv('CACHE_WARM_MARKER', '/tmp/labs_engine_warm.json'))
+
+# Seconds that cached lab accesses are counted in memory before being written
+# to the database
+CACHE_ACCESS_FLUSH_SECONDS = 60
+
+# Reporting events older than this many days are moved to the Parquet archive
+# by the archive_events management command.
+REPORTING_ARCHIVE_ROOT = Path(
+    os.getenv('REPORTING_ARCHIVE_ROOT', BASE_DIR / 'reporting_archive'))
+REPORTING_ARCHIVE_AFTER_DAYS = 365
+
+# Seconds that API tokens are cached per process, and that last_used
+# timestamps are held before being written to the database
+API_TOKEN_CACHE_SECONDS = 60
+API_TOKEN_LAST_USED_FLUSH_SECONDS = 60
+
+# Uploaded logs are spooled here and imported by an RQ worker, which must
+# share this filesystem with the web workers.
+REPORTING_UPLOAD_SPOOL_DIR = TEMP_DIR / 'reporting_uploads'
+REPORTING_IMPORT_JOB_TIMEOUT = 60 * 60
+
+# Tool use counts towards the "trending" ranking halve after this many days.
+# Run the rebuild_tool_trends management command after changing this, and once
+# after upgrading to a release with trends (until then tools are ranked by
+# counting events, which is slow).
+REPORTING_TRENDING_HALF_LIFE_DAYS = 7
+# Default and maximum number of tools returned by the tools API
+REPORTING_TOOLS_LIST_LIMIT = 100
+REPORTING_TOOLS_LIST_MAX_LIMIT = 1000
+
+# A tool launch within this many minutes of a visit to the same lab by the
+# same client counts as a conversion. At most this many recent visits are held
+# in memory by the tail_logs command to find conversions.
+REPORTING_FUNNEL_WINDOW_MINUTES = 30
+REPORTING_FUNNEL_MAX_CLIENTS = 100000
+
+# Seconds that usage and CSV report results are cached. Results are also
+# invalidated whenever a log import commits.
+REPORTING_CACHE_TIMEOUT = 60 * 60 * 24
+
 # Bioblend API response cache timeout (24 hours in development)
 BIOBLEND_CACHE_TTL = 60 * 60 * 24
 
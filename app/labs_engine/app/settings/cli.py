@@ -18,6 +18,8 @@ LAB_CONTENT_ROOT = os.environ.get('LAB_CONTENT_ROOT')
 if not LAB_CONTENT_ROOT:
     raise EnvironmentError('Env variable LAB_CONTENT_ROOT not set')
 LAB_CONTENT_ENTRYPOINT = os.environ.get('LAB_CONTENT_ENTRYPOINT', 'base.yml')
+# Don't spend the GitHub API rate limit while developing content
+GITHUB_USERS_BACKEND = os.getenv('GITHUB_USERS_BACKEND', 'local')
 
 INTERNAL_IPS = [
     "127.0.0.1",
@@ -14,6 +14,13 @@ DATABASES = {
         'NAME': BASE_DIR / 'test.db.sqlite3',
     }
 }
+if REPORTING_DATABASE:
+    # e.g. a throwaway PostgreSQL container - see .env.sample
+    DATABASES['reporting'] = REPORTING_DATABASE
+
+REPORTING_ARCHIVE_ROOT = TEMP_DIR / 'test' / 'reporting_archive'
+LABS_BAKE_ROOT = TEMP_DIR / 'test' / 'baked'
+CACHE_WARM_MARKER = TEMP_DIR / 'test' / 'warm.json'
 
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 
@@ -9,6 +9,9 @@ from django.test import TestCase as DjangoTestCase
 
 class TestCase(DjangoTestCase):
 
+    # Includes the reporting database, if configured
+    databases = '__all__'
+
     def setUp(self):
         logging.getLogger('django').setLevel(logging.ERROR)
         settings_module = os.environ.get('DJANGO_SETTINGS_MODULE')
@@ -0,0 +1,148 @@
+"""Write rendered lab pages to disk for nginx to serve directly.
+
+Pages are stored under ``objects/`` named by the SHA-256 of their content,
+with ``.gz`` (and ``.br`` if brotli is installed) variants for nginx's
+``gzip_static``/``brotli_static``. Identical pages are stored once, and a page
+is never modified in place, so nginx can't serve a partly written file.
+
+``manifest.json`` records the page of each lab URL, and ``labs.map`` holds the
+same as an nginx ``map`` of request URI to page file. Both are replaced
+atomically once all pages are written. For example::
+
+    map $request_uri $baked_lab {
+        default "";
+        include /path/to/baked/labs.map;
+    }
+
+    location = / {
+        root /path/to/baked;
+        gzip_static on;
+        try_files $baked_lab @django;
+    }
+
+Requests for labs which have not been baked fall through to Django.
+
+nginx only reads ``labs.map`` when it starts or reloads, so it must be
+reloaded (e.g. ``nginx -s reload``) after each bake to serve the new pages.
+Until then it serves the pages of the previous map, so don't delete unused
+pages (``Bakery.prune``) until nginx has reloaded.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import unquote
+
+from labs_engine.labs.compression import compress_variants
+
+MANIFEST_FILENAME = 'manifest.json'
+MAP_FILENAME = 'labs.map'
+OBJECTS_DIR = 'objects'
+
+
+class Bakery:
+    """Collect rendered lab pages and write them to a baked site."""
+
+    def __init__(self, root):
+        """Create a bakery writing to the given directory."""
+        self.root = Path(root)
+        self.labs = {}
+
+    @property
+    def manifest_path(self):
+        return self.root / MANIFEST_FILENAME
+
+    def read_manifest(self):
+        """Return the labs of the current manifest, if there is one."""
+        if not self.manifest_path.exists():
+            return {}
+        with self.manifest_path.open() as f:
+            return json.load(f)['labs']
+
+    def add(self, url, key, body):
+        """Write a rendered lab page and add it to the manifest.
+
+        Args:
+            url: path and query string of the lab e.g. '/?content_root=...'
+            key: the lab's LabCache key
+            body: the rendered page as str or bytes
+        """
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        digest = hashlib.sha256(data).hexdigest()
+        filename = f'{OBJECTS_DIR}/{digest}.html'
+        path = self.root / filename
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            for encoding, variant in compress_variants(data).items():
+                _write_atomic(path.with_name(f'{path.name}.{_ext(encoding)}'),
+                              variant)
+            # Write the page last, as nginx only checks for this file
+            _write_atomic(path, data)
+        self.labs[url] = {
+            'key': key,
+            'file': filename,
+            'sha256': digest,
+            'bytes': len(data),
+            'baked': datetime.now(timezone.utc).isoformat(),
+        }
+
+    def keep(self, url, entry):
+        """Keep a lab from the previous manifest, e.g. if rendering failed."""
+        self.labs[url] = entry
+
+    def commit(self):
+        """Replace the manifest and nginx map with the labs added."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        manifest = {
+            'generated': datetime.now(timezone.utc).isoformat(),
+            'labs': self.labs,
+        }
+        _write_atomic(
+            self.manifest_path,
+            json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+        lines = []
+        for url, entry in sorted(self.labs.items()):
+            # Clients may or may not percent-encode the query string
+            for uri in dict.fromkeys((url, unquote(url))):
+                lines.append(f'{_quote(uri)} {_quote("/" + entry["file"])};')
+        _write_atomic(
+            self.root / MAP_FILENAME,
+            ('\n'.join(lines) + '\n').encode('utf-8'))
+
+    def prune(self):
+        """Delete pages which are not in the manifest.
+
+        Returns:
+            The number of files deleted
+        """
+        keep = {
+            entry['file'].rsplit('/', 1)[-1] for entry in self.labs.values()}
+        deleted = 0
+        objects_dir = self.root / OBJECTS_DIR
+        if not objects_dir.exists():
+            return deleted
+        for path in objects_dir.iterdir():
+            if path.name.split('.', 1)[0] + '.html' not in keep:
+                path.unlink()
+                deleted += 1
+        return deleted
+
+
+def _ext(encoding):
+    """Return the file extension used by nginx for a content-coding."""
+    return 'gz' if encoding == 'gzip' else encoding
+
+
+def _quote(value):
+    """Quote a string for an nginx config file."""
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def _write_atomic(path, data):
+    """Write bytes to a file, replacing it in a single step."""
+    tmp = path.with_name(f'.{path.name}.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
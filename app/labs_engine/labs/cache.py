@@ -1,25 +1,55 @@
 """Cache lab pages because rendering is expensive.
 
 Cached Lab pages are tracked with the CachedLab model, which stores the cache
-key, URL and last access time. This information is used when updating the
-cache.
+key, URL, last access time and number of hits. This information is used when
+updating the cache.
+
+Pages are stored in the tiered ``labs`` cache, so hot labs are served from
+worker memory. They are stored compressed, and each client is sent the
+variant its Accept-Encoding allows. Each page carries an ETag and
+Last-Modified time, so clients and proxies can revalidate it with a
+conditional request and receive 304 Not Modified.
+
+Serving a cached page must not write to the database, so accesses are counted
+in memory by ``AccessRecorder`` and written to CachedLab in batches.
 """
 
+import atexit
 import logging
 import os
+import threading
+import time
+from collections import Counter, defaultdict
 from django.conf import settings
-from django.core.cache import cache
-from django.db import connection, IntegrityError
+from django.core.cache import cache, caches
+from django.db import connection, DatabaseError, IntegrityError
+from django.db.models import F, Sum
 from django.http import HttpResponse
-from django.utils.http import urlencode
+from django.utils import timezone
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, urlencode
 from hashlib import md5
+from urllib.parse import urlsplit, urlunsplit
 
+from labs_engine.labs.compression import (
+    GZIP,
+    IDENTITY,
+    compress_variants,
+    decompress,
+    negotiate,
+)
 from labs_engine.labs.models import CachedLab
+from labs_engine.utils.formatters import raw_github_url
 
 _1_DAY = 60 * 60 * 24
-CACHE_KEY_IGNORE_GET_PARAMS = (
-    'cache',
-    'nonce',
+# GET params which change the rendered lab - others are left out of cache keys
+CACHE_KEY_GET_PARAMS = (
+    'audit',
+    'content_root',
 )
 NOCACHE = settings.NOCACHE
 NO_WEB_CACHE = os.getenv('NO_WEB_CACHE', False)  # Development only
@@ -30,6 +60,9 @@ IGNORE_ERRORS = (
 
 logger = logging.getLogger('django.cache')
 
+# Tiered cache for rendered lab pages - see tiered_cache.py
+lab_cache = caches['labs']
+
 if settings.CACHE_TABLE_NAME not in connection.introspection.table_names():
     if not (
         os.getenv('DJANGO_SETTINGS_MODULE') == 'labs_engine.app.settings.test'
@@ -39,6 +72,75 @@ if settings.CACHE_TABLE_NAME not in connection.introspection.table_names():
             ' `python manage.py createcachetable` to create this table.')
 
 
+class AccessRecorder:
+    """Count cached lab accesses and write them to CachedLab periodically."""
+
+    def __init__(self, interval):
+        """Create a recorder which flushes every ``interval`` seconds."""
+        self.interval = interval
+        self._hits = Counter()
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def touch(self, key):
+        """Record an access to the cached lab with the given key."""
+        with self._lock:
+            self._hits[key] += 1
+        if time.monotonic() - self._last_flush >= self.interval:
+            # A busy database mustn't turn a cache hit into an error
+            try:
+                self.flush()
+            except DatabaseError as exc:
+                logger.warning(f"Could not save cached lab accesses: {exc}")
+
+    def flush(self):
+        """Write pending accesses to the database.
+
+        Accesses which could not be written are kept for the next flush.
+
+        Raises:
+            DatabaseError: if the database can't be written
+        """
+        with self._lock:
+            hits, self._hits = self._hits, Counter()
+            self._last_flush = time.monotonic()
+        if not hits:
+            return
+        # One UPDATE for each distinct hit count, rather than one per lab
+        keys_by_count = defaultdict(list)
+        for key, count in hits.items():
+            keys_by_count[count].append(key)
+        now = timezone.now()
+        pending = list(keys_by_count.items())
+        while pending:
+            count, keys = pending[0]
+            try:
+                CachedLab.objects.filter(key__in=keys).update(
+                    modified=now,
+                    hits=F('hits') + count,
+                )
+            except DatabaseError:
+                with self._lock:
+                    for count, keys in pending:
+                        for key in keys:
+                            self._hits[key] += count
+                raise
+            pending.pop(0)
+        logger.debug(f"Recorded accesses to {len(hits)} cached labs")
+
+
+access_recorder = AccessRecorder(settings.CACHE_ACCESS_FLUSH_SECONDS)
+
+
+@atexit.register
+def _flush_accesses():
+    """Write pending accesses when the process exits."""
+    try:
+        access_recorder.flush()
+    except DatabaseError as exc:
+        logger.warning(f"Could not save cached lab accesses: {exc}")
+
+
 class LabCache:
     @classmethod
     def get(cls, request):
@@ -48,15 +150,15 @@ class LabCache:
         ):
             return
 
-        cache_record = cls._get_cached_lab(request)
-        if cache_record:
-            body = cache.get(cache_record.key)
-            if body:
-                logger.debug(
-                    f"Cache HIT for {request.GET.get('content_root', 'root')}")
-                response = HttpResponse(body)
-                response['X-Cache-Status'] = 'HIT'
-                return response
+        cache_key, _ = cls._generate_cache_key(request)
+        page = lab_cache.get(cache_key)
+        if page:
+            logger.debug(
+                f"Cache HIT for {request.GET.get('content_root', 'root')}")
+            access_recorder.touch(cache_key)
+            response = cls._page_response(request, page)
+            response['X-Cache-Status'] = 'HIT'
+            return response
         logger.debug(
             f"Cache MISS for {request.GET.get('content_root', 'root')}")
 
@@ -64,12 +166,14 @@ class LabCache:
     def put(cls, request, body):
         if NOCACHE:
             return HttpResponse(body)
-        response = HttpResponse(body)
-        response['X-Cache-Status'] = 'MISS'
-        if body and cls.is_labs_request(request):
+        # Only compress pages which will be cached - labs requested once
+        # aren't worth the CPU
+        if body and cls.is_labs_request(request) and cls._admit(request):
+            page = cls._make_page(body)
             logger.debug(
-                f"Cache PUT for {request.GET.get('content_root', 'homepage')}")
-            cache_record = cls._get_cached_lab(request, create=True)
+                "Cache PUT for"
+                f" {request.GET.get('content_root', 'homepage')}")
+            cache_record = cls._save_cached_lab(request, page['size'])
             # If there was an IntegrityError creating the CachedLab, will
             # return None - we won't cache anything
             if cache_record:
@@ -77,9 +181,139 @@ class LabCache:
                     settings.CACHE_TIMEOUT
                     if request.GET.get('content_root')
                     else None)  # No timeout for default "Docs Lab" page
-                cache.set(cache_record.key, body, timeout=timeout)
+                lab_cache.set(cache_record.key, page, timeout=timeout)
+                cls._evict(keep=cache_record.key)
+            response = cls._page_response(request, page)
+        else:
+            response = HttpResponse(body)
+        response['X-Cache-Status'] = 'MISS'
+        return response
+
+    @classmethod
+    def _make_page(cls, body):
+        """Create the cache entry for a rendered page."""
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        variants = compress_variants(data)
+        return {
+            'etag': md5(data).hexdigest(),
+            'last_modified': int(time.time()),
+            'size': sum(len(v) for v in variants.values()),
+            'variants': variants,
+        }
+
+    @classmethod
+    def _admit(cls, request):
+        """Decide whether a rendered lab should be cached.
+
+        A lab is cached once it has been requested CACHE_ADMIT_AFTER_REQUESTS
+        times, so that one-off requests (e.g. typos in content_root, or
+        crawlers) don't fill the cache. The default lab and labs which are
+        already cached are always admitted.
+        """
+        required = settings.CACHE_ADMIT_AFTER_REQUESTS
+        if not request.GET.get('content_root') or required <= 1:
+            return True
+        cache_key, _ = cls._generate_cache_key(request)
+        admit_key = f'labs:admit:{cache_key}'
+        cache.add(
+            admit_key, 0, timeout=settings.CACHE_ADMISSION_WINDOW_SECONDS)
+        try:
+            count = cache.incr(admit_key)
+        except ValueError:
+            # Expired since it was added
+            count = 1
+        if count >= required:
+            cache.delete(admit_key)
+            return True
+        if CachedLab.objects.filter(key=cache_key).exists():
+            return True
+        logger.debug(
+            f"Cache SKIP for {request.GET.get('content_root')}"
+            f" (request {count} of {required})")
+        return False
+
+    @classmethod
+    def _evict(cls, keep=None):
+        """Evict labs until the cache fits within CACHE_MAX_BYTES.
+
+        Args:
+            keep: key of a lab which must not be evicted, e.g. the one just
+                added, which hasn't had a chance to be used yet
+
+        Returns:
+            The number of labs evicted
+        """
+        if settings.CACHE_MAX_BYTES is None:
+            return 0
+        total = CachedLab.objects.aggregate(total=Sum('size'))['total'] or 0
+        if total <= settings.CACHE_MAX_BYTES:
+            return 0
+        order = (
+            ('modified',)
+            if settings.CACHE_EVICTION_POLICY == 'lru'
+            else ('hits', 'modified'))
+        candidates = (
+            CachedLab.objects
+            .exclude(key=keep)
+            .exclude(url='/')  # The default lab is always cached
+            .order_by(*order)
+            .only('key', 'url', 'size')
+        )
+        evicted = 0
+        for lab in candidates.iterator():
+            if total <= settings.CACHE_MAX_BYTES:
+                break
+            lab_cache.delete(lab.key)
+            lab.delete()
+            total -= lab.size
+            evicted += 1
+            logger.info(f"Cache EVICT for {lab.url} [{lab.size} bytes]")
+        return evicted
+
+    @classmethod
+    def _page_response(cls, request, page):
+        """Respond with the variant of a cached page the client accepts.
+
+        Conditional requests matching the variant's ETag or Last-Modified
+        time are answered with 304 Not Modified.
+        """
+        if isinstance(page, str):
+            # Cached before pages were stored compressed
+            return HttpResponse(page)
+        variants = page['variants']
+        encoding = negotiate(
+            request.headers.get('Accept-Encoding'), variants)
+        # Each encoding is a different representation, so needs its own
+        # strong ETag
+        etag = (
+            f'"{page["etag"]}"'
+            if encoding == IDENTITY
+            else f'"{page["etag"]}-{encoding}"')
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=page['last_modified'],
+        )
+        if response is None:
+            if encoding == IDENTITY:
+                response = HttpResponse(decompress(GZIP, variants[GZIP]))
+            else:
+                response = HttpResponse(variants[encoding])
+                response['Content-Encoding'] = encoding
+            response['Content-Length'] = len(response.content)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(page['last_modified'])
+        patch_cache_control(response, public=True, max_age=cls._max_age())
+        patch_vary_headers(response, ('Accept-Encoding',))
         return response
 
+    @classmethod
+    def _max_age(cls):
+        """Return the seconds that clients may reuse a page unchecked."""
+        if settings.CACHE_TIMEOUT is None:
+            return settings.CACHE_CONTROL_MAX_AGE
+        return min(settings.CACHE_CONTROL_MAX_AGE, settings.CACHE_TIMEOUT)
+
     @classmethod
     def is_labs_request(cls, request):
         """Check if the request is for a lab page."""
@@ -92,57 +326,68 @@ class LabCache:
         )
 
     @classmethod
-    def _get_cached_lab(cls, request, create=False):
-        """Fetch CachedLab object from database.
-        If it doesn't exist, create a new one if `create` is True.
+    def _save_cached_lab(cls, request, size):
+        """Create or update the CachedLab record for a rendered lab.
+
+        Returns None if the record could not be saved.
         """
         cache_key, url = cls._generate_cache_key(request)
-        lab = CachedLab.objects.filter(key=cache_key).first()
-        if lab:
-            logger.debug(f"CachedLab found for key {cache_key} - {url}")
-            try:
-                lab.save()
-            except IntegrityError as exc:
-                for phrase in IGNORE_ERRORS:
-                    if phrase in str(exc):
-                        logger.warning(
-                            f'Ignoring error updating CachedLab: {exc}')
-                        return None
-                raise exc
-        else:
-            logger.debug(f"No CachedLab found for key {cache_key} - {url}")
-
-        if create and not lab:
-            try:
-                lab = CachedLab(
-                    key=cache_key,
-                    url=url,
-                )
-                lab.save()
-            except IntegrityError as exc:
-                for phrase in IGNORE_ERRORS:
-                    if phrase in str(exc):
-                        logger.warning(
-                            f'Ignoring error updating CachedLab: {exc}')
-                        return None
-                raise exc
+        try:
+            lab, created = CachedLab.objects.update_or_create(
+                key=cache_key,
+                defaults={'url': url, 'size': size},
+            )
+        except IntegrityError as exc:
+            for phrase in IGNORE_ERRORS:
+                if phrase in str(exc):
+                    logger.warning(
+                        f'Ignoring error updating CachedLab: {exc}')
+                    return None
+            raise exc
+        if created:
             logger.debug(f"Created new CachedLab for key {cache_key} - {url}")
-
+        else:
+            logger.debug(f"CachedLab found for key {cache_key} - {url}")
         return lab
 
     @classmethod
     def _generate_cache_key(cls, request):
-        """Create a unique cache key from request path."""
+        """Create a unique cache key from request path.
+
+        Requests which render the same lab share a key: only params which
+        change the page are included, in sorted order, and content_root is
+        normalised.
+        """
         params = {
-            k: v for k, v in request.GET.items()
-            if k not in CACHE_KEY_IGNORE_GET_PARAMS
+            k: v for k, v in sorted(request.GET.items())
+            if k in CACHE_KEY_GET_PARAMS
         }
+        if 'audit' in params:
+            # Audit mode is enabled by the presence of the param
+            params['audit'] = ''
+        if params.get('content_root'):
+            params['content_root'] = cls._normalise_content_root(
+                params['content_root'])
         url = f"{request.path}?{urlencode(params)}" if params else request.path
         md5sum = md5(url.encode('utf-8')).hexdigest()
         logger.debug(f"Cache path: {url}")
         logger.debug(f"Cache url (hashed): {md5sum}")
         return md5sum, url
 
+    @classmethod
+    def _normalise_content_root(cls, url):
+        """Return the canonical form of a content_root URL.
+
+        GitHub web URLs are fetched from raw.githubusercontent.com, and the
+        scheme and hostname are case-insensitive, so these variants render
+        the same lab.
+        """
+        parts = urlsplit(url.strip())
+        return raw_github_url(urlunsplit(parts._replace(
+            scheme=parts.scheme.lower(),
+            netloc=parts.netloc.lower(),
+        )))
+
 
 class WebCache:
     """Cache content from external web requests."""
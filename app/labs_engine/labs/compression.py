@@ -0,0 +1,96 @@
+"""Pre-compress cached pages and choose an encoding for each client.
+
+Cached lab pages are compressed once when they are rendered, rather than on
+every response. The brotli package is optional - without it, only gzip
+variants are stored.
+"""
+
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BROTLI = 'br'
+GZIP = 'gzip'
+IDENTITY = 'identity'
+# Most preferred first
+ENCODINGS = (BROTLI, GZIP)
+
+# Pages are compressed once and served many times, so use the best ratio
+BROTLI_QUALITY = 11
+GZIP_LEVEL = 9
+
+
+def compress_variants(body):
+    """Return compressed variants of a page, keyed by content-coding.
+
+    Args:
+        body: the page as str or bytes (str is encoded as UTF-8)
+
+    Returns:
+        A dict of content-coding to compressed bytes
+    """
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    # mtime=0 so identical pages give identical bytes
+    variants = {GZIP: gzip.compress(body, GZIP_LEVEL, mtime=0)}
+    if brotli:
+        variants[BROTLI] = brotli.compress(
+            body, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+    return variants
+
+
+def decompress(encoding, data):
+    """Return the original bytes of a compressed variant."""
+    if encoding == GZIP:
+        return gzip.decompress(data)
+    if encoding == BROTLI:
+        return brotli.decompress(data)
+    raise ValueError(f'Unsupported content-coding: {encoding}')
+
+
+def parse_accept_encoding(header):
+    """Return a dict of content-coding to q-value from Accept-Encoding.
+
+    Malformed q-values are treated as 1, as clients rarely send them at all.
+    """
+    qvalues = {}
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    pass
+        qvalues[coding] = q
+    return qvalues
+
+
+def negotiate(accept_encoding, available):
+    """Choose the content-coding to send.
+
+    Args:
+        accept_encoding: the request's Accept-Encoding header, or None
+        available: content-codings of the stored variants
+
+    Returns:
+        The best available content-coding the client accepts, or IDENTITY
+    """
+    qvalues = parse_accept_encoding(accept_encoding)
+    wildcard = qvalues.get('*', 0)
+    best, best_q = IDENTITY, 0
+    for coding in ENCODINGS:
+        if coding not in available:
+            continue
+        q = qvalues.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
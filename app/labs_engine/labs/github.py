@@ -0,0 +1,310 @@
+"""Resolve lab contributors' GitHub profiles.
+
+Profiles are kept in the GitHubUser table, so they survive cache clears and
+are shared by all workers. Only users who aren't stored, or whose profile is
+older than GITHUB_USER_REFRESH_DAYS, are requested from GitHub. Users that
+GitHub doesn't know are stored too (negative caching) and checked again after
+GITHUB_USER_NOT_FOUND_REFRESH_DAYS. If GitHub can't be reached, or the rate
+limit of every API token is spent (see github_client.py), stale profiles are
+served as they are.
+
+Profiles are requested by one of these backends (GITHUB_USERS_BACKEND):
+
+- ``graphql``: all users in one GraphQL request (requires GITHUB_API_TOKENS)
+- ``rest``: one REST request per user
+- ``local``: no requests - a stand-in for development and testing, which
+  links to each user's public avatar
+"""
+
+import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+
+from labs_engine.labs.cache import WebCache
+from labs_engine.labs.github_client import (
+    CORE,
+    GRAPHQL,
+    RateLimited,
+    get_client,
+)
+from labs_engine.labs.models import GitHubUser
+
+GITHUB_GRAPHQL_URL = 'https://api.github.com/graphql'
+GITHUB_USERNAME_URL = 'https://api.github.com/users/{username}'
+# Maximum users requested in one GraphQL query
+GRAPHQL_BATCH_SIZE = 100
+REQUEST_TIMEOUT_SECONDS = 10
+
+logger = logging.getLogger('django')
+
+# Shared by all renders, rather than one pool per render
+_rest_executor = ThreadPoolExecutor(
+    max_workers=8, thread_name_prefix='github-users')
+
+
+class GraphQLBackend:
+    """Request users in batches from the GitHub GraphQL API."""
+
+    def __init__(self, client):
+        """Create a backend which requests with the given GitHubClient."""
+        self.client = client
+
+    def fetch(self, usernames):
+        """Request users from GitHub.
+
+        Returns:
+            A dict of username to profile dict, or None if GitHub has no such
+            user. Users which couldn't be requested are left out.
+        """
+        users = {}
+        for i in range(0, len(usernames), GRAPHQL_BATCH_SIZE):
+            users.update(
+                self._fetch_batch(usernames[i:i + GRAPHQL_BATCH_SIZE]))
+        return users
+
+    def _fetch_batch(self, usernames):
+        # Logins are passed as variables, rather than interpolated
+        params = ', '.join(f'$l{i}: String!' for i in range(len(usernames)))
+        fields = ' '.join(
+            f'u{i}: user(login: $l{i}) {{ login name avatarUrl }}'
+            for i in range(len(usernames)))
+        try:
+            response = self.client.request(
+                'POST',
+                GITHUB_GRAPHQL_URL,
+                resource=GRAPHQL,
+                json={
+                    'query': f'query({params}) {{ {fields} }}',
+                    'variables': {
+                        f'l{i}': username
+                        for i, username in enumerate(usernames)
+                    },
+                },
+            )
+        except RateLimited as exc:
+            logger.warning(f'GitHub GraphQL request skipped: {exc}')
+            return {}
+        except requests.exceptions.RequestException as exc:
+            logger.warning(f'GitHub GraphQL request failed: {exc}')
+            return {}
+        if response.status_code != 200:
+            logger.warning(
+                f'GitHub GraphQL request failed: HTTP {response.status_code}')
+            return {}
+        data = response.json().get('data') or {}
+        not_found = {
+            tuple(error.get('path', ()))
+            for error in response.json().get('errors', ())
+            if error.get('type') == 'NOT_FOUND'
+        }
+        users = {}
+        for i, username in enumerate(usernames):
+            alias = f'u{i}'
+            if user := data.get(alias):
+                users[username] = {
+                    'login': user['login'],
+                    'name': user.get('name') or '',
+                    'avatar_url': user.get('avatarUrl') or '',
+                }
+            elif (alias,) in not_found:
+                users[username] = None
+        return users
+
+
+class RestBackend:
+    """Request users one at a time from the GitHub REST API."""
+
+    def __init__(self, client):
+        """Create a backend which requests with the given GitHubClient."""
+        self.client = client
+
+    def fetch(self, usernames):
+        """Request users from GitHub.
+
+        Returns:
+            A dict of username to profile dict, or None if GitHub has no such
+            user. Users which couldn't be requested are left out.
+        """
+        results = _rest_executor.map(self._fetch_user, usernames)
+        return {
+            username: user
+            for username, (ok, user) in zip(usernames, results)
+            if ok
+        }
+
+    def _fetch_user(self, username):
+        """Return (ok, profile) for one user."""
+        try:
+            response = self.client.request(
+                'GET',
+                GITHUB_USERNAME_URL.format(username=username),
+                resource=CORE,
+            )
+        except RateLimited as exc:
+            logger.info(f'GitHub API request for {username} skipped: {exc}')
+            return False, None
+        except requests.exceptions.RequestException as exc:
+            logger.warning(f'GitHub API request failed: {exc}')
+            return False, None
+        if response.status_code == 200:
+            user = response.json()
+            return True, {
+                'login': user.get('login') or username,
+                'name': user.get('name') or '',
+                'avatar_url': user.get('avatar_url') or '',
+            }
+        if response.status_code == 404:
+            logger.warning(f'GitHub user not found: {username}')
+            return True, None
+        logger.warning(
+            f'GitHub API request for {username} failed:'
+            f' HTTP {response.status_code}')
+        return False, None
+
+
+class LocalBackend:
+    """Resolve users without requesting anything from GitHub."""
+
+    def fetch(self, usernames):
+        """Return a profile for each user, linking their public avatar."""
+        return {
+            username: {
+                'login': username,
+                'name': '',
+                'avatar_url': f'https://github.com/{username}.png',
+            }
+            for username in usernames
+        }
+
+
+def get_backend():
+    """Return the configured backend for requesting users."""
+    client = get_client()
+    name = settings.GITHUB_USERS_BACKEND or (
+        'graphql' if client.authenticated else 'rest')
+    if name == 'local':
+        return LocalBackend()
+    if name == 'graphql':
+        if client.authenticated:
+            return GraphQLBackend(client)
+        logger.warning(
+            'The GitHub GraphQL API requires GITHUB_API_TOKENS - using the'
+            ' REST API instead.')
+    return RestBackend(client)
+
+
+def resolve_users(usernames):
+    """Return the GitHub profiles of the given users.
+
+    Args:
+        usernames: GitHub logins e.g. from a lab's CONTRIBUTORS file
+
+    Returns:
+        A list of dicts with login, name and avatar_url, in the given order
+        but with users who have no avatar last. Unknown users have only a
+        login.
+    """
+    usernames = list(dict.fromkeys(usernames))
+    stored = {
+        user.key: user
+        for user in GitHubUser.objects.filter(
+            key__in=[username.lower() for username in usernames])
+    }
+    stale = [
+        username for username in usernames
+        if _is_stale(stored.get(username.lower()))
+    ]
+    if stale:
+        stored.update(_save(get_backend().fetch(stale)))
+
+    users = []
+    for username in usernames:
+        user = stored.get(username.lower())
+        if user and user.found:
+            users.append({
+                'login': user.login,
+                'name': user.name,
+                'avatar_url': _avatar_url(user),
+            })
+        else:
+            users.append({'login': username})
+    users.sort(key=lambda user: not user.get('avatar_url'))
+    return users
+
+
+def _is_stale(user):
+    """Return True if the stored user should be requested again."""
+    if user is None:
+        return True
+    days = (
+        settings.GITHUB_USER_REFRESH_DAYS
+        if user.found
+        else settings.GITHUB_USER_NOT_FOUND_REFRESH_DAYS)
+    return user.fetched < timezone.now() - timezone.timedelta(days=days)
+
+
+def _save(fetched):
+    """Store fetched users, returning GitHubUsers keyed by lowercase login."""
+    now = timezone.now()
+    users = [
+        GitHubUser(
+            key=username.lower(),
+            login=user['login'] if user else username,
+            name=(user or {}).get('name', '')[:255],
+            avatar_url=(user or {}).get('avatar_url', ''),
+            found=user is not None,
+            fetched=now,
+        )
+        for username, user in fetched.items()
+    ]
+    GitHubUser.objects.bulk_create(
+        users,
+        update_conflicts=True,
+        unique_fields=['key'],
+        update_fields=['login', 'name', 'avatar_url', 'found', 'fetched'],
+    )
+    return {user.key: user for user in users}
+
+
+def fetch_avatar(user):
+    """Return (content_type, bytes) of a user's avatar, or None on error.
+
+    Avatars are cached for GITHUB_AVATAR_CACHE_SECONDS.
+    """
+    url = user.avatar_url
+    if cached := WebCache.get(f'{url}#s={settings.GITHUB_AVATAR_SIZE}'):
+        return cached
+    try:
+        response = requests.get(
+            url,
+            params={'s': settings.GITHUB_AVATAR_SIZE},
+            timeout=REQUEST_TIMEOUT_SECONDS,
+        )
+    except requests.exceptions.RequestException as exc:
+        logger.warning(f'Failed to fetch GitHub avatar {url}: {exc}')
+        return None
+    if response.status_code != 200:
+        logger.warning(
+            f'Failed to fetch GitHub avatar {url}:'
+            f' HTTP {response.status_code}')
+        return None
+    avatar = (
+        response.headers.get('Content-Type', 'image/png'),
+        response.content,
+    )
+    WebCache.put(
+        f'{url}#s={settings.GITHUB_AVATAR_SIZE}',
+        avatar,
+        timeout=settings.GITHUB_AVATAR_CACHE_SECONDS,
+    )
+    return avatar
+
+
+def _avatar_url(user):
+    """Return the URL to display a user's avatar from."""
+    if settings.GITHUB_AVATAR_PROXY and user.avatar_url:
+        return reverse('github_avatar', args=[user.key])
+    return user.avatar_url
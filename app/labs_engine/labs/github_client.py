@@ -0,0 +1,218 @@
+"""Make GitHub API requests within the rate limit of each API token.
+
+GitHub reports the remaining budget of a token with each response
+(``X-RateLimit-Remaining`` and ``X-RateLimit-Reset``), separately for each API
+resource e.g. ``core`` (REST) and ``graphql``. The last reported budget of
+each token is kept in the shared cache, so all workers know when a token has
+run out. Requests are made with whichever token of GITHUB_API_TOKENS has the
+most budget left, moving on to the next if a token is rate-limited. Once every
+token is exhausted, ``RateLimited`` is raised without making a request until
+the budget resets, so that callers can serve stored data instead.
+
+Tokens are identified in the cache and in metrics by a short hash, never by
+the token itself.
+"""
+
+import hashlib
+import logging
+import requests
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+GITHUB_API_HEADERS = {
+    'X-GitHub-Api-Version': '2022-11-28',
+}
+CORE = 'core'
+GRAPHQL = 'graphql'
+RESOURCES = (CORE, GRAPHQL)
+ANONYMOUS = 'anonymous'
+BUDGET_CACHE_KEY = 'github:ratelimit:{resource}:{token_id}'
+# How long to rest a token that GitHub rejects as unauthorized
+UNAUTHORIZED_BACKOFF_SECONDS = 60 * 60
+REQUEST_TIMEOUT_SECONDS = 10
+
+logger = logging.getLogger('django')
+
+
+class RateLimited(Exception):
+    """No GitHub API token has any budget left."""
+
+    def __init__(self, resource, reset):
+        """Record when the first token's budget resets."""
+        self.resource = resource
+        self.reset = reset
+        super().__init__(
+            f'GitHub API rate limit ({resource}) exhausted until'
+            f' {time.strftime("%H:%M:%S %Z", time.localtime(reset))}')
+
+
+class GitHubClient:
+    """Request the GitHub API with a pool of tokens."""
+
+    def __init__(self, tokens=None):
+        """Create a client for the given tokens, or anonymous if none."""
+        self.tokens = list(dict.fromkeys(tokens or ())) or [None]
+
+    @property
+    def authenticated(self):
+        return self.tokens != [None]
+
+    def request(self, method, url, resource=CORE, **kwargs):
+        """Make a request with the token which has most budget left.
+
+        Args:
+            method: HTTP method
+            url: GitHub API URL
+            resource: the rate limit resource which the request spends
+            kwargs: passed to requests.request
+
+        Returns:
+            The response, which may be an error other than rate limiting.
+
+        Raises:
+            RateLimited: if every token is exhausted
+            requests.exceptions.RequestException: if the request fails
+        """
+        headers = {**GITHUB_API_HEADERS, **kwargs.pop('headers', {})}
+        kwargs.setdefault('timeout', REQUEST_TIMEOUT_SECONDS)
+        budgets = self._get_budgets(resource)
+        now = time.time()
+        available = sorted(
+            (token for token in self.tokens
+             if not _is_exhausted(budgets[token], now)),
+            key=lambda token: _remaining(budgets[token]),
+            reverse=True,
+        )
+        for token in available:
+            if token:
+                headers['Authorization'] = f'Bearer {token}'
+            response = requests.request(
+                method, url, headers=headers, **kwargs)
+            if not self._record(token, resource, response):
+                return response
+        budgets = self._get_budgets(resource)
+        raise RateLimited(resource, min(
+            (budget['reset'] for budget in budgets.values() if budget),
+            default=now,
+        ))
+
+    def budget(self):
+        """Return the last known budget of each token.
+
+        Returns:
+            A list of dicts with token (hashed), resource, limit, remaining,
+            reset (timestamp) and exhausted. Limit, remaining and reset are
+            None if the token hasn't been used since the budget reset.
+        """
+        now = time.time()
+        metrics = []
+        for resource in RESOURCES:
+            budgets = self._get_budgets(resource)
+            for token in self.tokens:
+                budget = budgets[token] or {}
+                metrics.append({
+                    'token': _token_id(token),
+                    'resource': resource,
+                    'limit': budget.get('limit'),
+                    'remaining': budget.get('remaining'),
+                    'reset': budget.get('reset'),
+                    'exhausted': _is_exhausted(budgets[token], now),
+                })
+        return metrics
+
+    def _get_budgets(self, resource):
+        """Return the cached budget of each token (None if unknown)."""
+        keys = {token: _budget_key(resource, token) for token in self.tokens}
+        cached = cache.get_many(keys.values())
+        return {token: cached.get(key) for token, key in keys.items()}
+
+    def _record(self, token, resource, response):
+        """Cache the budget reported by a response.
+
+        Returns:
+            True if the token was refused for rate limiting or authorization,
+            and the request should be made with the next token.
+        """
+        headers = response.headers
+        now = time.time()
+        budget = None
+        if 'X-RateLimit-Remaining' in headers:
+            budget = {
+                'limit': _int(headers.get('X-RateLimit-Limit')),
+                'remaining': _int(headers['X-RateLimit-Remaining']),
+                'reset': _int(headers.get('X-RateLimit-Reset')) or now,
+            }
+        refused = False
+        if response.status_code == 401:
+            logger.warning(
+                f'GitHub API token {_token_id(token)} unauthorized - resting'
+                f' it for {UNAUTHORIZED_BACKOFF_SECONDS} seconds.')
+            budget = {
+                'limit': None,
+                'remaining': 0,
+                'reset': now + UNAUTHORIZED_BACKOFF_SECONDS,
+            }
+            refused = True
+        elif response.status_code in (403, 429) and (
+            'Retry-After' in headers
+            or (budget and budget['remaining'] == 0)
+        ):
+            # Primary rate limit, or a secondary limit with Retry-After
+            retry_after = _int(headers.get('Retry-After'))
+            budget = {
+                **(budget or {'limit': None}),
+                'remaining': 0,
+                'reset': max(
+                    (budget or {}).get('reset', now),
+                    now + (retry_after or 0)),
+            }
+            logger.warning(
+                f'GitHub API token {_token_id(token)} rate-limited'
+                f' ({resource}).')
+            refused = True
+        if budget:
+            cache.set(
+                _budget_key(resource, token),
+                budget,
+                timeout=max(int(budget['reset'] - now), 0) + 60,
+            )
+        return refused
+
+
+def get_client():
+    """Return a client for the configured GITHUB_API_TOKENS."""
+    return GitHubClient(settings.GITHUB_API_TOKENS)
+
+
+def _budget_key(resource, token):
+    return BUDGET_CACHE_KEY.format(
+        resource=resource, token_id=_token_id(token))
+
+
+def _token_id(token):
+    """Identify a token without revealing it."""
+    if not token:
+        return ANONYMOUS
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()[:8]
+
+
+def _is_exhausted(budget, now):
+    """Return True if a token shouldn't be used until its budget resets."""
+    if not budget or budget['reset'] <= now:
+        return False
+    return budget['remaining'] <= settings.GITHUB_RATE_LIMIT_RESERVE
+
+
+def _remaining(budget):
+    """Return the remaining budget, treating unknown budgets as full."""
+    if not budget or budget['remaining'] is None:
+        return float('inf')
+    return budget['remaining']
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -8,7 +8,6 @@ http://127.0.0.1:8000/?content_root=https://raw.githubusercontent.com/usegalaxy-
 
 """
 
-import concurrent.futures
 import logging
 import re
 import requests
@@ -22,27 +21,26 @@ from pydantic import BaseModel, ValidationError
 
 from types import SimpleNamespace
 from labs_engine.utils.exceptions import LabBuildError
-from labs_engine.utils.formatters import EmbeddedYouTubeUrl
+from labs_engine.utils.formatters import EmbeddedYouTubeUrl, raw_github_url
 from labs_engine.utils.terminal import ANSI_GREEN, ANSI_RESET, ANSI_YELLOW
 from .lab_schema import LabSchema, LabSectionSchema
-from .cache import WebCache
+from .github import resolve_users
 
 logger = logging.getLogger('django')
 
 ACCEPTED_IMG_EXTENSIONS = ('png', 'jpg', 'jpeg', 'svg', 'webp')
 CITATIONS_FILE = 'references.bib'
 CONTRIBUTORS_FILE = 'CONTRIBUTORS'
-GITHUB_USERNAME_URL = "https://api.github.com/users/{username}"
 CONTENT_TYPES = SimpleNamespace(
     WEBPAGE='webpage',
     YAML='yaml',
     TEXT='text',
 )
 
-if not settings.GITHUB_API_TOKEN:
+if not settings.GITHUB_API_TOKENS:
     print(
         f"\n{ANSI_YELLOW}"
-        "Warning: env variable GITHUB_API_TOKEN not set. Requests"
+        "Warning: env variable GITHUB_API_TOKEN(S) not set. Requests"
         " to api.github.com will be rate-limited at 60 requests per hour"
         " which may result in errors (this is used for fetching CONTRIBUTORS"
         f" information).{ANSI_RESET}")
@@ -179,11 +177,7 @@ class ExportLabContext(dict):
 
     def _make_raw(self, url):
         """Make raw URL for fetching content."""
-        if '//github.com' in url:
-            url = (
-                url.replace('github.com', 'raw.githubusercontent.com')
-                .replace('/blob/', '/'))
-        return url
+        return raw_github_url(url)
 
     def _fetch_yaml_context(self):
         """Fetch template context from remote YAML file.
@@ -317,7 +311,7 @@ class ExportLabContext(dict):
                 if x.strip()
                 and not x.strip().startswith('#')
             ]
-            self['contributors'] = fetch_names(usernames_list)
+            self['contributors'] = resolve_users(usernames_list)
         else:
             self['contributors'] = []
 
@@ -411,55 +405,6 @@ class ExportLabContext(dict):
         )
 
 
-def get_github_user(username):
-    url = GITHUB_USERNAME_URL.format(username=username)
-    if cached := WebCache.get(url):
-        return cached
-    headers = {
-        'X-GitHub-Api-Version': '2022-11-28',
-    }
-    token = settings.GITHUB_API_TOKEN
-    if token:
-        headers['Authorization'] = f'Bearer {token}'
-    try:
-        response = requests.get(url, headers=headers)
-    except requests.exceptions.ConnectionError as exc:
-        logger.warning(f'GitHub API request failed: {exc}')
-        return {'login': username}
-    if response.status_code == 200:
-        user_data = response.json()
-        WebCache.put(url, user_data, timeout=2_592_000)
-        return user_data
-    elif response.status_code == 401:
-        logger.warning(
-            'GitHub API token unauthorized. Request blocked by rate-limiting.')
-    elif response.status_code == 404:
-        logger.warning(f'GitHub user not found: {username}')
-        WebCache.put(url, {'login': username}, timeout=2_592_000)
-    return {'login': username}
-
-
-def fetch_names(usernames):
-    def fetch_name(username):
-        return (username, get_github_user(username))
-
-    users = []
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future_to_username = {
-            executor.submit(fetch_name, username): username
-            for username in usernames
-        }
-        for future in concurrent.futures.as_completed(future_to_username):
-            _, user_data = future.result()
-            users.append(user_data)
-    users.sort(key=lambda x:
-               usernames.index(x.get('login'))
-               if x and x.get('avatar_url') and x.get('login') in usernames
-               else 9999)
-
-    return users
-
-
 def parse_bibtex_entries(text):
     """Very small BibTeX parser for simple entries."""
     entries = []
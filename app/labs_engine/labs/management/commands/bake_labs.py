@@ -0,0 +1,168 @@
+"""Render labs to static HTML files which nginx can serve directly.
+
+See labs_engine/labs/bake.py for the layout of the baked site and an example
+nginx configuration.
+"""
+
+import shlex
+import subprocess
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import resolve
+from django.utils import timezone
+
+from labs_engine.labs.bake import Bakery
+from labs_engine.labs.cache import LabCache
+from labs_engine.labs.models import CachedLab
+from labs_engine.utils.runserver import Runserver
+
+
+class Command(BaseCommand):
+    """Render active cached labs, or the given URLs, to a baked site."""
+
+    help = (
+        'Render labs to static HTML files for nginx to serve directly. By'
+        ' default, all cached labs visited in the last'
+        ' CACHE_UPDATE_RETAIN_DAYS days are rendered. nginx only reads'
+        ' labs.map on startup or reload, so reload it after baking (see'
+        ' --reload-cmd) to serve the new pages.'
+    )
+
+    def add_arguments(self, parser):
+        """Add arguments to the command."""
+        parser.add_argument(
+            '--url',
+            action='append',
+            default=[],
+            help=(
+                'Lab URL to render e.g. "/?content_root=..." (can be given'
+                ' more than once)'),
+        )
+        parser.add_argument(
+            '--urls-file',
+            type=Path,
+            help='File listing lab URLs to render, one per line',
+        )
+        parser.add_argument(
+            '--output',
+            type=Path,
+            default=settings.LABS_BAKE_ROOT,
+            help='Directory of the baked site (default: LABS_BAKE_ROOT)',
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help=(
+                'Delete pages which are no longer in the manifest. Only'
+                ' safe once nginx has reloaded the new labs.map, e.g. with'
+                ' --reload-cmd'),
+        )
+        parser.add_argument(
+            '--reload-cmd',
+            help=(
+                'Command which reloads nginx once the new labs.map is in'
+                ' place, e.g. "nginx -s reload". Pages are only pruned if'
+                ' it succeeds'),
+        )
+        parser.add_argument(
+            '--no-runserver',
+            action='store_true',
+            help=(
+                'Do not run a local server for static lab content (if it is'
+                ' already being served at HOSTNAME)'),
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        urls = self.get_urls(options)
+        bakery = Bakery(options['output'])
+        if options['no_runserver']:
+            failed = self.bake(bakery, urls)
+        else:
+            with Runserver():
+                # Use runserver so that local static files can be served
+                self.stdout.write(
+                    self.style.SUCCESS('\nServer is online.\n'))
+                failed = self.bake(bakery, urls)
+
+        # Keep serving the last good version of labs which failed to render
+        previous = bakery.read_manifest()
+        for url in failed:
+            if url in previous:
+                bakery.keep(url, previous[url])
+        bakery.commit()
+        self.stdout.write(self.style.SUCCESS(
+            f'\nBaked {len(bakery.labs)} labs to {bakery.root}'))
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f'{len(failed)} labs could not be rendered'))
+        if options['reload_cmd']:
+            self.reload(options['reload_cmd'])
+        if options['prune']:
+            deleted = bakery.prune()
+            self.stdout.write(f'Deleted {deleted} unused files')
+
+    def reload(self, command):
+        """Run the command which makes nginx read the new labs.map."""
+        try:
+            subprocess.run(shlex.split(command), check=True)
+        except (OSError, subprocess.CalledProcessError) as exc:
+            raise CommandError(f'Could not reload nginx: {exc}')
+        self.stdout.write(f'Reloaded nginx with: {command}')
+
+    def get_urls(self, options):
+        """Return the lab URLs to render, as LabCache records them."""
+        urls = list(options['url'])
+        if options['urls_file']:
+            urls += [
+                line.strip()
+                for line in options['urls_file'].read_text().splitlines()
+                if line.strip() and not line.startswith('#')
+            ]
+        if not (options['url'] or options['urls_file']):
+            urls = CachedLab.objects.filter(
+                modified__gt=timezone.now() - timezone.timedelta(
+                    days=settings.CACHE_UPDATE_RETAIN_DAYS,
+                )
+            ).values_list('url', flat=True)
+        factory = RequestFactory()
+        # Normalise the URLs so that they match LabCache's
+        return list(dict.fromkeys(
+            LabCache._generate_cache_key(factory.get(url))[1]
+            for url in urls
+        ))
+
+    def bake(self, bakery, urls):
+        """Render each lab and add it to the bakery.
+
+        Returns:
+            URLs of the labs which could not be rendered
+        """
+        factory = RequestFactory()
+        failed = []
+        for url in urls:
+            request = factory.get(
+                url + ('&' if '?' in url else '?') + 'cache=false')
+            try:
+                view_func, args, kwargs = resolve(request.path_info)
+                response = view_func(request, *args, **kwargs)
+            except Exception as exc:
+                self.stdout.write(self.style.WARNING(
+                    f'Error rendering lab {url}: {exc}'))
+                failed.append(url)
+                continue
+            if response.status_code != 200:
+                self.stdout.write(self.style.ERROR(
+                    f'HTTP {response.status_code} rendering lab: {url}'))
+                failed.append(url)
+                continue
+            key, _ = LabCache._generate_cache_key(factory.get(url))
+            bakery.add(url, key, response.content)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Baked lab [{len(response.content)} bytes]: '),
+                ending='')
+            self.stdout.write(url)
+        return failed
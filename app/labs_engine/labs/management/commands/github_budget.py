@@ -0,0 +1,49 @@
+"""Report the GitHub API rate limit left for each configured token.
+
+Budgets are those last reported by GitHub to any worker, so a token which
+hasn't been used since its budget reset is shown as unknown.
+"""
+
+import json
+from datetime import datetime
+from django.core.management.base import BaseCommand
+
+from labs_engine.labs.github_client import get_client
+
+
+class Command(BaseCommand):
+    """Print the rate limit budget of each GitHub API token."""
+
+    help = (
+        'Report the GitHub API rate limit remaining for each token of'
+        ' GITHUB_API_TOKENS, as last reported by GitHub.'
+    )
+
+    def add_arguments(self, parser):
+        """Add arguments to the command."""
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the budgets as JSON e.g. for monitoring',
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        budget = get_client().budget()
+        if options['json']:
+            self.stdout.write(json.dumps(budget, indent=2))
+            return
+        for entry in budget:
+            label = f"{entry['token']} [{entry['resource']}]: "
+            if entry['remaining'] is None:
+                self.stdout.write(label + 'unknown')
+                continue
+            reset = datetime.fromtimestamp(entry['reset']).strftime(
+                '%H:%M:%S')
+            status = (
+                f"{entry['remaining']}/{entry['limit'] or '?'} remaining,"
+                f" resets at {reset}")
+            style = (
+                self.style.ERROR if entry['exhausted']
+                else self.style.SUCCESS)
+            self.stdout.write(label + style(status))
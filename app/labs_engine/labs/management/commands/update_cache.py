@@ -3,13 +3,13 @@
 Delete cached labs that are not in use.
 """
 
-from django.core.cache import cache
 from django.core.management.base import BaseCommand
 from django.test import RequestFactory
 from django.urls import resolve
 from django.conf import settings
 from django.utils import timezone
 
+from labs_engine.labs.cache import lab_cache
 from labs_engine.labs.models import CachedLab
 from labs_engine.utils.runserver import Runserver
 
@@ -53,7 +53,7 @@ class Command(BaseCommand):
     def update_cache(self):
         """Update the cache for all active cached labs."""
         self.stdout.write('Clearing cache...')
-        cache.clear()
+        lab_cache.clear()
 
         self.stdout.write('Reading CachedLab records...')
         cached_labs = CachedLab.objects.all()
@@ -0,0 +1,123 @@
+"""Render the busiest labs into the cache, e.g. after a deploy.
+
+Until this has run in the container, the /ready endpoint responds with 503,
+so it can be used as a readiness check.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import resolve
+
+from labs_engine.labs.cache import lab_cache
+from labs_engine.labs.warmup import mark_warm, rank_labs
+from labs_engine.utils.runserver import Runserver
+
+
+class Command(BaseCommand):
+    """Render uncached labs in order of recent traffic."""
+
+    help = (
+        'Render the busiest cached labs which are not currently cached, in'
+        ' order of recent traffic. Labs are ranked by cache hits and by visits'
+        ' recorded by reporting.'
+    )
+
+    def add_arguments(self, parser):
+        """Add arguments to the command."""
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=settings.CACHE_WARM_TOP_LABS,
+            help=(
+                'Number of labs to warm (default:'
+                f' {settings.CACHE_WARM_TOP_LABS})'),
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Number of labs to render at once (default: 4)',
+        )
+        parser.add_argument(
+            '--no-runserver',
+            action='store_true',
+            help=(
+                'Do not run a local server for static lab content (if it is'
+                ' already being served at HOSTNAME)'),
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        labs = rank_labs(options['top'])
+        cold = [lab for lab in labs if not lab_cache.has_key(lab.key)]
+        self.stdout.write(
+            f'{len(labs) - len(cold)} of the top {len(labs)} labs are'
+            ' already cached')
+        if cold:
+            if options['no_runserver']:
+                failed = self.warm(cold, options['concurrency'])
+            else:
+                with Runserver():
+                    # Use runserver so that local static files can be served
+                    self.stdout.write(
+                        self.style.SUCCESS('\nServer is online.\n'))
+                    failed = self.warm(cold, options['concurrency'])
+        else:
+            failed = []
+
+        # Labs which can't be rendered would otherwise never be ready
+        stored = mark_warm(lab.key for lab in labs if lab not in failed)
+        self.stdout.write(self.style.SUCCESS(
+            f'\nWarmed {len(cold) - len(failed)} labs'
+            f' ({len(stored)} of the top {len(labs)} are cached)'))
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f'{len(failed)} labs could not be rendered'))
+
+    def warm(self, labs, concurrency):
+        """Render labs, busiest first, with up to ``concurrency`` at once.
+
+        Returns:
+            The labs which could not be rendered
+        """
+        if concurrency <= 1:
+            results = [self.render(lab) for lab in labs]
+        else:
+            # map() starts labs in order, so the busiest are rendered first
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(self.render_in_thread, labs))
+        return [lab for lab, ok in zip(labs, results) if not ok]
+
+    def render_in_thread(self, lab):
+        """Render a lab and close the thread's database connections."""
+        try:
+            return self.render(lab)
+        finally:
+            connections.close_all()
+
+    def render(self, lab):
+        """Render a lab through its view, which caches it.
+
+        Returns:
+            True if the lab was rendered
+        """
+        url = lab.url + ('&' if '?' in lab.url else '?') + 'cache=false'
+        try:
+            request = RequestFactory().get(url)
+            view_func, args, kwargs = resolve(request.path_info)
+            response = view_func(request, *args, **kwargs)
+        except Exception as exc:
+            self.stdout.write(self.style.WARNING(
+                f'Error rendering lab {lab.url}: {exc}'))
+            return False
+        if response.status_code != 200:
+            self.stdout.write(self.style.ERROR(
+                f'HTTP {response.status_code} rendering lab: {lab.url}'))
+            return False
+        self.stdout.write(
+            self.style.SUCCESS(f'Warmed lab [{len(response.content)} bytes]: ')
+            + lab.url)
+        return True
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labs', '0002_cachedlab'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cachedlab',
+            name='hits',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labs', '0003_cachedlab_hits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cachedlab',
+            name='size',
+            field=models.PositiveIntegerField(default=0, help_text='Bytes stored in the cache'),
+        ),
+    ]
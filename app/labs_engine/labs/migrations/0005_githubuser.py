@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labs', '0004_cachedlab_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GitHubUser',
+            fields=[
+                ('key', models.CharField(help_text='Lowercase login, as GitHub logins are case-insensitive', max_length=39, primary_key=True, serialize=False)),
+                ('login', models.CharField(max_length=39)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('avatar_url', models.URLField(blank=True, max_length=255)),
+                ('found', models.BooleanField(default=True, help_text='False if GitHub has no user with this login')),
+                ('fetched', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -29,7 +29,27 @@ class CachedLab(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
     url = models.URLField(max_length=255)
+    hits = models.PositiveBigIntegerField(default=0)
+    size = models.PositiveIntegerField(
+        default=0, help_text='Bytes stored in the cache')
 
     def __str__(self):
         """Return a string representation of self."""
         return f"CachedLab({self.url})"
+
+
+class GitHubUser(models.Model):
+    """GitHub profile of a lab contributor, stored to limit API requests."""
+    key = models.CharField(
+        max_length=39, primary_key=True,
+        help_text='Lowercase login, as GitHub logins are case-insensitive')
+    login = models.CharField(max_length=39)
+    name = models.CharField(max_length=255, blank=True)
+    avatar_url = models.URLField(max_length=255, blank=True)
+    found = models.BooleanField(
+        default=True, help_text='False if GitHub has no user with this login')
+    fetched = models.DateTimeField()
+
+    def __str__(self):
+        """Return a string representation of self."""
+        return f"GitHubUser({self.login})"
@@ -1,9 +1,31 @@
+import gzip
+import json
 import requests_mock
+import shutil
+import tempfile
+import time
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from io import StringIO
+from urllib.parse import quote
 from pathlib import Path
 from unittest.mock import Mock, patch
 
+from labs_engine.reporting.models import Lab, LabVisit
 from labs_engine.utils.formatters import EmbeddedYouTubeUrl
+from .bake import MANIFEST_FILENAME, MAP_FILENAME
+from .cache import AccessRecorder, LabCache, lab_cache
+from .compression import negotiate
+from .github import GITHUB_GRAPHQL_URL, GITHUB_USERNAME_URL, resolve_users
+from .github_client import GitHubClient, RateLimited
 from .lab_export import ExportLabContext
+from .models import CachedLab, GitHubUser
+from .tiered_cache import LocalLRU, TieredCache
+from .warmup import is_warm, rank_labs
 from .audit import (
     extract_tool_links,
     check_tool_exists,
@@ -167,6 +189,633 @@ class LabExportTestCase(TestCase):
         self.assertContains(response, 'doi.org')
 
 
+@patch('labs_engine.labs.cache.NOCACHE', False)
+@override_settings(CACHE_ADMIT_AFTER_REQUESTS=1)
+class LabCacheTestCase(TestCase):
+    """Test caching of rendered lab pages."""
+
+    def setUp(self):
+        super().setUp()
+        lab_cache.clear()
+        self.factory = RequestFactory()
+        self.recorder = AccessRecorder(interval=60)
+        patcher = patch('labs_engine.labs.cache.access_recorder',
+                        self.recorder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        lab_cache.clear()
+        super().tearDown()
+
+    def test_cache_hit_does_not_query_database(self):
+        request = self.factory.get(TEST_LAB_URL)
+        LabCache.put(request, 'Lab content')
+        lab = CachedLab.objects.get()
+        with self.assertNumQueries(0):
+            response = LabCache.get(self.factory.get(TEST_LAB_URL))
+        self.assertEqual(response['X-Cache-Status'], 'HIT')
+        self.assertEqual(response.content, b'Lab content')
+        lab.refresh_from_db()
+        self.assertEqual(lab.hits, 0)
+
+    def test_accesses_are_flushed_in_batches(self):
+        request = self.factory.get(TEST_LAB_URL)
+        other_request = self.factory.get(
+            TEST_LAB_URL.replace('docs', 'simple'))
+        LabCache.put(request, 'Lab content')
+        LabCache.put(other_request, 'Other content')
+        key, _ = LabCache._generate_cache_key(request)
+        other_key, _ = LabCache._generate_cache_key(other_request)
+        before = CachedLab.objects.get(key=key).modified
+        for _ in range(3):
+            LabCache.get(request)
+        LabCache.get(other_request)
+        with self.assertNumQueries(2):
+            self.recorder.flush()
+        lab = CachedLab.objects.get(key=key)
+        self.assertEqual(lab.hits, 3)
+        self.assertGreater(lab.modified, before)
+        self.assertEqual(CachedLab.objects.get(key=other_key).hits, 1)
+        with self.assertNumQueries(0):
+            self.recorder.flush()
+
+    def test_recorder_flushes_after_interval(self):
+        LabCache.put(self.factory.get(TEST_LAB_URL), 'Lab content')
+        self.recorder.interval = 0
+        LabCache.get(self.factory.get(TEST_LAB_URL))
+        self.assertEqual(CachedLab.objects.get().hits, 1)
+
+    def test_failed_flush_keeps_accesses(self):
+        LabCache.put(self.factory.get(TEST_LAB_URL), 'Lab content')
+        self.recorder.interval = 0
+        with patch.object(
+            CachedLab.objects,
+            'filter',
+            side_effect=DatabaseError('database is locked'),
+        ):
+            response = LabCache.get(self.factory.get(TEST_LAB_URL))
+            self.assertEqual(response['X-Cache-Status'], 'HIT')
+            LabCache.get(self.factory.get(TEST_LAB_URL))
+        self.assertEqual(CachedLab.objects.get().hits, 0)
+        self.recorder.flush()
+        self.assertEqual(CachedLab.objects.get().hits, 2)
+
+    def test_put_updates_existing_record(self):
+        LabCache.put(self.factory.get(TEST_LAB_URL), 'Lab content')
+        LabCache.put(self.factory.get(TEST_LAB_URL), 'New content')
+        self.assertEqual(CachedLab.objects.count(), 1)
+        response = LabCache.get(self.factory.get(TEST_LAB_URL))
+        self.assertEqual(response.content, b'New content')
+
+    def test_cached_page_is_sent_compressed(self):
+        LabCache.put(self.factory.get(TEST_LAB_URL), 'Lab content')
+        response = LabCache.get(self.factory.get(
+            TEST_LAB_URL, HTTP_ACCEPT_ENCODING='gzip, deflate'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(
+            response['Content-Length'], str(len(response.content)))
+        self.assertEqual(gzip.decompress(response.content), b'Lab content')
+
+    def test_cached_page_is_sent_uncompressed_if_not_accepted(self):
+        LabCache.put(self.factory.get(TEST_LAB_URL), 'Lab content')
+        response = LabCache.get(self.factory.get(
+            TEST_LAB_URL, HTTP_ACCEPT_ENCODING='gzip;q=0'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.content, b'Lab content')
+
+    def test_unchanged_page_is_not_modified(self):
+        LabCache.put(self.factory.get(TEST_LAB_URL), 'Lab content')
+        response = LabCache.get(self.factory.get(TEST_LAB_URL))
+        etag = response['ETag']
+        self.assertIn('max-age=300', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response = LabCache.get(
+            self.factory.get(TEST_LAB_URL, HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('max-age=300', response['Cache-Control'])
+
+        # Compressed variants are different representations
+        response = LabCache.get(self.factory.get(
+            TEST_LAB_URL,
+            HTTP_IF_NONE_MATCH=etag,
+            HTTP_ACCEPT_ENCODING='gzip',
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        LabCache.put(self.factory.get(TEST_LAB_URL), 'New content')
+        response = LabCache.get(
+            self.factory.get(TEST_LAB_URL, HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'New content')
+
+    @override_settings(CACHE_TIMEOUT=60)
+    def test_max_age_is_limited_by_cache_timeout(self):
+        response = LabCache.put(self.factory.get(TEST_LAB_URL), 'Content')
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+    @override_settings(CACHE_ADMIT_AFTER_REQUESTS=2)
+    def test_lab_is_cached_after_repeated_requests(self):
+        with patch('labs_engine.labs.cache.compress_variants') as compress:
+            response = LabCache.put(
+                self.factory.get(TEST_LAB_URL), 'Lab content')
+        # Pages which aren't cached aren't compressed
+        compress.assert_not_called()
+        self.assertEqual(response.content, b'Lab content')
+        self.assertIsNone(LabCache.get(self.factory.get(TEST_LAB_URL)))
+        self.assertFalse(CachedLab.objects.exists())
+        LabCache.put(self.factory.get(TEST_LAB_URL), 'Lab content')
+        self.assertIsNotNone(LabCache.get(self.factory.get(TEST_LAB_URL)))
+        # Cached labs are re-admitted immediately e.g. by update_cache
+        lab_cache.clear()
+        LabCache.put(self.factory.get(TEST_LAB_URL), 'Lab content')
+        self.assertIsNotNone(LabCache.get(self.factory.get(TEST_LAB_URL)))
+        # The default lab is always cached
+        LabCache.put(self.factory.get('/'), 'Default lab')
+        self.assertIsNotNone(LabCache.get(self.factory.get('/')))
+
+    def test_least_used_labs_are_evicted_over_budget(self):
+        requests = [
+            self.factory.get(f'/?content_root=https://example.com/{i}.yml')
+            for i in range(3)
+        ]
+        keys = [LabCache._generate_cache_key(r)[0] for r in requests]
+        for request in requests[:2]:
+            LabCache.put(request, 'Lab content' * 100)
+        CachedLab.objects.filter(key=keys[0]).update(hits=5)
+        size = CachedLab.objects.get(key=keys[0]).size
+        with override_settings(CACHE_MAX_BYTES=size * 2):
+            LabCache.put(requests[2], 'Lab content' * 100)
+        self.assertEqual(
+            set(CachedLab.objects.values_list('key', flat=True)),
+            {keys[0], keys[2]})
+        self.assertIsNone(LabCache.get(requests[1]))
+        self.assertIsNotNone(LabCache.get(requests[0]))
+
+        with override_settings(
+            CACHE_MAX_BYTES=size, CACHE_EVICTION_POLICY='lru',
+        ):
+            self.assertEqual(LabCache._evict(), 1)
+        self.assertEqual(
+            list(CachedLab.objects.values_list('key', flat=True)),
+            [keys[2]])
+
+    def test_equivalent_lab_urls_share_a_cache_key(self):
+        github_url = 'https://github.com/org/repo/blob/main/lab/base.yml'
+        raw_url = (
+            'https://raw.githubusercontent.com/org/repo/main/lab/base.yml')
+        key, url = LabCache._generate_cache_key(self.factory.get(
+            '/', {'content_root': raw_url, 'audit': ''}))
+        self.assertEqual(url, '/?audit=&content_root=' + quote(raw_url, ''))
+        for params in (
+            {'audit': '1', 'content_root': raw_url},
+            {'content_root': github_url, 'audit': 'true'},
+            {'content_root': raw_url.replace('https://raw', 'HTTPS://Raw'),
+             'audit': '', 'nonce': '123', 'cache': 'true', 'utm_id': 'x'},
+        ):
+            self.assertEqual(
+                LabCache._generate_cache_key(
+                    self.factory.get('/', params))[0],
+                key,
+                params,
+            )
+        other_key, _ = LabCache._generate_cache_key(
+            self.factory.get('/', {'content_root': raw_url}))
+        self.assertNotEqual(other_key, key)
+
+    def test_content_encoding_negotiation(self):
+        both = ('br', 'gzip')
+        self.assertEqual(negotiate('gzip, deflate, br', both), 'br')
+        self.assertEqual(negotiate('br;q=0.5, gzip', both), 'gzip')
+        self.assertEqual(negotiate('*', both), 'br')
+        self.assertEqual(negotiate('*, br;q=0', both), 'gzip')
+        self.assertEqual(negotiate('br', ('gzip',)), 'identity')
+        self.assertEqual(negotiate(None, both), 'identity')
+
+
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': LOCMEM_CACHE, 'LOCATION': 'default'},
+    'shared': {'BACKEND': LOCMEM_CACHE, 'LOCATION': 'shared'},
+})
+class TieredCacheTestCase(TestCase):
+    """Test the tiered cache used for rendered lab pages."""
+
+    def setUp(self):
+        super().setUp()
+        self.workers = [self._make_cache() for _ in range(2)]
+
+    def tearDown(self):
+        caches['default'].clear()
+        caches['shared'].clear()
+        super().tearDown()
+
+    def _make_cache(self, tiers=('shared', 'default')):
+        return TieredCache('test', {
+            'TIMEOUT': None,
+            'OPTIONS': {
+                'TIERS': tiers,
+                'MAX_BYTES': 1024,
+                'SYNC_SECONDS': 0,
+            },
+        })
+
+    def test_read_through_fills_upper_tiers(self):
+        first, second = self.workers
+        first.set('lab', 'content', timeout=30)
+        caches['shared'].delete('lab')
+        self.assertEqual(second.get('lab'), 'content')
+        # The shared tier is refilled with the original expiry
+        shared = caches['shared']
+        self.assertAlmostEqual(
+            shared._expire_info[shared.make_key('lab')],
+            caches['default']._expire_info[shared.make_key('lab')],
+            delta=1,
+        )
+        # Now served from memory without reading the tiers
+        caches['default'].delete('lab')
+        caches['shared'].delete('lab')
+        self.assertEqual(second.get('lab'), 'content')
+
+    def test_values_set_by_other_caches_are_read(self):
+        caches['default'].set('lab', 'content')
+        self.assertEqual(self.workers[0].get('lab'), 'content')
+
+    def test_local_tier_is_reread_after_local_timeout(self):
+        worker = self.workers[0]
+        worker.set('lab', 'content')
+        self.assertEqual(worker.get('lab'), 'content')
+        worker.local_timeout = 0
+        worker.set('lab', 'content')
+        self.assertEqual(worker.get('lab'), 'content')
+        caches['default'].delete('lab')
+        caches['shared'].delete('lab')
+        self.assertIsNone(worker.get('lab'))
+
+    def test_concurrent_publishes_are_not_lost(self):
+        first, second = self.workers
+        first.set('lab', 'old')
+        first.set('other', 'old')
+        self.assertEqual(second.get('lab'), 'old')
+        self.assertEqual(second.get('other'), 'old')
+        # Simulate a non-atomic incr giving two workers the same seq
+        seq_key = first._log_key('seq')
+        seq = caches['shared'].get(seq_key)
+        first.set('other', 'new')
+        caches['shared'].set(seq_key, seq)
+        first.set('lab', 'new')
+        self.assertEqual(second.get('lab'), 'new')
+        self.assertEqual(second.get('other'), 'new')
+
+    def test_changes_invalidate_other_workers(self):
+        first, second = self.workers
+        first.set('lab', 'old')
+        self.assertEqual(second.get('lab'), 'old')
+        first.set('lab', 'new')
+        self.assertEqual(second.get('lab'), 'new')
+        first.delete('lab')
+        self.assertIsNone(second.get('lab'))
+        first.set('lab', 'content')
+        self.assertEqual(second.get('lab'), 'content')
+        first.clear()
+        self.assertIsNone(second.get('lab'))
+        self.assertEqual(len(second.local), 0)
+
+    def test_unavailable_tier_is_skipped(self):
+        worker = self._make_cache(tiers=('missing', 'default'))
+        worker.set('lab', 'content')
+        self.assertEqual(caches['default'].get('lab').value, 'content')
+        worker.local.clear()
+        self.assertEqual(worker.get('lab'), 'content')
+
+    def test_local_tier_is_bounded_by_size(self):
+        lru = LocalLRU(max_bytes=10)
+        lru.set('a', 'x' * 4, None)
+        lru.set('b', 'x' * 4, None)
+        lru.get('a')
+        lru.set('c', 'x' * 4, None)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 'xxxx')
+        self.assertEqual(lru.size, 8)
+        lru.set('d', 'x' * 11, None)
+        self.assertIsNone(lru.get('d'))
+
+
+class BakeLabsTestCase(TestCase):
+    """Test rendering labs to static files."""
+
+    def setUp(self):
+        super().setUp()
+        self.output = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.output, ignore_errors=True)
+        super().tearDown()
+
+    def _bake(self, *urls, **options):
+        with requests_mock.Mocker() as mock_request:
+            for r in MOCK_REQUESTS:
+                mock_request.get(r['url_pattern'],
+                                 text=r['response'],
+                                 status_code=r.get('status_code', 200))
+            mock_request.get(
+                'https://example.com/missing/base.yml', status_code=404)
+            call_command(
+                'bake_labs',
+                url=list(urls),
+                output=self.output,
+                no_runserver=True,
+                stdout=StringIO(),
+                **options,
+            )
+        with (self.output / MANIFEST_FILENAME).open() as f:
+            return json.load(f)['labs']
+
+    def test_labs_are_baked_to_content_addressed_files(self):
+        labs = self._bake(TEST_LAB_URL)
+        self.assertEqual(len(labs), 1)
+        url, entry = labs.popitem()
+        key, expected_url = LabCache._generate_cache_key(
+            RequestFactory().get(TEST_LAB_URL))
+        self.assertEqual(url, expected_url)
+        self.assertEqual(entry['key'], key)
+        self.assertEqual(entry['file'], f"objects/{entry['sha256']}.html")
+        page = self.output / entry['file']
+        self.assertIn(TEST_LAB_NAME, page.read_text())
+        self.assertEqual(
+            gzip.decompress(Path(f'{page}.gz').read_bytes()),
+            page.read_bytes())
+        nginx_map = (self.output / MAP_FILENAME).read_text()
+        self.assertIn(f'"{url}" "/{entry["file"]}";', nginx_map)
+        self.assertIn(f'"{TEST_LAB_URL}" "/{entry["file"]}";', nginx_map)
+
+    def test_failed_labs_keep_their_last_baked_page(self):
+        missing_url = '/?content_root=https://example.com/missing/base.yml'
+        baked = self._bake(TEST_LAB_URL)
+        rebaked = self._bake(TEST_LAB_URL, missing_url)
+        self.assertEqual(rebaked.keys(), baked.keys())
+        url = next(iter(baked))
+        self.assertEqual(rebaked[url]['file'], baked[url]['file'])
+
+        # Labs which are no longer requested are dropped
+        self.assertEqual(self._bake(missing_url, prune=True), {})
+        self.assertEqual(list((self.output / 'objects').iterdir()), [])
+
+    def test_nginx_is_reloaded_before_pruning(self):
+        missing_url = '/?content_root=https://example.com/missing/base.yml'
+        self._bake(TEST_LAB_URL)
+        objects = list((self.output / 'objects').iterdir())
+        with self.assertRaises(CommandError):
+            self._bake(missing_url, prune=True, reload_cmd='false')
+        self.assertEqual(list((self.output / 'objects').iterdir()), objects)
+        self._bake(missing_url, prune=True, reload_cmd='true')
+        self.assertEqual(list((self.output / 'objects').iterdir()), [])
+
+
+@patch('labs_engine.labs.cache.NOCACHE', False)
+class WarmCacheTestCase(TestCase):
+    """Test warming the cache with the busiest labs."""
+
+    def setUp(self):
+        super().setUp()
+        lab_cache.clear()
+        settings.CACHE_WARM_MARKER.unlink(missing_ok=True)
+        patcher = patch('labs_engine.labs.warmup._warm', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        lab_cache.clear()
+        settings.CACHE_WARM_MARKER.unlink(missing_ok=True)
+        super().tearDown()
+
+    def _cached_lab(self, url, **fields):
+        key, url = LabCache._generate_cache_key(RequestFactory().get(url))
+        return CachedLab.objects.create(key=key, url=url, **fields)
+
+    def test_labs_are_ranked_by_traffic(self):
+        codex = 'https://example.com/galaxy_codex/main/communities'
+        genome = self._cached_lab(
+            f'/?content_root={codex}/genome/lab/base.yml', hits=1)
+        proteomics = self._cached_lab(
+            f'/?content_root={codex}/proteomics/lab/base.yml', hits=5)
+        default = self._cached_lab('/')
+        old = self._cached_lab(
+            f'/?content_root={codex}/old/lab/base.yml', hits=100)
+        CachedLab.objects.filter(key=old.key).update(
+            modified=timezone.now() - timezone.timedelta(days=365))
+        lab = Lab.objects.create(name='genome')
+        LabVisit.objects.bulk_create([
+            LabVisit(lab=lab, datetime=timezone.now()) for _ in range(10)
+        ])
+        self.assertEqual(rank_labs(), [default, genome, proteomics])
+        self.assertEqual(rank_labs(limit=2), [default, genome])
+
+    def test_ready_once_labs_are_warmed(self):
+        self._cached_lab(TEST_LAB_URL)
+        self.assertEqual(self.client.get('/ready').status_code, 503)
+        with requests_mock.Mocker() as mock_request:
+            for r in MOCK_REQUESTS:
+                mock_request.get(r['url_pattern'],
+                                 text=r['response'],
+                                 status_code=r.get('status_code', 200))
+            call_command(
+                'warm_cache',
+                concurrency=1,
+                no_runserver=True,
+                stdout=StringIO(),
+            )
+        self.assertTrue(is_warm())
+        response = LabCache.get(RequestFactory().get(TEST_LAB_URL))
+        self.assertContains(response, TEST_LAB_NAME)
+        self.assertEqual(self.client.get('/ready').status_code, 200)
+        # Readiness is latched, e.g. when update_cache clears the cache
+        lab_cache.clear()
+        CachedLab.objects.all().delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/ready').status_code, 200)
+
+
+GITHUB_AVATAR_URL = 'https://avatars.githubusercontent.com/u/1?v=4'
+
+
+@override_settings(GITHUB_API_TOKENS=['token'], GITHUB_USERS_BACKEND=None)
+class GitHubUsersTestCase(TestCase):
+    """Test resolving contributors' GitHub profiles."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def _mock_graphql(self, mock_request, **kwargs):
+        """Mock GitHub GraphQL, where only alice exists."""
+        def respond(request, context):
+            data, errors = {}, []
+            for name, login in request.json()['variables'].items():
+                alias = 'u' + name[1:]
+                if login.lower() == 'alice':
+                    data[alias] = {
+                        'login': 'Alice',
+                        'name': 'Alice A',
+                        'avatarUrl': GITHUB_AVATAR_URL,
+                    }
+                else:
+                    data[alias] = None
+                    errors.append({'type': 'NOT_FOUND', 'path': [alias]})
+            return {'data': data, 'errors': errors}
+
+        return mock_request.post(
+            GITHUB_GRAPHQL_URL, **(kwargs or {'json': respond}))
+
+    def test_users_are_fetched_in_one_request_and_stored(self):
+        with requests_mock.Mocker() as mock_request:
+            graphql = self._mock_graphql(mock_request)
+            users = resolve_users(['ghost', 'alice'])
+            self.assertEqual(graphql.call_count, 1)
+            self.assertEqual(
+                graphql.last_request.json()['variables'],
+                {'l0': 'ghost', 'l1': 'alice'})
+        self.assertEqual(users[0]['avatar_url'], GITHUB_AVATAR_URL)
+        self.assertEqual(users[1], {'login': 'ghost'})
+
+    def test_stored_users_are_not_requested_again(self):
+        with requests_mock.Mocker() as mock_request:
+            graphql = self._mock_graphql(mock_request)
+            first = resolve_users(['alice', 'ghost'])
+            second = resolve_users(['ALICE', 'ghost'])
+            self.assertEqual(graphql.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertFalse(GitHubUser.objects.get(key='ghost').found)
+
+    def test_stale_users_are_served_if_github_fails(self):
+        with requests_mock.Mocker() as mock_request:
+            self._mock_graphql(mock_request)
+            resolve_users(['alice', 'ghost'])
+        GitHubUser.objects.update(
+            fetched=timezone.now() - timezone.timedelta(days=365))
+        with requests_mock.Mocker() as mock_request:
+            graphql = self._mock_graphql(mock_request, status_code=502)
+            users = resolve_users(['alice', 'ghost'])
+            self.assertEqual(graphql.call_count, 1)
+        self.assertEqual(users[0]['name'], 'Alice A')
+
+    @override_settings(GITHUB_USERS_BACKEND='local')
+    def test_local_backend_makes_no_requests(self):
+        with requests_mock.Mocker():
+            users = resolve_users(['alice'])
+        self.assertEqual(
+            users[0]['avatar_url'], 'https://github.com/alice.png')
+
+    @override_settings(GITHUB_AVATAR_PROXY=True)
+    def test_avatars_are_proxied_and_cached(self):
+        with requests_mock.Mocker() as mock_request:
+            self._mock_graphql(mock_request)
+            avatar = mock_request.get(
+                GITHUB_AVATAR_URL,
+                content=b'PNG',
+                headers={'Content-Type': 'image/png'},
+            )
+            user = resolve_users(['alice'])[0]
+            self.assertEqual(user['avatar_url'], '/github/avatar/alice')
+            for _ in range(2):
+                response = self.client.get(user['avatar_url'])
+                self.assertEqual(response.content, b'PNG')
+                self.assertEqual(response['Content-Type'], 'image/png')
+            self.assertEqual(avatar.call_count, 1)
+            self.assertEqual(avatar.last_request.qs['s'], ['96'])
+        self.assertEqual(
+            self.client.get('/github/avatar/ghost').status_code, 404)
+
+
+@override_settings(
+    GITHUB_API_TOKENS=['token-a', 'token-b'],
+    GITHUB_USERS_BACKEND='rest',
+)
+class GitHubClientTestCase(TestCase):
+    """Test spending the GitHub API rate limit of a pool of tokens."""
+
+    url = GITHUB_USERNAME_URL.format(username='alice')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.reset = int(time.time()) + 3600
+
+    def _rate_limit(self, remaining, status_code=200):
+        return {
+            'status_code': status_code,
+            'json': {'login': 'alice'},
+            'headers': {
+                'X-RateLimit-Limit': '5000',
+                'X-RateLimit-Remaining': str(remaining),
+                'X-RateLimit-Reset': str(self.reset),
+            },
+        }
+
+    def test_exhausted_token_is_skipped_for_the_next(self):
+        client = GitHubClient(['token-a', 'token-b'])
+        with requests_mock.Mocker() as mock_request:
+            api = mock_request.get(self.url, [
+                self._rate_limit(0, status_code=403),
+                self._rate_limit(99),
+                self._rate_limit(98),
+            ])
+            self.assertEqual(client.request('GET', self.url).status_code, 200)
+            client.request('GET', self.url)
+            tokens = [
+                request.headers['Authorization']
+                for request in api.request_history
+            ]
+        self.assertEqual(
+            tokens, ['Bearer token-a', 'Bearer token-b', 'Bearer token-b'])
+        budget = {entry['token']: entry for entry in client.budget()
+                  if entry['resource'] == 'core'}
+        self.assertEqual(len(budget), 2)
+        self.assertEqual(
+            sorted(entry['remaining'] for entry in budget.values()), [0, 98])
+        self.assertTrue(any(entry['exhausted'] for entry in budget.values()))
+        self.assertNotIn('token-a', json.dumps(client.budget()))
+
+    def test_no_requests_are_made_once_budget_is_exhausted(self):
+        client = GitHubClient(['token-a', 'token-b'])
+        with requests_mock.Mocker() as mock_request:
+            api = mock_request.get(
+                self.url, **self._rate_limit(0, status_code=403))
+            with self.assertRaises(RateLimited):
+                client.request('GET', self.url)
+            self.assertEqual(api.call_count, 2)
+
+            # Other workers share the budget through the cache
+            with self.assertRaises(RateLimited) as raised:
+                GitHubClient(['token-b', 'token-a']).request('GET', self.url)
+            self.assertEqual(api.call_count, 2)
+            self.assertEqual(raised.exception.reset, self.reset)
+
+            users = resolve_users(['alice'])
+            self.assertEqual(api.call_count, 2)
+        self.assertEqual(users, [{'login': 'alice'}])
+
+    def test_budget_command(self):
+        with requests_mock.Mocker() as mock_request:
+            mock_request.get(self.url, **self._rate_limit(42))
+            resolve_users(['alice'])
+        out = StringIO()
+        call_command('github_budget', '--json', stdout=out)
+        remaining = [entry['remaining'] for entry in json.loads(
+            out.getvalue())]
+        self.assertIn(42, remaining)
+        self.assertIn(None, remaining)
+
+
 class AuditTestCase(TestCase):
     """Test audit functionality for tool link checking."""
 
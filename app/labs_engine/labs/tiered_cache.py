@@ -0,0 +1,314 @@
+"""A cache backend which layers an in-process LRU over other caches.
+
+Rendered lab pages are large and read far more often than written, so they
+are served from a memory-bounded LRU in each worker where possible. On a local
+miss, each configured tier (e.g. Redis, then the database cache) is tried in
+turn, and a hit is copied into the tiers above it.
+
+Values are stored in the tiers with their expiry time, so a value copied into
+a tier above keeps its original expiry rather than starting a new timeout.
+
+Writes go to every tier. Other workers may still hold the old value in memory,
+so each write is also published to an invalidation log in the first shared
+tier. Workers read the log at most once every ``SYNC_SECONDS`` and drop the
+keys listed. Log entries are claimed with ``add``, so two workers publishing
+at once don't overwrite each other's entry even where ``incr`` isn't atomic
+(e.g. the database cache). In case an invalidation is still missed (e.g. the
+first tier is briefly unavailable), values are only served from memory for
+``LOCAL_TIMEOUT`` seconds before being read from the shared tiers again.
+
+Example configuration::
+
+    CACHES['labs'] = {
+        'BACKEND': 'labs_engine.labs.tiered_cache.TieredCache',
+        'LOCATION': 'labs',  # namespace of the invalidation log
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'TIERS': ['redis', 'default'],  # other cache aliases
+            'MAX_BYTES': 64 * 1024 * 1024,
+            'SYNC_SECONDS': 1,
+            'LOCAL_TIMEOUT': 60,
+        },
+    }
+"""
+
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+CLEAR = '__clear__'
+# Invalidation log entries outlive any reasonable SYNC_SECONDS
+LOG_TIMEOUT = 60 * 60
+# Workers further behind than this drop their whole local tier
+MAX_LOG_BACKLOG = 1000
+# Attempts to claim an invalidation log entry when others publish at once
+PUBLISH_ATTEMPTS = 5
+
+logger = logging.getLogger('django.cache')
+
+
+class LocalLRU:
+    """A thread-safe LRU mapping bounded by the total size of its values."""
+
+    def __init__(self, max_bytes):
+        """Create an empty LRU holding at most ``max_bytes`` of values."""
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expiry = entry
+            if expiry is not None and expiry <= time.time():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expiry):
+        """Store a value, evicting the least recently used as required.
+
+        Values larger than the whole budget are not stored.
+        """
+        size = _sizeof(value)
+        with self._lock:
+            self._pop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, expiry)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key):
+        """Remove a key, returning True if it was present."""
+        with self._lock:
+            return self._pop(key)
+
+    def clear(self):
+        """Remove all keys."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.size -= entry[1]
+        return True
+
+
+class Entry(NamedTuple):
+    """A value stored in the tiers, with its expiry time (None for never)."""
+
+    value: object
+    expiry: float = None
+
+
+class TieredCache(BaseCache):
+    """Read-through cache of an in-process LRU and other cache aliases."""
+
+    def __init__(self, location, params):
+        """Create the cache from its CACHES settings."""
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.namespace = location or 'tiered'
+        self.tiers = list(options.get('TIERS', ['default']))
+        self.sync_seconds = options.get('SYNC_SECONDS', 1)
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 60)
+        self.local = LocalLRU(options.get('MAX_BYTES', 64 * 1024 * 1024))
+        self._seq = None
+        self._last_sync = 0
+        self._sync_lock = threading.Lock()
+
+    def get(self, key, default=None, version=None):
+        """Return a value from the first tier holding it."""
+        self._sync()
+        local_key = self.make_and_validate_key(key, version=version)
+        value = self.local.get(local_key)
+        if value is not None:
+            return value
+        missed = []
+        for alias in self.tiers:
+            entry = self._call(alias, 'get', key, version=version)
+            if not isinstance(entry, Entry) and entry is not None:
+                # Stored without an expiry by something other than this cache
+                entry = Entry(
+                    entry, self.get_backend_timeout(self.default_timeout))
+            if entry is not None and not _expired(entry):
+                break
+            missed.append(alias)
+        else:
+            return default
+        timeout = _timeout(entry)
+        for alias in missed:
+            self._call(alias, 'set', key, entry, timeout, version=version)
+        self._set_local(local_key, entry)
+        return entry.value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Store a value in every tier."""
+        local_key = self.make_and_validate_key(key, version=version)
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        entry = Entry(value, self.get_backend_timeout(timeout))
+        for alias in reversed(self.tiers):
+            self._call(alias, 'set', key, entry, timeout, version=version)
+        self._publish(local_key)
+        self._set_local(local_key, entry)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Store a value only if the key isn't already cached."""
+        if self.has_key(key, version=version):
+            return False
+        self.set(key, value, timeout, version=version)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        """Update the expiry of a key in every tier."""
+        # The expiry is stored with the value, so the value is rewritten
+        value = self.get(key, version=version)
+        if value is None:
+            return False
+        self.set(key, value, timeout, version=version)
+        return True
+
+    def delete(self, key, version=None):
+        """Remove a key from every tier, including other workers' memory."""
+        local_key = self.make_and_validate_key(key, version=version)
+        deleted = [
+            self._call(alias, 'delete', key, version=version)
+            for alias in self.tiers
+        ]
+        self._publish(local_key)
+        return self.local.delete(local_key) or any(deleted)
+
+    def clear(self):
+        """Clear every tier, including other workers' memory.
+
+        Note that this clears the whole of each underlying cache.
+        """
+        for alias in self.tiers:
+            self._call(alias, 'clear')
+        self.local.clear()
+        self._publish(CLEAR)
+
+    def _set_local(self, local_key, entry):
+        """Store an entry in memory for at most LOCAL_TIMEOUT seconds."""
+        expiry = entry.expiry
+        if self.local_timeout is not None:
+            local_expiry = time.time() + self.local_timeout
+            expiry = local_expiry if expiry is None else min(
+                expiry, local_expiry)
+        self.local.set(local_key, entry.value, expiry)
+
+    def _call(self, alias, method, *args, **kwargs):
+        """Call a method of a tier, treating errors as a cache miss.
+
+        A tier being unavailable (e.g. Redis restarting) shouldn't take lab
+        pages down with it, as the tiers below can still serve them.
+        """
+        try:
+            return getattr(caches[alias], method)(*args, **kwargs)
+        except Exception as exc:
+            logger.warning(f"Error calling {method} on cache '{alias}': {exc}")
+            return None
+
+    @property
+    def _log_tier(self):
+        return self.tiers[0]
+
+    def _log_key(self, suffix):
+        return f"tiered_cache:{self.namespace}:{suffix}"
+
+    def _publish(self, local_key):
+        """Add a key (or CLEAR) to the shared invalidation log."""
+        seq_key = self._log_key('seq')
+        # The counter is missing at first, or after the tier is cleared
+        self._call(self._log_tier, 'add', seq_key, 0, None)
+        for _ in range(PUBLISH_ATTEMPTS):
+            seq = self._call(self._log_tier, 'incr', seq_key)
+            if seq is None:
+                return
+            # If incr isn't atomic, another worker may have the same seq
+            if self._call(
+                self._log_tier,
+                'add',
+                self._log_key(seq),
+                local_key,
+                LOG_TIMEOUT,
+            ):
+                break
+        else:
+            logger.warning(
+                f"Could not publish invalidation of {local_key} - other"
+                " workers may serve it from memory for up to"
+                f" {self.local_timeout} seconds")
+            return
+        with self._sync_lock:
+            if self._seq is not None and seq == self._seq + 1:
+                # Our own change - no need to evict what we just stored
+                self._seq = seq
+
+    def _sync(self):
+        """Drop local keys which other workers have invalidated."""
+        now = time.monotonic()
+        if now - self._last_sync < self.sync_seconds:
+            return
+        with self._sync_lock:
+            if now - self._last_sync < self.sync_seconds:
+                return
+            self._last_sync = now
+            seq = self._call(self._log_tier, 'get', self._log_key('seq'), 0)
+            if seq is None or seq == self._seq:
+                return
+            if (
+                self._seq is None
+                or seq < self._seq
+                or seq - self._seq > MAX_LOG_BACKLOG
+            ):
+                # First sync, or we can't tell what changed
+                self.local.clear()
+            else:
+                log_keys = [
+                    self._log_key(n) for n in range(self._seq + 1, seq + 1)]
+                entries = self._call(
+                    self._log_tier, 'get_many', log_keys) or {}
+                if len(entries) < len(log_keys) or CLEAR in entries.values():
+                    self.local.clear()
+                else:
+                    for local_key in entries.values():
+                        self.local.delete(local_key)
+            self._seq = seq
+
+
+def _expired(entry):
+    return entry.expiry is not None and entry.expiry <= time.time()
+
+
+def _timeout(entry):
+    """Return the seconds until an entry expires, or None for never."""
+    if entry.expiry is None:
+        return None
+    return max(entry.expiry - time.time(), 1)
+
+
+def _sizeof(value):
+    """Estimate the memory used by a cached value."""
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
@@ -34,4 +34,10 @@ urlpatterns = [
         name='lab_tool_install',
     ),
     path('lab/feedback/<subdomain>', api.lab_feedback, name='lab_feedback'),
+    path('ready', views.ready, name='ready'),
+    path(
+        'github/avatar/<str:key>',
+        views.github_avatar,
+        name='github_avatar',
+    ),
 ]
@@ -4,8 +4,14 @@ import logging
 import traceback
 import django_rq
 from django.conf import settings
-from django.http import HttpResponse, JsonResponse
-from django.shortcuts import render
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+)
+from django.shortcuts import get_object_or_404, render
+from django.utils.cache import patch_cache_control
 from django.views.static import serve
 from django.template import (
     Context,
@@ -24,11 +30,14 @@ from .ai_generate.generator import (
 )
 from .cache import LabCache
 from .forms import LabBootstrapForm
+from .github import fetch_avatar
 from .lab_export import ExportLabContext
 from .lab_schema import DEPRECATED_PROPS
+from .models import GitHubUser
 from .audit import perform_template_audit
 from .tasks import run_bootstrap_lab
 from .templatetags.markdown import render_markdown
+from .warmup import is_warm
 
 REFERENCE_TEMPLATE_PATH = AI_GENERATE_DIR / 'reference_template.md'
 BOOTSTRAP_README_PATH = (
@@ -112,6 +121,34 @@ def export_lab(request):
     return response
 
 
+def github_avatar(request, key):
+    """Serve a contributor's GitHub avatar, so pages don't hot-link GitHub.
+
+    Redirects to GitHub if the avatar can't be fetched.
+    """
+    user = get_object_or_404(GitHubUser, key=key, found=True)
+    if not user.avatar_url:
+        raise Http404
+    avatar = fetch_avatar(user)
+    if avatar is None:
+        return HttpResponseRedirect(user.avatar_url)
+    content_type, content = avatar
+    response = HttpResponse(content, content_type=content_type)
+    patch_cache_control(
+        response, public=True, max_age=settings.GITHUB_AVATAR_CACHE_SECONDS)
+    return response
+
+
+def ready(request):
+    """Readiness check which passes once the busiest labs are cached.
+
+    The labs are rendered by the warm_cache management command.
+    """
+    if is_warm():
+        return JsonResponse({'ready': True})
+    return JsonResponse({'ready': False}, status=503)
+
+
 def schema(request):
     """Render the schema page."""
     return render(request, 'labs/schema.html')
@@ -0,0 +1,113 @@
+"""Rank cached labs by traffic so the busiest can be rendered first.
+
+After a deploy or a cache clear, the first visitor to each lab waits for a
+full render. The warm_cache command renders labs in the order given by
+``rank_labs`` and then writes CACHE_WARM_MARKER, so that ``is_warm`` can act
+as a readiness check. Readiness is latched: labs later evicted, expired or
+cleared by update_cache don't make a running deployment unready.
+"""
+
+import json
+import logging
+import os
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Count
+from django.utils import timezone
+from urllib.parse import parse_qs, urlsplit
+
+from labs_engine.labs.models import CachedLab
+from labs_engine.reporting.models import LabVisit
+
+logger = logging.getLogger('django.cache')
+
+
+def recent_visits(days):
+    """Return the number of visits to each lab in the last ``days`` days.
+
+    Returns an empty dict if the reporting database can't be read, since
+    warming the cache shouldn't depend on it.
+    """
+    since = timezone.now() - timezone.timedelta(days=days)
+    try:
+        return {
+            row['lab__name']: row['visits']
+            for row in LabVisit.objects.filter(datetime__gte=since)
+            .values('lab__name')
+            .annotate(visits=Count('id'))
+        }
+    except DatabaseError as exc:
+        logger.warning(f"Could not count recent lab visits: {exc}")
+        return {}
+
+
+def rank_labs(limit=None):
+    """Return active cached labs, busiest first.
+
+    Labs are scored by their cache hits plus recent visits recorded by
+    reporting. Visits are recorded by lab name (the subdomain of the lab's
+    Galaxy server), which is matched to any lab whose content_root has the
+    name as a path segment e.g. ``.../communities/genome/lab/base.yml``. The
+    default lab always comes first.
+
+    Args:
+        limit: maximum number of labs to return
+
+    Returns:
+        A list of CachedLab
+    """
+    labs = CachedLab.objects.filter(
+        modified__gt=timezone.now() - timezone.timedelta(
+            days=settings.CACHE_UPDATE_RETAIN_DAYS,
+        )
+    )
+    visits = recent_visits(settings.CACHE_WARM_TRAFFIC_DAYS)
+
+    def score(lab):
+        content_root = parse_qs(urlsplit(lab.url).query).get(
+            'content_root', [''])[0]
+        segments = set(urlsplit(content_root).path.split('/'))
+        return lab.hits + sum(
+            count for name, count in visits.items() if name in segments)
+
+    ranked = sorted(
+        labs,
+        key=lambda lab: (
+            lab.url != '/', -score(lab), -lab.modified.timestamp()),
+    )
+    return ranked[:limit]
+
+
+# Set once this process has seen CACHE_WARM_MARKER
+_warm = False
+
+
+def mark_warm(keys):
+    """Record that warm_cache has run, which makes this deployment ready.
+
+    Args:
+        keys: cache keys of the labs which were rendered
+
+    Returns:
+        The keys of those labs which were stored in the cache
+    """
+    keys = list(keys)
+    stored = sorted(
+        CachedLab.objects.filter(key__in=keys).values_list('key', flat=True))
+    path = settings.CACHE_WARM_MARKER
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.tmp')
+    tmp.write_text(json.dumps({
+        'warmed': timezone.now().isoformat(),
+        'keys': stored,
+    }))
+    os.replace(tmp, path)
+    return stored
+
+
+def is_warm():
+    """Return True once warm_cache has run in this deployment."""
+    global _warm
+    if not _warm:
+        _warm = settings.CACHE_WARM_MARKER.exists()
+    return _warm
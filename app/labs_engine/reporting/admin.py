@@ -1,38 +1,76 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-from .models import APIToken, LabVisit, ToolUsage
+from .models import (
+    APIToken,
+    Lab,
+    LabVisit,
+    LogCheckpoint,
+    Tool,
+    ToolUsage,
+)
 
 
 @admin.register(APIToken)
 class APITokenAdmin(admin.ModelAdmin):
     """Admin interface for API tokens."""
 
-    list_display = ['name', 'created', 'last_used', 'is_active']
+    list_display = ['name', 'prefix', 'created', 'last_used', 'is_active']
     list_filter = ['is_active', 'created']
-    search_fields = ['name']
-    readonly_fields = ['token', 'created', 'last_used']
+    search_fields = ['name', 'prefix']
+    readonly_fields = ['prefix', 'created', 'last_used']
 
     fieldsets = (
         (None, {
             'fields': ('name', 'is_active'),
         }),
         ('Token Information', {
-            'fields': ('token', 'created', 'last_used'),
+            'fields': ('prefix', 'created', 'last_used'),
             'description': (
                 'The token will be automatically generated when you save.'
+                ' It is only shown once - only a hash of the token is'
+                ' stored.'
             ),
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        """Show the generated token to the user once."""
+        super().save_model(request, obj, form, change)
+        if not change:
+            self.message_user(
+                request,
+                f'API token for "{obj.name}": {obj.token}'
+                ' - copy it now, it will not be shown again.',
+                messages.WARNING,
+            )
+
+
+@admin.register(Lab)
+class LabAdmin(admin.ModelAdmin):
+    """Admin interface for labs."""
+
+    list_display = ['name']
+    search_fields = ['name']
+
+
+@admin.register(Tool)
+class ToolAdmin(admin.ModelAdmin):
+    """Admin interface for tools."""
+
+    list_display = ['name', 'tool_id']
+    search_fields = ['tool_id', 'name']
+    readonly_fields = ['tool_id']
+
 
 @admin.register(LabVisit)
 class LabVisitAdmin(admin.ModelAdmin):
     """Admin interface for lab visits."""
 
-    list_display = ['lab_name', 'datetime']
-    list_filter = ['lab_name', 'datetime']
-    search_fields = ['lab_name']
-    readonly_fields = ['lab_name', 'datetime']
+    list_display = ['lab', 'datetime']
+    list_filter = ['lab', 'datetime']
+    list_select_related = ['lab']
+    search_fields = ['lab__name']
+    readonly_fields = ['lab', 'datetime']
     date_hierarchy = 'datetime'
 
     def has_add_permission(self, request):
@@ -48,10 +86,11 @@ class LabVisitAdmin(admin.ModelAdmin):
 class ToolUsageAdmin(admin.ModelAdmin):
     """Admin interface for tool usage records."""
 
-    list_display = ['tool_name', 'lab_name', 'datetime']
-    list_filter = ['lab_name', 'datetime']
-    search_fields = ['tool_id', 'tool_name', 'lab_name']
-    readonly_fields = ['tool_id', 'tool_name', 'lab_name', 'datetime']
+    list_display = ['tool', 'lab', 'datetime']
+    list_filter = ['lab', 'datetime']
+    list_select_related = ['lab', 'tool']
+    search_fields = ['tool__tool_id', 'tool__name', 'lab__name']
+    readonly_fields = ['tool', 'lab', 'datetime']
     date_hierarchy = 'datetime'
 
     def has_add_permission(self, request):
@@ -61,3 +100,19 @@ class ToolUsageAdmin(admin.ModelAdmin):
     def has_change_permission(self, request, obj=None):
         """Make tool usage records read-only."""
         return False
+
+
+@admin.register(LogCheckpoint)
+class LogCheckpointAdmin(admin.ModelAdmin):
+    """Admin interface for live log tailing checkpoints."""
+
+    list_display = ['path', 'inode', 'offset', 'modified']
+    readonly_fields = ['path', 'inode', 'offset', 'modified']
+
+    def has_add_permission(self, request):
+        """Disable manual creation - only via tail_logs."""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        """Make checkpoints read-only."""
+        return False
@@ -1,17 +1,43 @@
 """API endpoints."""
 
 import csv
+import logging
+import tempfile
+import django_rq
+from django.conf import settings
 from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Count
-from django.db.models.functions import TruncDate
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate, TruncHour
 from django.utils import timezone
-from datetime import timedelta, datetime
+from datetime import datetime, time, timedelta
 from collections import defaultdict
+from pathlib import Path
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
+from . import archive
 from .auth import authenticated
-from .nginx_logs import LOG_TYPE, import_nginx_log
-from .models import LabVisit, ToolUsage
+from .cache import ReportCache
+from .funnel import COUNT_FIELDS as FUNNEL_COUNT_FIELDS
+from .heatmap import HOURS, WEEKDAYS, build_heatmap
+from .log_formats import LOG_FORMATS
+from .nginx_logs import AUTO_DETECT, LOG_TYPE
+from .models import (
+    EVENT_FIELD_LOOKUPS,
+    HourlyCount,
+    Lab,
+    LabFunnel,
+    LabVisit,
+    Tool,
+    ToolTrend,
+    ToolUsage,
+    UniqueVisitorSketch,
+)
+from .tasks import run_import_logs
+from .trending import TrendCounter
+
+logger = logging.getLogger('django')
 
 
 def generate_date_range(start_date, end_date):
@@ -36,10 +62,259 @@ def generate_date_range(start_date, end_date):
     return dates
 
 
+def get_date_range(request):
+    """
+    Read the requested date range from GET parameters.
+
+    Uses start_date and end_date (YYYY-MM-DD) if both are given, otherwise
+    the last N days where N is the days parameter (default 90). The range is
+    snapped to whole days so that requests made on the same day give the
+    same range.
+
+    Returns:
+        tuple of aware (start_date, end_date) datetimes
+    """
+    start_date_str = request.GET.get('start_date')
+    end_date_str = request.GET.get('end_date')
+
+    if start_date_str and end_date_str:
+        # Parse custom date range
+        start_date = timezone.make_aware(
+            datetime.strptime(start_date_str, '%Y-%m-%d')
+        )
+        end_date = timezone.make_aware(
+            datetime.strptime(end_date_str, '%Y-%m-%d')
+        )
+        end_date = end_date.replace(hour=23, minute=59, second=59)
+    else:
+        # Use days parameter
+        days = int(request.GET.get('days', 90))
+        today = timezone.localdate()
+        start_date = timezone.make_aware(
+            datetime.combine(today - timedelta(days=days), time.min))
+        end_date = timezone.make_aware(
+            datetime.combine(today, time.max.replace(microsecond=0)))
+
+    return start_date, end_date
+
+
+def get_report_params(request):
+    """
+    Read the report parameters from GET parameters.
+
+    Parameters which don't affect the result are normalised away, so that
+    equivalent requests can share cached results.
+
+    Returns:
+        dict of metric, lab (None for all labs), tool (None for all tools),
+        start_date and end_date
+    """
+    metric = request.GET.get('metric', 'visits')
+    lab = request.GET.get('lab', 'all')
+    tool = request.GET.get('tool', 'all')
+    start_date, end_date = get_date_range(request)
+    return {
+        'metric': metric,
+        'lab': None if lab in ('', 'all') else lab,
+        'tool': (
+            None if metric != 'tools' or tool in ('', 'all') else tool),
+        'start_date': start_date,
+        'end_date': end_date,
+    }
+
+
+# Event fields grouped by the foreign key they are looked up from
+GROUP_BY_KEYS = {
+    'lab_name': 'lab',
+    'tool_id': 'tool',
+    'tool_name': 'tool',
+}
+
+
+def count_events(model, fields, start_date=None, end_date=None, **filters):
+    """
+    Count events grouped by fields from the live table and the archive.
+
+    Args:
+        model: LabVisit or ToolUsage
+        fields: sequence of field names to group by ('date' and 'hour'
+            truncate datetime to a date or hour)
+        start_date: optional datetime lower bound (inclusive)
+        end_date: optional datetime upper bound (inclusive)
+        filters: exact-match field filters e.g. lab_name='genome'
+
+    Returns:
+        list of dicts with the grouped fields and 'count'
+    """
+    queryset = model.objects.filter(**{
+        EVENT_FIELD_LOOKUPS.get(name, name): value
+        for name, value in filters.items()
+    })
+    if start_date:
+        queryset = queryset.filter(datetime__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(datetime__lte=end_date)
+    if 'date' in fields:
+        queryset = queryset.annotate(date=TruncDate('datetime'))
+    if 'hour' in fields:
+        queryset = queryset.annotate(hour=TruncHour('datetime'))
+
+    # Group by the integer lab/tool keys and look up their names afterwards
+    group_by = list(dict.fromkeys(
+        GROUP_BY_KEYS.get(name, name) for name in fields))
+    rows = list(
+        queryset.values(*group_by).annotate(count=Count('id')).order_by())
+    labs = (
+        Lab.objects.in_bulk({row['lab'] for row in rows})
+        if 'lab' in group_by else {}
+    )
+    tools = (
+        Tool.objects.in_bulk({row['tool'] for row in rows})
+        if 'tool' in group_by else {}
+    )
+    live = [
+        {
+            **{
+                name: _event_field(row, name, labs, tools)
+                for name in fields
+            },
+            'count': row['count'],
+        }
+        for row in rows
+    ]
+    archived = archive.count_events(
+        model, fields, start_date, end_date, **filters)
+    if not archived:
+        return live
+    return archive.merge_counts(fields, live, archived)
+
+
+def count_tool_trends(**filters):
+    """
+    Count tool uses and trending scores from the live table and the archive.
+
+    Scores have daily resolution, which is plenty for a half-life of days.
+
+    Args:
+        filters: exact-match event filters e.g. lab_name='genome'
+
+    Returns:
+        TrendCounter of the tool uses
+    """
+    counter = TrendCounter(settings.REPORTING_TRENDING_HALF_LIFE_DAYS)
+    fields = ('date', 'lab_name', 'tool_id', 'tool_name')
+    for item in count_events(ToolUsage, fields, **filters):
+        counter.add(
+            item['lab_name'],
+            item['tool_id'],
+            item['tool_name'],
+            datetime.combine(item['date'], time(12, tzinfo=ZoneInfo('UTC'))),
+            count=item['count'],
+        )
+    return counter
+
+
+def top_tools(lab_name=None, limit=None, trending=False):
+    """
+    Return the top tools in a lab, or in all labs.
+
+    Tools are ranked by ToolTrend, which must be built once with the
+    rebuild_tool_trends command after upgrading. Until then ToolTrend is
+    empty, and tools are ranked by counting events instead.
+
+    Args:
+        lab_name: name of the lab, or None for all labs
+        limit: maximum number of tools to return
+        trending: rank by trending score instead of all-time count
+
+    Returns:
+        list of ToolTrend
+    """
+    if ToolTrend.objects.exists():
+        return list(ToolTrend.top(lab_name, limit, trending=trending))
+    filters = {'lab_name': lab_name} if lab_name else {}
+    lab_name = lab_name or ToolTrend.ALL_LABS
+    trends = [
+        ToolTrend(
+            lab_name=lab_name,
+            tool_id=tool_id,
+            tool_name=tool_name,
+            count=count,
+            log_score=log_score,
+            last_used=last_used,
+        )
+        for (lab, tool_id), (tool_name, count, log_score, last_used) in (
+            count_tool_trends(**filters).items()
+        )
+        if lab == lab_name
+    ]
+    if trending:
+        trends.sort(key=lambda trend: -trend.log_score)
+    else:
+        trends.sort(key=lambda trend: (-trend.count, trend.tool_id))
+    return trends[:limit]
+
+
+def heatmap(metric, lab_name=None, tool_id=None, start=None, end=None,
+            tz=None):
+    """
+    Return a weekday by hour of day matrix of event counts.
+
+    Counts are read from HourlyCount, which must be built once with the
+    rebuild_hourly_counts command after upgrading. Until then HourlyCount
+    is empty, and events are counted instead.
+
+    Args:
+        see ``HourlyCount.heatmap``
+
+    Returns:
+        list of 7 rows (Monday first) of 24 counts (midnight first)
+    """
+    matrix = HourlyCount.heatmap(
+        metric,
+        lab_name=lab_name,
+        tool_id=tool_id,
+        start=start,
+        end=end,
+        tz=tz,
+    )
+    if any(any(row) for row in matrix) or (
+        HourlyCount.objects.filter(metric=metric).exists()
+    ):
+        return matrix
+    filters = {'lab_name': lab_name} if lab_name else {}
+    if metric == HourlyCount.TOOLS:
+        model = ToolUsage
+        if tool_id:
+            filters['tool_id'] = tool_id
+    elif tool_id:
+        # Visits aren't counted by tool
+        return build_heatmap([], tz)
+    else:
+        model = LabVisit
+    rows = count_events(model, ('hour',), start, end, **filters)
+    return build_heatmap(((row['hour'], row['count']) for row in rows), tz)
+
+
+def _event_field(row, name, labs, tools):
+    """Return the value of an event field from a row grouped by key."""
+    if name == 'lab_name':
+        return labs[row['lab']].name
+    if name == 'tool_id':
+        return tools[row['tool']].tool_id
+    if name == 'tool_name':
+        return tools[row['tool']].name
+    return row[name]
+
+
 @csrf_exempt
 @authenticated
 def upload_logs(request):
-    """Process Nginx logs uploaded from Galaxy server."""
+    """Queue Nginx logs uploaded from Galaxy server for import.
+
+    The upload is spooled to disk and imported by an RQ worker. Responds
+    202 with the job ID, which can be polled with ``import_job_status``.
+    """
     if request.method != 'POST':
         return HttpResponseBadRequest('Only POST requests are allowed')
 
@@ -57,69 +332,142 @@ def upload_logs(request):
             status=400,
         )
 
+    log_format = request.POST.get('log_format') or None
+    if log_format not in (None, AUTO_DETECT, *LOG_FORMATS):
+        return JsonResponse(
+            {'error': f'Invalid log_format parameter: {log_format}'},
+            status=400,
+        )
+
     try:
-        result = import_nginx_log(uploaded_file, log_type)
-        return JsonResponse(result)
-    except Exception as e:
+        path = spool_upload(uploaded_file)
+    except OSError as exc:
+        logger.error("upload_logs: could not spool upload: %s", exc)
         return JsonResponse(
             {
-                'error': 'Failed to process log file',
-                'details': str(e),
+                'error': 'Failed to save log file',
+                'details': str(exc),
             },
             status=500,
         )
 
+    try:
+        queue = django_rq.get_queue('default')
+        job = queue.enqueue(
+            run_import_logs,
+            str(path),
+            log_type,
+            log_format,
+            job_timeout=settings.REPORTING_IMPORT_JOB_TIMEOUT,
+        )
+    except Exception as exc:
+        path.unlink(missing_ok=True)
+        logger.error("upload_logs: Redis error: %s", exc)
+        return JsonResponse(
+            {'error': f'Could not connect to job queue: {exc}'},
+            status=503,
+        )
+
+    return JsonResponse(
+        {
+            'job_id': job.id,
+            'status_url': reverse('import_job_status', args=[job.id]),
+        },
+        status=202,
+    )
+
+
+def spool_upload(uploaded_file):
+    """Write an uploaded log file to the spool directory for a worker.
+
+    The file extension is kept so that compressed uploads are decompressed
+    by the worker.
+
+    Returns:
+        Path of the spooled file
+    """
+    spool_dir = Path(settings.REPORTING_UPLOAD_SPOOL_DIR)
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    suffix = Path(uploaded_file.name or '').suffix
+    with tempfile.NamedTemporaryFile(
+        'wb', dir=spool_dir, suffix=suffix, delete=False,
+    ) as f:
+        for chunk in uploaded_file.chunks():
+            f.write(chunk)
+    return Path(f.name)
+
+
+@authenticated
+def import_job_status(request, job_id):
+    """Return the current status of a background log import job."""
+    try:
+        queue = django_rq.get_queue('default')
+        job = queue.fetch_job(job_id)
+    except Exception as exc:
+        logger.error("import_job_status: Redis error: %s", exc)
+        return JsonResponse(
+            {'error': f'Could not connect to job queue: {exc}'},
+            status=503,
+        )
+
+    if job is None or not job.func_name.endswith(run_import_logs.__name__):
+        return JsonResponse({'error': 'Job not found'}, status=404)
+
+    status = job.get_status()
+    payload = {'status': status}
+    progress = job.meta.get('progress')
+    if progress:
+        payload['progress'] = progress
+
+    if status == 'finished':
+        payload['result'] = job.result
+    elif status == 'failed':
+        payload['error'] = str(job.exc_info or 'Unknown error')
+    return JsonResponse(payload)
+
 
 def get_usage_data(request):
     """
     API endpoint to fetch usage data for charts.
 
     Query parameters:
-        - metric: 'visits' or 'tools' (default: 'visits')
+        - metric: 'visits', 'tools' or 'visitors' (approximate unique
+          visitors) (default: 'visits')
         - days: number of days to look back (optional)
         - start_date: custom start date (optional, YYYY-MM-DD)
         - end_date: custom end date (optional, YYYY-MM-DD)
         - lab: filter by lab name (optional, 'all' for all labs)
         - tool: filter by tool_id (optional, 'all' for all tools aggregated)
+
+    Results are cached until the next log import.
     """
-    metric = request.GET.get('metric', 'visits')
-    lab_filter = request.GET.get('lab', 'all')
-    tool_filter = request.GET.get('tool', 'all')
+    params = get_report_params(request)
+    payload = ReportCache.get_or_compute(
+        'usage', lambda: usage_data(**params), **params)
+    if payload is None:
+        return JsonResponse({'error': 'Invalid metric parameter'}, status=400)
+    return JsonResponse(payload)
 
-    # Handle custom date range
-    start_date_str = request.GET.get('start_date')
-    end_date_str = request.GET.get('end_date')
 
-    if start_date_str and end_date_str:
-        # Parse custom date range
-        start_date = timezone.make_aware(
-            datetime.strptime(start_date_str, '%Y-%m-%d')
-        )
-        end_date = timezone.make_aware(
-            datetime.strptime(end_date_str, '%Y-%m-%d')
-        )
-        end_date = end_date.replace(hour=23, minute=59, second=59)
-    else:
-        # Use days parameter
-        days = int(request.GET.get('days', 90))
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=days)
+def usage_data(metric, lab, tool, start_date, end_date):
+    """
+    Compute chart traces for get_usage_data.
+
+    Returns:
+        dict of traces and the date range, or None if the metric is invalid
+    """
+    filters = {}
+    if lab:
+        filters['lab_name'] = lab
 
     if metric == 'visits':
         # Query LabVisit data
-        queryset = LabVisit.objects.filter(
-            datetime__gte=start_date,
-            datetime__lte=end_date
-        )
-        if lab_filter and lab_filter != 'all':
-            queryset = queryset.filter(lab_name=lab_filter)
-
-        data = (
-            queryset
-            .annotate(date=TruncDate('datetime'))
-            .values('lab_name', 'date')
-            .annotate(count=Count('id'))
-            .order_by('date', 'lab_name')
+        data = count_events(
+            LabVisit,
+            ('lab_name', 'date'),
+            start_date,
+            end_date,
+            **filters,
         )
 
         # Get all dates in range
@@ -155,27 +503,19 @@ def get_usage_data(request):
             })
 
     elif metric == 'tools':
-        # Query ToolUsage data
-        queryset = ToolUsage.objects.filter(
-            datetime__gte=start_date,
-            datetime__lte=end_date
-        )
-        if lab_filter and lab_filter != 'all':
-            queryset = queryset.filter(lab_name=lab_filter)
-
         # Get all dates in range
         all_dates = generate_date_range(start_date, end_date)
 
         traces = []
 
-        if tool_filter == 'all':
+        if tool is None:
             # Aggregate all tools together
-            data = (
-                queryset
-                .annotate(date=TruncDate('datetime'))
-                .values('date')
-                .annotate(count=Count('id'))
-                .order_by('date')
+            data = count_events(
+                ToolUsage,
+                ('date',),
+                start_date,
+                end_date,
+                **filters,
             )
 
             # Build data dict with actual counts
@@ -199,14 +539,13 @@ def get_usage_data(request):
             })
         else:
             # Filter by specific tool
-            queryset = queryset.filter(tool_id=tool_filter)
-
-            data = (
-                queryset
-                .annotate(date=TruncDate('datetime'))
-                .values('date')
-                .annotate(count=Count('id'))
-                .order_by('date')
+            data = count_events(
+                ToolUsage,
+                ('date',),
+                start_date,
+                end_date,
+                tool_id=tool,
+                **filters,
             )
 
             # Build data dict with actual counts
@@ -222,11 +561,11 @@ def get_usage_data(request):
                 counts.append(data_dict.get(date_obj, 0))
 
             # Get tool name from database
-            tool_record = queryset.filter(tool_id=tool_filter).first()
+            tool_obj = Tool.objects.filter(tool_id=tool).first()
             tool_name = (
-                tool_record.tool_name
-                if tool_record
-                else tool_filter
+                tool_obj.name
+                if tool_obj
+                else Tool.parse_tool_name(tool)
             )
 
             traces.append({
@@ -235,39 +574,201 @@ def get_usage_data(request):
                 'y': counts,
                 'type': 'scatter',
                 'mode': 'lines',
-                'hovertext': tool_filter,
+                'hovertext': tool,
             })
+    elif metric == 'visitors':
+        daily, totals = UniqueVisitorSketch.estimate(
+            start_date.date(),
+            end_date.date(),
+            **filters,
+        )
+        all_dates = generate_date_range(start_date, end_date)
+
+        traces = []
+        for lab_name in sorted(daily):
+            traces.append({
+                'name': lab_name,
+                'x': [date_obj.isoformat() for date_obj in all_dates],
+                'y': [
+                    daily[lab_name].get(date_obj, 0)
+                    for date_obj in all_dates
+                ],
+                'type': 'scatter',
+                'mode': 'lines',
+            })
+
+        return {
+            'traces': traces,
+            'totals': totals,
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+        }
+
     else:
-        return JsonResponse({'error': 'Invalid metric parameter'}, status=400)
+        return None
 
-    return JsonResponse({
+    return {
         'traces': traces,
         'start_date': start_date.isoformat(),
         'end_date': end_date.isoformat(),
+    }
+
+
+def get_heatmap_data(request):
+    """
+    API endpoint to fetch hour of day by weekday traffic heatmaps.
+
+    Counts are read from the HourlyCount rollup, so a year of data is at most
+    one row per hour (see ``heatmap``).
+
+    Query parameters:
+        - metric: 'visits' or 'tools' (default: 'visits')
+        - days: number of days to look back (optional)
+        - start_date: custom start date (optional, YYYY-MM-DD)
+        - end_date: custom end date (optional, YYYY-MM-DD)
+        - lab: filter by lab name (optional, 'all' for all labs)
+        - tool: filter by tool_id (optional, 'all' for all tools)
+        - tz: time zone of the weekdays and hours e.g. 'Australia/Brisbane'
+          (default: TIME_ZONE setting)
+    """
+    params = get_report_params(request)
+    if params['metric'] not in (HourlyCount.VISITS, HourlyCount.TOOLS):
+        return JsonResponse({'error': 'Invalid metric parameter'}, status=400)
+    tz_name = request.GET.get('tz', settings.TIME_ZONE)
+    try:
+        tz = ZoneInfo(tz_name)
+    except (ValueError, ZoneInfoNotFoundError):
+        return JsonResponse({'error': 'Invalid tz parameter'}, status=400)
+
+    matrix = heatmap(
+        params['metric'],
+        lab_name=params['lab'],
+        tool_id=params['tool'],
+        start=params['start_date'],
+        end=params['end_date'],
+        tz=tz,
+    )
+    return JsonResponse({
+        'metric': params['metric'],
+        'lab': params['lab'] or 'all',
+        'tool': params['tool'] or 'all',
+        'tz': tz_name,
+        'weekdays': WEEKDAYS,
+        'hours': HOURS,
+        'z': matrix,
+        'total': sum(sum(row) for row in matrix),
+        'start_date': params['start_date'].isoformat(),
+        'end_date': params['end_date'].isoformat(),
+    })
+
+
+def get_funnel_data(request):
+    """
+    API endpoint to fetch how many lab visits led to tool launches.
+
+    Query parameters:
+        - days: number of days to look back (optional)
+        - start_date: custom start date (optional, YYYY-MM-DD)
+        - end_date: custom end date (optional, YYYY-MM-DD)
+        - lab: filter by lab name (optional, 'all' for all labs)
+    """
+    params = get_report_params(request)
+    queryset = LabFunnel.objects.filter(
+        date__gte=params['start_date'].date(),
+        date__lte=params['end_date'].date(),
+    )
+    if params['lab']:
+        queryset = queryset.filter(lab_name=params['lab'])
+    rows = queryset.values('lab_name').annotate(**{
+        field: Sum(field) for field in FUNNEL_COUNT_FIELDS
+    }).order_by('-visits', 'lab_name')
+
+    labs = [
+        {
+            **row,
+            'conversion_rate': (
+                row['converted_visits'] / row['visits']
+                if row['visits'] else None
+            ),
+        }
+        for row in rows
+    ]
+    return JsonResponse({
+        'labs': labs,
+        'window_minutes': settings.REPORTING_FUNNEL_WINDOW_MINUTES,
+        'start_date': params['start_date'].isoformat(),
+        'end_date': params['end_date'].isoformat(),
     })
 
 
 def get_tools_list(request):
     """
-    API endpoint to get list of tools ordered by frequency.
+    API endpoint to get the top tools in a lab.
 
     Query parameters:
         - lab: filter by lab name (optional, 'all' for all labs)
+        - limit: maximum number of tools (optional, default 100)
+        - window: how tools are ranked (optional):
+            'all' (default): all-time number of uses
+            'trending': uses decayed by REPORTING_TRENDING_HALF_LIFE_DAYS
+            N: number of uses in the last N days
     """
     lab_filter = request.GET.get('lab', 'all')
+    lab_name = lab_filter if lab_filter and lab_filter != 'all' else None
+    window = request.GET.get('window', 'all')
 
-    queryset = ToolUsage.objects.all()
+    try:
+        limit = int(request.GET.get(
+            'limit', settings.REPORTING_TOOLS_LIST_LIMIT))
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse(
+            {'error': 'limit must be a positive integer'},
+            status=400,
+        )
+    limit = min(limit, settings.REPORTING_TOOLS_LIST_MAX_LIMIT)
+
+    if window in ('all', 'trending'):
+        trending = window == 'trending'
+        now = timezone.now()
+        tools_list = []
+        for trend in top_tools(lab_name, limit, trending=trending):
+            item = {
+                'tool_id': trend.tool_id,
+                'count': trend.count,
+                'display_name': trend.tool_name,
+            }
+            if trending:
+                item['score'] = round(trend.score(now), 2)
+            tools_list.append(item)
+        return JsonResponse({'tools': tools_list})
 
-    if lab_filter and lab_filter != 'all':
-        queryset = queryset.filter(lab_name=lab_filter)
+    try:
+        days = int(window)
+        if days < 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse(
+            {'error': "window must be 'all', 'trending' or a number of days"},
+            status=400,
+        )
 
-    # Get tools ordered by frequency (descending)
-    tools = (
-        queryset
-        .values('tool_id', 'tool_name')
-        .annotate(count=Count('id'))
-        .order_by('-count')
-    )
+    filters = {}
+    if lab_name:
+        filters['lab_name'] = lab_name
+
+    # Count uses in the window, ordered by frequency (descending)
+    tools = sorted(
+        count_events(
+            ToolUsage,
+            ('tool_id', 'tool_name'),
+            start_date=timezone.now() - timedelta(days=days),
+            **filters,
+        ),
+        key=lambda item: item['count'],
+        reverse=True,
+    )[:limit]
 
     # Format the response
     tools_list = [
@@ -287,68 +788,65 @@ def download_csv(request):
     Download CSV of usage data.
 
     Query parameters:
-        - metric: 'visits' or 'tools' (required)
+        - metric: 'visits', 'tools' or 'visitors' (required)
         - days: number of days to look back (optional)
         - start_date: custom start date (optional, YYYY-MM-DD)
         - end_date: custom end date (optional, YYYY-MM-DD)
         - lab: filter by lab name (optional, 'all' for all labs)
         - tool: filter by tool_id (optional, 'all' for all tools)
-    """
-    metric = request.GET.get('metric', 'visits')
-    lab_filter = request.GET.get('lab', 'all')
-    tool_filter = request.GET.get('tool', 'all')
 
-    # Handle custom date range
-    start_date_str = request.GET.get('start_date')
-    end_date_str = request.GET.get('end_date')
-
-    if start_date_str and end_date_str:
-        start_date = timezone.make_aware(
-            datetime.strptime(start_date_str, '%Y-%m-%d')
-        )
-        end_date = timezone.make_aware(
-            datetime.strptime(end_date_str, '%Y-%m-%d')
-        )
-        end_date = end_date.replace(hour=23, minute=59, second=59)
-    else:
-        days = int(request.GET.get('days', 90))
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=days)
+    Results are cached until the next log import.
+    """
+    params = get_report_params(request)
+    rows = ReportCache.get_or_compute(
+        'csv', lambda: csv_rows(**params), **params)
 
     # Create the HttpResponse object with CSV header
     response = HttpResponse(content_type='text/csv')
     filename = (
-        f'galaxy_labs_{metric}_'
-        f'{start_date.date()}_to_{end_date.date()}.csv'
+        f'galaxy_labs_{params["metric"]}_'
+        f'{params["start_date"].date()}_to_{params["end_date"].date()}.csv'
     )
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
 
     # QUOTE_MINIMAL automatically quotes fields with special chars (commas)
     writer = csv.writer(response, quoting=csv.QUOTE_MINIMAL)
+    writer.writerows(rows)
+    return response
+
+
+def csv_rows(metric, lab, tool, start_date, end_date):
+    """
+    Compute CSV rows for download_csv.
+
+    Returns:
+        list of rows, starting with the header row. Empty if the metric is
+        invalid.
+    """
+    rows = []
+    filters = {}
+    if lab:
+        filters['lab_name'] = lab
 
     if metric == 'visits':
         # Write header
-        writer.writerow(['date', 'lab', 'visits'])
+        rows.append(['date', 'lab', 'visits'])
 
         # Query LabVisit data
-        queryset = LabVisit.objects.filter(
-            datetime__gte=start_date,
-            datetime__lte=end_date
-        )
-        if lab_filter and lab_filter != 'all':
-            queryset = queryset.filter(lab_name=lab_filter)
-
-        data = (
-            queryset
-            .annotate(date=TruncDate('datetime'))
-            .values('lab_name', 'date')
-            .annotate(count=Count('id'))
-            .order_by('date', 'lab_name')
+        data = sorted(
+            count_events(
+                LabVisit,
+                ('lab_name', 'date'),
+                start_date,
+                end_date,
+                **filters,
+            ),
+            key=lambda item: (item['date'], item['lab_name']),
         )
 
         # Write data rows
         for item in data:
-            writer.writerow([
+            rows.append([
                 item['date'].isoformat(),
                 item['lab_name'],
                 item['count'],
@@ -356,34 +854,45 @@ def download_csv(request):
 
     elif metric == 'tools':
         # Write header
-        writer.writerow(['date', 'lab', 'tool_id', 'jobs'])
+        rows.append(['date', 'lab', 'tool_id', 'jobs'])
 
         # Query ToolUsage data
-        queryset = ToolUsage.objects.filter(
-            datetime__gte=start_date,
-            datetime__lte=end_date
-        )
-        if lab_filter and lab_filter != 'all':
-            queryset = queryset.filter(lab_name=lab_filter)
-        if tool_filter and tool_filter != 'all':
-            queryset = queryset.filter(tool_id=tool_filter)
-
-        data = (
-            queryset
-            .annotate(date=TruncDate('datetime'))
-            .values('lab_name', 'tool_id', 'date')
-            .annotate(count=Count('id'))
-            .order_by('date', 'lab_name', 'tool_id')
+        if tool:
+            filters['tool_id'] = tool
+
+        data = sorted(
+            count_events(
+                ToolUsage,
+                ('lab_name', 'tool_id', 'date'),
+                start_date,
+                end_date,
+                **filters,
+            ),
+            key=lambda item: (item['date'], item['lab_name'], item['tool_id']),
         )
 
         # Write data rows
         # Note: csv.writer automatically quotes fields containing commas
         for item in data:
-            writer.writerow([
+            rows.append([
                 item['date'].isoformat(),
                 item['lab_name'],
                 item['tool_id'],
                 item['count'],
             ])
 
-    return response
+    elif metric == 'visitors':
+        rows.append(['date', 'lab', 'unique_visitors'])
+
+        daily, _ = UniqueVisitorSketch.estimate(
+            start_date.date(),
+            end_date.date(),
+            **filters,
+        )
+        rows += sorted(
+            [date_obj.isoformat(), lab_name, count]
+            for lab_name, counts in daily.items()
+            for date_obj, count in counts.items()
+        )
+
+    return rows
@@ -0,0 +1,333 @@
+"""Columnar archive of historical reporting events.
+
+Raw LabVisit/ToolUsage rows older than a cutoff are compacted into Parquet
+files by the ``archive_events`` management command and removed from the live
+tables. Files are partitioned by month and lab (hive-style directories) so
+that range queries only open the files they need:
+
+    <REPORTING_ARCHIVE_ROOT>/<kind>/month=2025-12/lab=genome/<uuid>.parquet
+
+The reporting API merges counts from the archive with counts from the live
+tables, so historical data stays queryable. Archived events are
+denormalised, with the lab and tool names stored in each row (Parquet
+dictionary-encodes them).
+"""
+
+import json
+import logging
+import uuid
+from collections import defaultdict
+from urllib.parse import quote, unquote
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_data_version
+from .db import reporting_db
+from .models import EVENT_FIELD_LOOKUPS, LabVisit, ToolUsage
+
+logger = logging.getLogger('django')
+
+ARCHIVE_BATCH_SIZE = 100_000
+# Parquet schema metadata recording the rows a pending file was written from
+BATCH_METADATA_KEY = b'labs_engine.archive_batch'
+TIMESTAMP_TYPE = pa.timestamp('us', tz='UTC')
+
+ARCHIVE_KINDS = {
+    LabVisit: 'lab_visits',
+    ToolUsage: 'tool_usage',
+}
+ARCHIVE_SCHEMAS = {
+    LabVisit: pa.schema([
+        ('lab_name', pa.string()),
+        ('datetime', TIMESTAMP_TYPE),
+    ]),
+    ToolUsage: pa.schema([
+        ('lab_name', pa.string()),
+        ('tool_id', pa.string()),
+        ('tool_name', pa.string()),
+        ('datetime', TIMESTAMP_TYPE),
+    ]),
+}
+PARTITIONING = ds.partitioning(
+    pa.schema([
+        ('month', pa.string()),
+        ('lab', pa.string()),
+    ]),
+    flavor='hive',
+)
+
+
+def archive_dir(model):
+    """Return the archive directory for the given model."""
+    return settings.REPORTING_ARCHIVE_ROOT / ARCHIVE_KINDS[model]
+
+
+def exists(model):
+    """Check whether any archived data exists for the given model."""
+    return any(_archive_files(model))
+
+
+def _archive_files(model):
+    """Yield the visible (not pending) archive files of the given model."""
+    path = archive_dir(model)
+    if not path.is_dir():
+        return
+    for file in path.glob('month=*/lab=*/*.parquet'):
+        if not file.name.startswith('.'):
+            yield file
+
+
+def archive_events(model, before, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move events older than ``before`` from the database to the archive.
+
+    Rows are read in primary key order and written to one Parquet file per
+    (month, lab) partition for each batch. Files are written under a hidden
+    name (which readers skip) and only made visible once the corresponding
+    rows have been deleted, so an event is never counted twice. Each file
+    records the batch it came from, so files left hidden by a failure between
+    the delete and the rename are recovered by the next run.
+
+    Returns:
+        int: the number of rows archived
+    """
+    fields = [
+        EVENT_FIELD_LOOKUPS.get(name, name)
+        for name in ARCHIVE_SCHEMAS[model].names
+    ]
+    queryset = (
+        model.objects.filter(datetime__lt=before)
+        .order_by('id')
+        .values_list('id', *fields)
+    )
+    recover_pending(model)
+    archived = 0
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not rows:
+            break
+        max_id = rows[-1][0]
+        batch = {
+            'before': before.isoformat(),
+            'after_id': last_id,
+            'max_id': max_id,
+        }
+        pending = _write_partitions(model, [row[1:] for row in rows], batch)
+        with transaction.atomic(using=reporting_db()):
+            _batch_queryset(model, batch).delete()
+        for tmp_path in pending:
+            _promote(tmp_path)
+        bump_data_version()
+        archived += len(rows)
+        last_id = max_id
+        logger.info(
+            f"Archived {archived} {model.__name__} rows"
+            f" (up to id {last_id})")
+    return archived
+
+
+def recover_pending(model):
+    """Resolve hidden files left by an interrupted ``archive_events``.
+
+    A hidden file whose rows have been deleted from the database holds the
+    only copy of those events, so it is made visible. If its rows are still
+    in the database the delete never committed, so the file is discarded.
+
+    Returns:
+        int: the number of files made visible
+    """
+    path = archive_dir(model)
+    if not path.is_dir():
+        return 0
+    promoted = 0
+    for tmp_path in path.glob('month=*/lab=*/.*.parquet'):
+        metadata = pq.read_schema(tmp_path).metadata or {}
+        if BATCH_METADATA_KEY not in metadata:
+            logger.warning(f"Archive file {tmp_path} has no batch - skipped")
+            continue
+        batch = json.loads(metadata[BATCH_METADATA_KEY])
+        if _batch_queryset(model, batch).exists():
+            tmp_path.unlink()
+        else:
+            _promote(tmp_path)
+            promoted += 1
+    if promoted:
+        logger.warning(
+            f"Recovered {promoted} {model.__name__} archive files from an"
+            " interrupted run")
+        bump_data_version()
+    return promoted
+
+
+def _batch_queryset(model, batch):
+    """Return the live rows of an archive batch."""
+    return model.objects.filter(
+        datetime__lt=timezone.datetime.fromisoformat(batch['before']),
+        id__gt=batch['after_id'],
+        id__lte=batch['max_id'],
+    )
+
+
+def _promote(tmp_path):
+    """Make a hidden archive file visible to readers."""
+    tmp_path.rename(tmp_path.with_name(tmp_path.name.lstrip('.')))
+
+
+def _write_partitions(model, rows, batch):
+    """Write rows to hidden Parquet files, one per (month, lab) partition.
+
+    Args:
+        model: LabVisit or ToolUsage
+        rows: tuples of values in the order of the model's archive schema
+        batch: the rows' id range and cutoff, recorded in each file
+
+    Returns:
+        list: paths of the hidden files that were written
+    """
+    schema = ARCHIVE_SCHEMAS[model].with_metadata({
+        BATCH_METADATA_KEY: json.dumps(batch).encode('utf-8'),
+    })
+    dt_index = schema.names.index('datetime')
+    lab_index = schema.names.index('lab_name')
+    partitions = defaultdict(list)
+    for row in rows:
+        month = row[dt_index].strftime('%Y-%m')
+        partitions[(month, row[lab_index])].append(row)
+
+    written = []
+    for (month, lab_name), partition_rows in partitions.items():
+        path = (
+            archive_dir(model)
+            / f'month={month}'
+            / f'lab={quote(lab_name, safe="")}'
+        )
+        path.mkdir(parents=True, exist_ok=True)
+        columns = list(zip(*partition_rows))
+        table = pa.Table.from_arrays(
+            [
+                pa.array(column, type=field.type)
+                for column, field in zip(columns, schema)
+            ],
+            schema=schema,
+        )
+        tmp_path = path / f'.{uuid.uuid4().hex}.parquet'
+        pq.write_table(table, tmp_path)
+        written.append(tmp_path)
+    return written
+
+
+def _dataset(model):
+    """Open the partitioned archive dataset for the given model."""
+    return ds.dataset(
+        archive_dir(model),
+        format='parquet',
+        partitioning=PARTITIONING,
+    )
+
+
+def count_events(model, fields, start=None, end=None, **filters):
+    """Count archived events grouped by the given fields.
+
+    Mirrors ``queryset.values(*fields).annotate(count=Count('id'))`` on the
+    live tables. The special fields ``date`` and ``hour`` truncate
+    ``datetime`` to a date or hour.
+
+    Args:
+        model: LabVisit or ToolUsage
+        fields: sequence of field names to group by
+        start: optional aware datetime lower bound (inclusive)
+        end: optional aware datetime upper bound (inclusive)
+        filters: exact-match filters on archived columns e.g. lab_name
+
+    Returns:
+        list of dicts with the grouped fields and ``count``
+    """
+    if not exists(model):
+        return []
+
+    expression = None
+
+    def add(condition):
+        nonlocal expression
+        expression = (
+            condition if expression is None
+            else expression & condition)
+
+    if start:
+        add(ds.field('month') >= start.strftime('%Y-%m'))
+        add(ds.field('datetime') >= pa.scalar(start, type=TIMESTAMP_TYPE))
+    if end:
+        add(ds.field('month') <= end.strftime('%Y-%m'))
+        add(ds.field('datetime') <= pa.scalar(end, type=TIMESTAMP_TYPE))
+    for name, value in filters.items():
+        add(ds.field('lab' if name == 'lab_name' else name) == value)
+
+    columns = [f for f in fields if f not in ('date', 'hour')]
+    table = _dataset(model).to_table(
+        columns=list(dict.fromkeys(columns + ['datetime'])),
+        filter=expression,
+    )
+    if 'date' in fields:
+        table = table.append_column(
+            'date', pc.cast(table['datetime'], pa.date32()))
+    if 'hour' in fields:
+        table = table.append_column(
+            'hour', pc.floor_temporal(table['datetime'], unit='hour'))
+    if not fields:
+        return [{'count': table.num_rows}] if table.num_rows else []
+
+    grouped = table.group_by(list(fields)).aggregate([
+        ('datetime', 'count'),
+    ])
+    return [
+        {
+            **{f: row[f] for f in fields},
+            'count': row['datetime_count'],
+        }
+        for row in grouped.to_pylist()
+    ]
+
+
+def merge_counts(fields, *results):
+    """Sum ``count`` across result sets grouped by the same fields."""
+    totals = defaultdict(int)
+    for rows in results:
+        for row in rows:
+            totals[tuple(row[f] for f in fields)] += row['count']
+    return [
+        {**dict(zip(fields, key)), 'count': count}
+        for key, count in totals.items()
+    ]
+
+
+def labs(model):
+    """Return the set of lab names with archived data."""
+    path = archive_dir(model)
+    if not path.is_dir():
+        return set()
+    return {
+        unquote(p.name.split('=', 1)[1])
+        for p in path.glob('month=*/lab=*')
+    }
+
+
+def earliest(model):
+    """Return the datetime of the oldest archived event, if any."""
+    path = archive_dir(model)
+    if not exists(model):
+        return None
+    first_month = min(
+        p.parent.parent.name.split('=', 1)[1]
+        for p in _archive_files(model)
+    )
+    table = ds.dataset(
+        path / f'month={first_month}',
+        format='parquet',
+    ).to_table(columns=['datetime'])
+    return pc.min(table['datetime']).as_py()
@@ -1,11 +1,150 @@
-"""Authentication utilities for API endpoints."""
+"""Authentication utilities for API endpoints.
 
+Log pushes from Galaxy servers are frequent, so tokens are cached in-process
+for a short time and ``last_used`` timestamps are written to the database in
+batches rather than on every request.
+"""
+
+import atexit
+import logging
+import threading
+import time
 from functools import wraps
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.http import JsonResponse
 from django.utils import timezone
 
 from .models import APIToken
 
+logger = logging.getLogger('django')
+
+
+class TokenCache:
+    """Short-TTL in-process cache of active tokens by token hash.
+
+    Entries are invalidated in this process when a token is saved or deleted;
+    other processes pick up changes when their entries expire.
+    """
+
+    def __init__(self, ttl):
+        """Create an empty cache with the given TTL in seconds."""
+        self.ttl = ttl
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def get(self, token_hash):
+        """Return the cached token, or None if missing or expired."""
+        entry = self._tokens.get(token_hash)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def put(self, token):
+        """Cache an active token."""
+        with self._lock:
+            self._tokens[token.token_hash] = (
+                token, time.monotonic() + self.ttl)
+
+    def invalidate(self, token_hash):
+        """Remove a token from the cache."""
+        with self._lock:
+            self._tokens.pop(token_hash, None)
+
+    def clear(self):
+        """Remove all tokens from the cache."""
+        with self._lock:
+            self._tokens.clear()
+
+
+class LastUsedRecorder:
+    """Coalesce token last_used timestamps and write them periodically."""
+
+    def __init__(self, interval):
+        """Create a recorder which flushes every ``interval`` seconds."""
+        self.interval = interval
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def touch(self, token):
+        """Record that a token was used now."""
+        now = timezone.now()
+        token.last_used = now
+        with self._lock:
+            self._pending[token.pk] = now
+        if time.monotonic() - self._last_flush >= self.interval:
+            # A busy database mustn't turn a log push into an error
+            try:
+                self.flush()
+            except DatabaseError as exc:
+                logger.warning(f"Could not save API token last_used: {exc}")
+
+    def flush(self):
+        """Write pending last_used timestamps to the database.
+
+        Timestamps which could not be written are kept for the next flush.
+
+        Raises:
+            DatabaseError: if the database can't be written
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        try:
+            APIToken.objects.bulk_update(
+                [
+                    APIToken(pk=pk, last_used=last_used)
+                    for pk, last_used in pending.items()
+                ],
+                ['last_used'],
+            )
+        except DatabaseError:
+            with self._lock:
+                for pk, last_used in pending.items():
+                    self._pending[pk] = max(
+                        last_used, self._pending.get(pk, last_used))
+            raise
+
+
+token_cache = TokenCache(settings.API_TOKEN_CACHE_SECONDS)
+last_used = LastUsedRecorder(settings.API_TOKEN_LAST_USED_FLUSH_SECONDS)
+
+
+@atexit.register
+def _flush_last_used():
+    """Write pending last_used timestamps when the process exits."""
+    try:
+        last_used.flush()
+    except DatabaseError as exc:
+        logger.warning(f"Could not save API token last_used: {exc}")
+
+
+@receiver(post_save, sender=APIToken)
+@receiver(post_delete, sender=APIToken)
+def invalidate_token(sender, instance, **kwargs):
+    """Drop a token from the cache when it is changed or deleted."""
+    token_cache.invalidate(instance.token_hash)
+
+
+def get_token(token_value):
+    """Return the active APIToken for a token value, or None."""
+    token_hash = APIToken.hash_token(token_value)
+    token = token_cache.get(token_hash)
+    if token is None:
+        token = APIToken.objects.filter(
+            token_hash=token_hash,
+            is_active=True,
+        ).first()
+        if token is None:
+            return None
+        token_cache.put(token)
+    return token
+
 
 def authenticated(view_func):
     """
@@ -23,24 +162,18 @@ def authenticated(view_func):
                 status=401,
             )
 
-        try:
-            token = APIToken.objects.get(
-                token=token_value,
-                is_active=True,
-            )
-            # Update last_used timestamp
-            token.last_used = timezone.now()
-            token.save(update_fields=['last_used'])
-
-            # Attach token to request for use in view
-            request.api_token = token
-
-            return view_func(request, *args, **kwargs)
-
-        except APIToken.DoesNotExist:
+        token = get_token(token_value)
+        if token is None:
             return JsonResponse(
                 {'error': 'Invalid or inactive token'},
                 status=401,
             )
 
+        last_used.touch(token)
+
+        # Attach token to request for use in view
+        request.api_token = token
+
+        return view_func(request, *args, **kwargs)
+
     return wrapper
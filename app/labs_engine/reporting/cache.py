@@ -0,0 +1,91 @@
+"""Cache reporting query results between log imports.
+
+Event counts only change when a log import commits, so results are cached
+under a data version which the ingestion code bumps after each commit. Bumping
+the version makes every cached result unreachable at once; stale entries
+expire in the usual way.
+
+Results are keyed by their normalised parameters (metric, lab, tool and date
+range) rather than the request URL, so equivalent requests share an entry.
+"""
+
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from hashlib import md5
+
+from .db import reporting_db
+
+DATA_VERSION_KEY = 'reporting:data_version'
+
+logger = logging.getLogger('django.cache')
+
+
+def get_data_version():
+    """Return the current reporting data version."""
+    return cache.get(DATA_VERSION_KEY, 1)
+
+
+def bump_data_version():
+    """Invalidate cached reports once the current transaction commits."""
+    transaction.on_commit(_bump_data_version, using=reporting_db())
+
+
+def _bump_data_version():
+    """Increment the reporting data version."""
+    try:
+        cache.incr(DATA_VERSION_KEY)
+    except ValueError:
+        # Missing or expired - any new value invalidates the old entries
+        if not cache.add(DATA_VERSION_KEY, 2, timeout=None):
+            cache.incr(DATA_VERSION_KEY)
+
+
+class ReportCache:
+    """Cache report results by kind and normalised query parameters."""
+
+    @classmethod
+    def get_or_compute(
+        cls, kind, compute, metric, lab, tool, start_date, end_date,
+    ):
+        """Return a cached result, computing and caching it on a miss.
+
+        Args:
+            kind: name of the report e.g. 'usage' or 'csv'
+            compute: callable returning the result, which is not cached if
+                it is None
+            metric: the metric being reported
+            lab: lab name, or None for all labs
+            tool: tool_id, or None for all tools
+            start_date: first date of the range
+            end_date: last date of the range
+
+        Returns:
+            The cached or computed result
+        """
+        if settings.NOCACHE:
+            return compute()
+        key = cls._generate_cache_key(
+            kind, metric, lab, tool, start_date, end_date)
+        version = get_data_version()
+        result = cache.get(key, version=version)
+        if result is not None:
+            logger.debug(f"Report cache HIT for {kind} {metric}")
+            return result
+        logger.debug(f"Report cache MISS for {kind} {metric}")
+        result = compute()
+        if result is not None:
+            cache.set(
+                key,
+                result,
+                timeout=settings.REPORTING_CACHE_TIMEOUT,
+                version=version,
+            )
+        return result
+
+    @classmethod
+    def _generate_cache_key(cls, kind, *params):
+        """Create a cache key from the report kind and parameters."""
+        raw = ':'.join('' if p is None else str(p) for p in params)
+        return f"reporting:{kind}:{md5(raw.encode('utf-8')).hexdigest()}"
@@ -0,0 +1,93 @@
+"""Correlate lab visits with tool launches by the same client.
+
+A visit to a lab's welcome page converts if the same client launches a tool
+in that lab within a time window of the visit. Records are fed to a
+``FunnelTracker`` in time order as they are ingested, and it keeps the most
+recent visit of each (client, lab) in a sliding window:
+
+- Clients are identified by a short hash of their IP address and user agent,
+  which is never stored.
+- Visits older than the window, and the oldest visits beyond a maximum
+  number of entries, are dropped, so memory is bounded however much traffic
+  is fed in.
+
+Counts are accumulated per (lab_name, date of the visit or launch) until
+taken with ``pop_counts()``.
+"""
+
+from collections import OrderedDict, defaultdict
+from datetime import timedelta
+from hashlib import blake2b
+
+VISITS = 'visits'
+CONVERTED_VISITS = 'converted_visits'
+TOOL_LAUNCHES = 'tool_launches'
+ATTRIBUTED_LAUNCHES = 'attributed_launches'
+COUNT_FIELDS = (VISITS, CONVERTED_VISITS, TOOL_LAUNCHES, ATTRIBUTED_LAUNCHES)
+
+
+def client_hash(client):
+    """Return a short hash of a client key."""
+    return blake2b(client.encode('utf-8'), digest_size=8).digest()
+
+
+class FunnelTracker:
+    """Sliding window of recent lab visits by client."""
+
+    def __init__(self, window_minutes, max_entries):
+        """Create an empty tracker.
+
+        Args:
+            window_minutes: a tool launch within this many minutes after a
+                visit to the same lab converts the visit
+            max_entries: maximum number of (client, lab) visits held
+        """
+        self.window = timedelta(minutes=window_minutes)
+        self.max_entries = max_entries
+        # (client hash, lab_name) -> [visit datetime, converted], oldest first
+        self._visits = OrderedDict()
+        self._counts = defaultdict(lambda: dict.fromkeys(COUNT_FIELDS, 0))
+
+    def __len__(self):
+        """Return the number of visits in the window."""
+        return len(self._visits)
+
+    def visit(self, lab_name, client, dt):
+        """Record a welcome page visit."""
+        self._counts[lab_name, dt.date()][VISITS] += 1
+        key = (client_hash(client), lab_name)
+        self._visits[key] = [dt, False]
+        self._visits.move_to_end(key)
+        self._expire(dt)
+
+    def launch(self, lab_name, client, dt):
+        """Record a tool launch, converting a recent visit if there is one."""
+        self._counts[lab_name, dt.date()][TOOL_LAUNCHES] += 1
+        entry = self._visits.get((client_hash(client), lab_name))
+        if entry is None:
+            return
+        visited, converted = entry
+        if not timedelta(0) <= dt - visited <= self.window:
+            return
+        counts = self._counts[lab_name, visited.date()]
+        counts[ATTRIBUTED_LAUNCHES] += 1
+        if not converted:
+            counts[CONVERTED_VISITS] += 1
+            entry[1] = True
+
+    def pop_counts(self):
+        """Return and reset counts keyed by (lab_name, date)."""
+        counts, self._counts = self._counts, defaultdict(
+            lambda: dict.fromkeys(COUNT_FIELDS, 0))
+        return dict(counts)
+
+    def _expire(self, now):
+        """Drop visits outside the window or beyond the size limit."""
+        while self._visits:
+            key, (visited, _) = next(iter(self._visits.items()))
+            if (
+                len(self._visits) <= self.max_entries
+                and now - visited <= self.window
+            ):
+                break
+            del self._visits[key]
@@ -0,0 +1,67 @@
+"""Hour of day by weekday traffic heatmaps from hourly event counts.
+
+Events are counted per (lab_name, tool_id, hour) on ingest. Every event is
+also counted under ``ALL_LABS`` and ``ALL_TOOLS``, so a heatmap for a lab, a
+tool or everything is read from at most one row per hour.
+"""
+
+from collections import Counter
+
+from .trending import ALL_LABS
+
+ALL_TOOLS = ''
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+HOURS = tuple(range(24))
+
+
+def truncate_hour(dt):
+    """Return the datetime at the start of the hour of ``dt``."""
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+class HourlyCounter:
+    """Accumulate event counts per (lab_name, tool_id, hour)."""
+
+    def __init__(self):
+        """Create an empty counter."""
+        self._counts = Counter()
+
+    def add(self, lab_name, tool_id, dt, count=1):
+        """Count ``count`` events at datetime ``dt``.
+
+        Args:
+            lab_name: name of the lab
+            tool_id: tool ID, or ``ALL_TOOLS`` for events without a tool
+            dt: aware datetime of the event
+            count: number of events
+        """
+        hour = truncate_hour(dt)
+        for lab in {lab_name, ALL_LABS}:
+            for tool in {tool_id, ALL_TOOLS}:
+                self._counts[lab, tool, hour] += count
+
+    def items(self):
+        """Return counts keyed by (lab_name, tool_id, hour)."""
+        return self._counts.items()
+
+    def __bool__(self):
+        """Return True if anything has been counted."""
+        return bool(self._counts)
+
+
+def build_heatmap(hourly_counts, tz=None):
+    """Sum hourly counts into a weekday by hour of day matrix.
+
+    Args:
+        hourly_counts: iterable of (aware hour datetime, count)
+        tz: tzinfo of the weekdays and hours (default: that of each hour)
+
+    Returns:
+        list of 7 rows (Monday first) of 24 counts (midnight first)
+    """
+    matrix = [[0] * len(HOURS) for _ in WEEKDAYS]
+    for hour, count in hourly_counts:
+        if tz is not None:
+            hour = hour.astimezone(tz)
+        matrix[hour.weekday()][hour.hour] += count
+    return matrix
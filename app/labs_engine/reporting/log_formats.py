@@ -0,0 +1,183 @@
+"""Parsers for supported Nginx access log formats.
+
+Each format turns a raw log line into a ``LogEntry``, or returns None if the
+line is not in that format. Formats are registered by name in
+``LOG_FORMATS`` and the format of a file can be detected from a sample of
+its first lines with ``detect_format``.
+
+To support a new nginx ``log_format``, subclass ``LogFormat`` and decorate it
+with ``@register``.
+"""
+
+import json
+import re
+from collections import namedtuple
+from datetime import datetime, timezone
+from functools import lru_cache
+
+DETECT_SAMPLE_LINES = 50
+DEFAULT_FORMAT = 'combined'
+
+LogEntry = namedtuple(
+    'LogEntry',
+    ['ip', 'datetime', 'method', 'path', 'status', 'referer', 'user_agent'],
+)
+
+LOG_FORMATS = {}
+
+
+def register(cls):
+    """Class decorator to register a log format by name."""
+    LOG_FORMATS[cls.name] = cls()
+    return cls
+
+
+@lru_cache(maxsize=4096)
+def parse_time_local(value):
+    """Parse nginx $time_local e.g. 30/Dec/2025:13:07:59 +0000 to UTC.
+
+    Log lines are written in time order, so memoizing consecutive lines in
+    the same second avoids most calls to strptime.
+    """
+    return datetime.strptime(
+        value, '%d/%b/%Y:%H:%M:%S %z').astimezone(timezone.utc)
+
+
+@lru_cache(maxsize=4096)
+def parse_time_iso8601(value):
+    """Parse nginx $time_iso8601 e.g. 2025-12-30T13:07:59+00:00 to UTC."""
+    return datetime.fromisoformat(value).astimezone(timezone.utc)
+
+
+class LogFormat:
+    """Base class for log formats."""
+
+    name = None
+
+    def parse(self, line):
+        """Return a LogEntry for the line, or None if it doesn't match."""
+        raise NotImplementedError
+
+
+@register
+class CombinedLogFormat(LogFormat):
+    """The nginx/Apache "combined" format, for IPv4 and IPv6 clients.
+
+    Example:
+    116.179.33.78 - - [30/Dec/2025:13:07:59 +0000] "GET ..." 200 592
+    "https://proteomics.usegalaxy.org.au/" "Mozilla/5.0..."
+    """
+
+    name = 'combined'
+    PATTERN = re.compile(
+        r'(?P<ip>[0-9A-Fa-f:.]+) \S+ \S+ '
+        r'\[(?P<datetime>[^\]]+)\] '
+        r'"(?P<method>\w+) (?P<path>[^\s]+) HTTP/[\d.]+" '
+        r'(?P<status>\d+) (?P<size>\d+|-) '
+        r'"(?P<referer>[^"]*)" '
+        r'"(?P<user_agent>[^"]*)"'
+    )
+
+    def parse(self, line):
+        """Parse a combined format log line."""
+        match = self.PATTERN.match(line)
+        if not match:
+            return None
+        return LogEntry(
+            ip=match.group('ip'),
+            datetime=parse_time_local(match.group('datetime')),
+            method=match.group('method'),
+            path=match.group('path'),
+            status=int(match.group('status')),
+            referer=match.group('referer'),
+            user_agent=match.group('user_agent'),
+        )
+
+
+@register
+class JSONLogFormat(LogFormat):
+    """Structured nginx logs written with ``log_format ... escape=json``.
+
+    Recognises the standard nginx variable names as keys e.g.:
+
+    {"remote_addr": "2001:db8::1", "time_iso8601": "2025-12-30T13:07:59+00:00",
+     "request": "GET /static/welcome.html HTTP/1.1", "status": "200",
+     "http_referer": "https://genome.usegalaxy.org.au/",
+     "http_user_agent": "Mozilla/5.0..."}
+    """
+
+    name = 'json'
+
+    def parse(self, line):
+        """Parse a JSON log line."""
+        line = line.strip()
+        if not line.startswith('{'):
+            return None
+        try:
+            data = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+
+        if data.get('time_iso8601'):
+            dt = parse_time_iso8601(data['time_iso8601'])
+        elif data.get('time_local'):
+            dt = parse_time_local(data['time_local'])
+        else:
+            return None
+
+        method = data.get('request_method')
+        path = data.get('request_uri')
+        if data.get('request') and not (method and path):
+            parts = data['request'].split(' ')
+            if len(parts) < 2:
+                return None
+            method, path = parts[0], parts[1]
+        if not (method and path):
+            return None
+
+        try:
+            status = int(data.get('status') or 0)
+        except ValueError:
+            status = 0
+
+        return LogEntry(
+            ip=data.get('remote_addr', ''),
+            datetime=dt,
+            method=method,
+            path=path,
+            status=status,
+            referer=data.get('http_referer', ''),
+            user_agent=data.get('http_user_agent', ''),
+        )
+
+
+def get_format(name):
+    """Return the registered log format with the given name."""
+    try:
+        return LOG_FORMATS[name]
+    except KeyError:
+        raise ValueError(
+            f'Unknown log format "{name}". Choose from:'
+            f' {", ".join(LOG_FORMATS)}')
+
+
+def detect_format(lines):
+    """Detect the log format of a sample of lines.
+
+    Returns:
+        the LogFormat which parses the most lines, or the default format if
+        none of them match
+    """
+    lines = [line for line in lines if line.strip()]
+    best_format = LOG_FORMATS[DEFAULT_FORMAT]
+    best_matches = 0
+    for log_format in LOG_FORMATS.values():
+        matches = sum(
+            1 for line in lines
+            if log_format.parse(line) is not None
+        )
+        if matches > best_matches:
+            best_format, best_matches = log_format, matches
+    return best_format
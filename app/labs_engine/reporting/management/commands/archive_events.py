@@ -0,0 +1,65 @@
+"""Django management command to archive old reporting events to Parquet."""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from labs_engine.reporting import archive
+from labs_engine.reporting.models import LabVisit, ToolUsage
+
+
+class Command(BaseCommand):
+    """Move old LabVisit/ToolUsage rows from the database to the archive."""
+
+    help = (
+        'Compact reporting events older than N days into partitioned Parquet'
+        ' files and delete them from the database'
+    )
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.REPORTING_ARCHIVE_AFTER_DAYS,
+            help=(
+                'Archive events older than this many days'
+                f' (default: {settings.REPORTING_ARCHIVE_AFTER_DAYS})'
+            ),
+        )
+        parser.add_argument(
+            '--type',
+            type=str,
+            choices=['visit', 'tool'],
+            help='Only archive this type of event (default: both)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report how many events would be archived and exit',
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        before = timezone.now() - timezone.timedelta(days=options['days'])
+        models = {
+            'visit': LabVisit,
+            'tool': ToolUsage,
+        }
+        if options['type']:
+            models = {options['type']: models[options['type']]}
+
+        self.stdout.write(
+            f'Archiving events before {before:%Y-%m-%d %H:%M:%S}'
+            f' to {settings.REPORTING_ARCHIVE_ROOT}')
+
+        for name, model in models.items():
+            if options['dry_run']:
+                count = model.objects.filter(datetime__lt=before).count()
+                self.stdout.write(
+                    f'{model._meta.verbose_name_plural}: {count} events'
+                    ' would be archived')
+                continue
+            count = archive.archive_events(model, before)
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: archived {count} events'))
@@ -0,0 +1,247 @@
+"""Django management command to benchmark log ingestion and reporting."""
+
+import json
+import math
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from pathlib import Path
+
+from labs_engine.reporting import api
+from labs_engine.reporting.db import reporting_db
+from labs_engine.reporting.models import LabVisit, ToolUsage
+from labs_engine.reporting.nginx_logs import (
+    LOG_TYPE,
+    import_nginx_log,
+    open_log,
+)
+from labs_engine.reporting.synthetic import write_log
+
+from .generate_logs import add_generator_arguments, generator_from_options
+
+CSV_METRICS = ('visits', 'tools', 'visitors')
+
+
+class Rollback(Exception):
+    """Raised to roll back the benchmark data."""
+
+
+class Command(BaseCommand):
+    """Time log ingestion and the reporting API at increasing data sizes."""
+
+    help = (
+        'Benchmark reporting: import synthetic logs until the database holds'
+        ' each requested number of events, then time every reporting API'
+        ' endpoint (with the report cache disabled) and measure the peak'
+        ' memory of CSV exports. Results are written as JSON so they can be'
+        ' compared between releases. All benchmark data is rolled back;'
+        ' run against an empty database for comparable results. The upload'
+        ' endpoints need an RQ worker and are not benchmarked.'
+    )
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[1000000, 10000000],
+            help=(
+                'Numbers of events (visits and tool usages) to benchmark at'
+                ' (default: 1000000 10000000)'
+            ),
+        )
+        parser.add_argument(
+            '--tool-ratio',
+            type=float,
+            default=0.5,
+            help='Fraction of events which are tool usages (default: 0.5)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Number of times each endpoint is timed (default: 3)',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='reporting_benchmark.json',
+            help='Path of the JSON results file',
+        )
+        parser.add_argument(
+            '--label',
+            type=str,
+            help='Label stored with the results e.g. a release version',
+        )
+        add_generator_arguments(parser)
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        if not 0 <= options['tool_ratio'] <= 1:
+            raise CommandError('--tool-ratio must be between 0 and 1')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be positive')
+        generator = generator_from_options(options)
+        existing = LabVisit.objects.count() + ToolUsage.objects.count()
+        if existing:
+            self.stdout.write(self.style.WARNING(
+                f'The database already holds {existing} events - results'
+                ' will not be comparable with an empty database'))
+
+        results = {
+            'label': options['label'],
+            'created': timezone.now().isoformat(),
+            'database': connections[reporting_db()].vendor,
+            'python': platform.python_version(),
+            'options': {
+                key: options[key]
+                for key in (
+                    'rows', 'tool_ratio', 'repeat', 'labs', 'tools',
+                    'clients', 'bot_ratio', 'days', 'seed',
+                )
+            },
+            'runs': [],
+        }
+
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(
+            NOCACHE=True,
+            REPORTING_ARCHIVE_ROOT=Path(tmp_dir) / 'archive',
+        ):
+            try:
+                with transaction.atomic(using=reporting_db()):
+                    for rows in sorted(options['rows']):
+                        results['runs'].append(self.run(
+                            rows, generator, options, Path(tmp_dir)))
+                    raise Rollback
+            except Rollback:
+                pass
+
+        output = Path(options['output'])
+        output.write_text(json.dumps(results, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f'Benchmark results written to {output}'))
+
+    def run(self, rows, generator, options, tmp_dir):
+        """Grow the data to ``rows`` events and benchmark it."""
+        self.stdout.write(f'Benchmarking at {rows} events')
+        ingestion = {}
+        existing = {
+            LOG_TYPE.WELCOME: LabVisit.objects.count(),
+            LOG_TYPE.TOOL: ToolUsage.objects.count(),
+        }
+        targets = {
+            LOG_TYPE.TOOL: round(rows * options['tool_ratio']),
+        }
+        targets[LOG_TYPE.WELCOME] = rows - targets[LOG_TYPE.TOOL]
+        make_lines = {
+            LOG_TYPE.WELCOME: generator.welcome_lines,
+            LOG_TYPE.TOOL: generator.tool_lines,
+        }
+        for log_type, target in targets.items():
+            missing = target - existing[log_type]
+            if missing <= 0:
+                continue
+            # Bot requests are skipped, so generate more lines to make up
+            lines = math.ceil(missing / (1 - min(options['bot_ratio'], 0.99)))
+            path = tmp_dir / f'{log_type}.log'
+            write_log(path, make_lines[log_type](lines))
+            started = time.perf_counter()
+            with open_log(path) as log_file:
+                result = import_nginx_log(log_file, log_type, batch_size=5000)
+            seconds = time.perf_counter() - started
+            path.unlink()
+            ingestion[log_type] = {
+                'lines': result['lines_processed'],
+                'seconds': round(seconds, 3),
+                'lines_per_second': round(
+                    result['lines_processed'] / seconds if seconds else 0),
+            }
+            self.stdout.write(
+                f"  Imported {result['lines_processed']} {log_type} lines"
+                f" ({ingestion[log_type]['lines_per_second']:,} lines/sec)")
+
+        endpoints = {}
+        for name, view, params in self.endpoints(generator, options):
+            endpoints[name] = self.time_endpoint(
+                view, params, options['repeat'])
+            self.stdout.write(
+                f"  {name}: {endpoints[name]['median_seconds']:.3f}s")
+
+        csv_memory = {}
+        for metric in CSV_METRICS:
+            csv_memory[metric] = self.csv_peak_memory(
+                {'metric': metric, 'days': options['days']})
+            self.stdout.write(
+                f'  CSV export of {metric}:'
+                f' {csv_memory[metric] / 1024 / 1024:.1f} MiB peak')
+
+        return {
+            'rows': LabVisit.objects.count() + ToolUsage.objects.count(),
+            'ingestion': ingestion,
+            'endpoints': endpoints,
+            'csv_peak_memory_bytes': csv_memory,
+        }
+
+    def endpoints(self, generator, options):
+        """Return (name, view, GET params) of each benchmarked endpoint."""
+        days = options['days']
+        lab = generator.labs[0]
+        tool = generator.tools[0]
+        return (
+            ('usage_visits', api.get_usage_data,
+             {'metric': 'visits', 'days': days}),
+            ('usage_visits_lab', api.get_usage_data,
+             {'metric': 'visits', 'days': days, 'lab': lab}),
+            ('usage_tools', api.get_usage_data,
+             {'metric': 'tools', 'days': days}),
+            ('usage_tool', api.get_usage_data,
+             {'metric': 'tools', 'days': days, 'tool': tool}),
+            ('usage_visitors', api.get_usage_data,
+             {'metric': 'visitors', 'days': days}),
+            ('heatmap_visits', api.get_heatmap_data,
+             {'metric': 'visits', 'days': days}),
+            ('heatmap_tool', api.get_heatmap_data,
+             {'metric': 'tools', 'days': days, 'lab': lab, 'tool': tool}),
+            ('funnel', api.get_funnel_data, {'days': days}),
+            ('tools_all', api.get_tools_list, {}),
+            ('tools_lab', api.get_tools_list, {'lab': lab}),
+            ('tools_trending', api.get_tools_list, {'window': 'trending'}),
+            ('tools_window', api.get_tools_list, {'window': days}),
+            *(
+                (f'csv_{metric}', api.download_csv,
+                 {'metric': metric, 'days': days})
+                for metric in CSV_METRICS
+            ),
+        )
+
+    def time_endpoint(self, view, params, repeat):
+        """Time repeated requests to a view."""
+        request = RequestFactory().get('/', params)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = view(request)
+            timings.append(time.perf_counter() - started)
+        return {
+            'status': response.status_code,
+            'bytes': len(response.content),
+            'min_seconds': round(min(timings), 4),
+            'median_seconds': round(statistics.median(timings), 4),
+        }
+
+    def csv_peak_memory(self, params):
+        """Return the peak bytes allocated while exporting a CSV."""
+        request = RequestFactory().get('/', params)
+        tracemalloc.start()
+        try:
+            api.download_csv(request)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
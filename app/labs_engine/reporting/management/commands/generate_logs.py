@@ -0,0 +1,106 @@
+"""Django management command to generate synthetic nginx logs."""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from labs_engine.reporting.synthetic import LogGenerator, write_log
+
+
+def add_generator_arguments(parser):
+    """Add arguments which configure the synthetic log generator."""
+    parser.add_argument(
+        '--labs',
+        type=int,
+        default=20,
+        help='Number of distinct labs (default: 20)',
+    )
+    parser.add_argument(
+        '--tools',
+        type=int,
+        default=500,
+        help='Number of distinct tools (default: 500)',
+    )
+    parser.add_argument(
+        '--clients',
+        type=int,
+        default=5000,
+        help='Number of distinct visitors (default: 5000)',
+    )
+    parser.add_argument(
+        '--bot-ratio',
+        type=float,
+        default=0.1,
+        help='Fraction of requests made by bots (default: 0.1)',
+    )
+    parser.add_argument(
+        '--days',
+        type=int,
+        default=90,
+        help='Number of days up to now spanned by the logs (default: 90)',
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        help='Random seed, for repeatable logs',
+    )
+
+
+def generator_from_options(options):
+    """Create a LogGenerator from command options."""
+    if not 0 <= options['bot_ratio'] <= 1:
+        raise CommandError('--bot-ratio must be between 0 and 1')
+    if min(options['labs'], options['tools'], options['clients']) < 1:
+        raise CommandError('--labs, --tools and --clients must be positive')
+    return LogGenerator(
+        labs=options['labs'],
+        tools=options['tools'],
+        clients=options['clients'],
+        bot_ratio=options['bot_ratio'],
+        days=options['days'],
+        seed=options['seed'],
+    )
+
+
+class Command(BaseCommand):
+    """Write synthetic welcome and tool logs for benchmarking."""
+
+    help = (
+        'Generate realistic synthetic nginx logs of lab welcome page and tool'
+        ' requests. Files ending with .gz are gzipped. Import them with'
+        ' import_logs, or see benchmark_reporting.'
+    )
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--welcome',
+            type=str,
+            help='Path of the welcome page log to write',
+        )
+        parser.add_argument(
+            '--tool',
+            type=str,
+            help='Path of the tool request log to write',
+        )
+        parser.add_argument(
+            '--lines',
+            type=int,
+            default=100000,
+            help='Number of lines written to each log (default: 100000)',
+        )
+        add_generator_arguments(parser)
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        if not (options['welcome'] or options['tool']):
+            raise CommandError('Provide --welcome and/or --tool log paths')
+        generator = generator_from_options(options)
+        lines = options['lines']
+        if options['welcome']:
+            count = write_log(
+                options['welcome'], generator.welcome_lines(lines))
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote {count} lines to {options['welcome']}"))
+        if options['tool']:
+            count = write_log(options['tool'], generator.tool_lines(lines))
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote {count} lines to {options['tool']}"))
@@ -1,22 +1,45 @@
 """Django management command to import nginx log files."""
 
+import glob
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from pathlib import Path
 
-from labs_engine.reporting.nginx_logs import import_nginx_log, LOG_TYPE
+from labs_engine.reporting.log_formats import LOG_FORMATS
+from labs_engine.reporting.nginx_logs import (
+    AUTO_DETECT,
+    LOG_TYPE,
+    LogWriter,
+    build_result,
+    match_rate,
+    parse_log_file,
+)
 
 
 class Command(BaseCommand):
     """Import nginx log files into the database."""
 
-    help = 'Import nginx log files (lab visits or tool usage)'
+    help = (
+        'Import nginx log files (lab visits or tool usage). Accepts files,'
+        ' directories and glob patterns; .gz and .zst files are decompressed'
+        ' transparently.'
+    )
 
     def add_arguments(self, parser):
         """Add command arguments."""
         parser.add_argument(
-            'path',
+            'paths',
             type=str,
-            help='Path to the log file to import',
+            nargs='+',
+            help=(
+                'Log files, directories or glob patterns to import'
+                ' e.g. "/var/log/nginx/access.log.*.gz"'
+            ),
         )
         parser.add_argument(
             '--type',
@@ -28,56 +51,193 @@ class Command(BaseCommand):
                 '(visit for welcome logs, tool for tool usage logs)'
             ),
         )
+        parser.add_argument(
+            '--format',
+            type=str,
+            choices=[AUTO_DETECT, *LOG_FORMATS],
+            default=AUTO_DETECT,
+            help=(
+                'Log format of the files. By default the format of each file'
+                ' is detected from its first lines'
+            ),
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of processes used to parse files in parallel',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of records inserted per transaction',
+        )
 
     def handle(self, *args, **options):
         """Execute the command."""
-        log_path = Path(options['path'])
+        log_paths = self.collect_paths(options['paths'])
         log_type_arg = options['type']
 
-        # Validate file exists
-        if not log_path.exists():
-            raise CommandError(f'File not found: {log_path}')
-
-        if not log_path.is_file():
-            raise CommandError(f'Path is not a file: {log_path}')
-
         # Map command arg to LOG_TYPE
         log_type_map = {
             'visit': LOG_TYPE.WELCOME,
             'tool': LOG_TYPE.TOOL,
         }
         log_type = log_type_map[log_type_arg]
+        workers = max(1, min(options['workers'], len(log_paths)))
+
+        self.stdout.write(
+            f'Importing {log_type_arg} logs from {len(log_paths)} file(s)'
+            f' with {workers} worker(s)')
+
+        writer = LogWriter(log_type, batch_size=options['batch_size'])
+        totals = {
+            'log_format': None,
+            'lines_processed': 0,
+            'lines_matched': 0,
+            'lines_unmatched': 0,
+            'records_parsed': 0,
+            'bots_skipped': 0,
+            'errors': [],
+            'total_errors': 0,
+        }
+        formats = set()
+        started = time.monotonic()
 
-        self.stdout.write(f'Importing {log_type_arg} logs from: {log_path}')
-
-        # Open and process the file
         try:
-            with open(log_path, 'r', encoding='utf-8') as log_file:
-                result = import_nginx_log(log_file, log_type)
-
-            # Display results
-            self.stdout.write(self.style.SUCCESS('\n' + result['message']))
-            self.stdout.write(f"Status: {result['status']}")
-            self.stdout.write(f"Lines processed: {result['lines_processed']}")
-
-            if log_type == LOG_TYPE.WELCOME:
-                visits = result['visits_created']
-                self.stdout.write(f"Visits created: {visits}")
-            elif log_type == LOG_TYPE.TOOL:
-                tool_usages = result['tool_usages_created']
-                self.stdout.write(f"Tool usages created: {tool_usages}")
-
-            if result.get('total_errors', 0) > 0:
+            for path, records, stats, seconds in self.parse_files(
+                log_paths, log_type, options['format'], workers,
+            ):
+                writer.write_many(records)
+                self.write_file_summary(path, stats, seconds)
+                if stats['log_format']:
+                    formats.add(stats['log_format'])
+                for key in ('lines_processed', 'lines_matched',
+                            'lines_unmatched', 'records_parsed',
+                            'bots_skipped', 'total_errors'):
+                    totals[key] += stats[key]
+                totals['errors'] += [
+                    {**error, 'line': f"{path.name}:{error['line']}"}
+                    for error in stats['errors']
+                ]
+            writer.close()
+        except Exception as e:
+            raise CommandError(f'Error processing log files: {str(e)}')
+
+        elapsed = time.monotonic() - started
+        totals['errors'] = totals['errors'][:10]
+        totals['log_format'] = ', '.join(sorted(formats)) or None
+        result = build_result(log_type, totals, writer.records_created)
+
+        # Display results
+        self.stdout.write(self.style.SUCCESS('\n' + result['message']))
+        self.stdout.write(f"Status: {result['status']}")
+        self.stdout.write(f"Log format: {result['log_format'] or 'unknown'}")
+        self.stdout.write(f"Lines processed: {result['lines_processed']}")
+
+        if log_type == LOG_TYPE.WELCOME:
+            visits = result['visits_created']
+            self.stdout.write(f"Visits created: {visits}")
+        elif log_type == LOG_TYPE.TOOL:
+            tool_usages = result['tool_usages_created']
+            self.stdout.write(f"Tool usages created: {tool_usages}")
+        self.stdout.write(f"Bots skipped: {result['bots_skipped']}")
+        self.stdout.write(
+            f"Lines matched: {result['lines_matched']}"
+            f" ({result['match_rate']:.1%} of relevant lines)")
+        if result['lines_unmatched']:
+            self.stdout.write(self.style.WARNING(
+                f"Lines not matching the log format:"
+                f" {result['lines_unmatched']}"))
+        rate = result['lines_processed'] / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Throughput: {rate:,.0f} lines/sec ({elapsed:.1f} seconds)")
+
+        if result.get('total_errors', 0) > 0:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"\nTotal errors: {result['total_errors']}"
+                )
+            )
+            self.stdout.write('First 10 errors:')
+            for error in result.get('errors', []):
                 self.stdout.write(
-                    self.style.WARNING(
-                        f"\nTotal errors: {result['total_errors']}"
-                    )
+                    f"  Line {error['line']}: {error['error']}"
                 )
-                self.stdout.write('First 10 errors:')
-                for error in result.get('errors', []):
-                    self.stdout.write(
-                        f"  Line {error['line']}: {error['error']}"
-                    )
 
-        except Exception as e:
-            raise CommandError(f'Error processing log file: {str(e)}')
+    def collect_paths(self, patterns):
+        """Expand files, directories and glob patterns to a list of files."""
+        paths = []
+        for pattern in patterns:
+            matches = (
+                [Path(p) for p in sorted(glob.glob(pattern))]
+                if glob.has_magic(pattern)
+                else [Path(pattern)]
+            )
+            if not matches:
+                raise CommandError(f'No files match pattern: {pattern}')
+            for path in matches:
+                if not path.exists():
+                    raise CommandError(f'File not found: {path}')
+                if path.is_dir():
+                    paths += sorted(p for p in path.iterdir() if p.is_file())
+                elif path.is_file():
+                    paths.append(path)
+                else:
+                    raise CommandError(f'Path is not a file: {path}')
+        return list(dict.fromkeys(paths))
+
+    def parse_files(self, paths, log_type, log_format, workers):
+        """Parse files in a process pool, yielding results as they finish.
+
+        At most ``workers`` files are parsed ahead of the caller, so that
+        only their records are held in memory however many files there are.
+
+        Yields:
+            tuple of (path, records, stats, seconds)
+        """
+        if workers == 1:
+            for path in paths:
+                started = time.monotonic()
+                records, stats = parse_log_file(path, log_type, log_format)
+                yield path, records, stats, time.monotonic() - started
+            return
+
+        # Workers never use the database - don't share the parent's
+        # connections with forked processes.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(workers, mp_context=context) as executor:
+            paths = iter(paths)
+            futures = {}
+            while True:
+                for path in islice(paths, workers - len(futures)):
+                    future = executor.submit(
+                        _timed_parse, path, log_type, log_format)
+                    futures[future] = path
+                if not futures:
+                    return
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    records, stats, seconds = future.result()
+                    yield futures.pop(future), records, stats, seconds
+
+    def write_file_summary(self, path, stats, seconds):
+        """Write a one-line summary of a parsed file."""
+        rate = stats['lines_processed'] / seconds if seconds else 0
+        self.stdout.write(
+            f"  {path.name} [{stats['log_format']}]:"
+            f" {stats['lines_processed']} lines,"
+            f" {match_rate(stats):.1%} matched,"
+            f" {stats['records_parsed']} records,"
+            f" {stats['bots_skipped']} bots,"
+            f" {stats['total_errors']} errors"
+            f" ({rate:,.0f} lines/sec)")
+
+
+def _timed_parse(path, log_type, log_format):
+    """Parse a log file in a worker process and time it."""
+    started = time.monotonic()
+    records, stats = parse_log_file(path, log_type, log_format)
+    return records, stats, time.monotonic() - started
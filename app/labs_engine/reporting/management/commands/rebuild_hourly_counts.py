@@ -0,0 +1,40 @@
+"""Django management command to rebuild hourly event counts."""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from labs_engine.reporting.api import count_events
+from labs_engine.reporting.db import reporting_db
+from labs_engine.reporting.heatmap import ALL_TOOLS, HourlyCounter
+from labs_engine.reporting.models import HourlyCount, LabVisit, ToolUsage
+
+
+class Command(BaseCommand):
+    """Recompute HourlyCount from all recorded and archived events."""
+
+    help = (
+        'Rebuild the hourly visit and tool use counts used for traffic'
+        ' heatmaps. Counts are updated on ingest, so this is only needed'
+        ' once after upgrading to a release with heatmaps.'
+    )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        for metric, model, fields in (
+            (HourlyCount.VISITS, LabVisit, ('hour', 'lab_name')),
+            (HourlyCount.TOOLS, ToolUsage, ('hour', 'lab_name', 'tool_id')),
+        ):
+            counter = HourlyCounter()
+            for item in count_events(model, fields):
+                counter.add(
+                    item['lab_name'],
+                    item.get('tool_id', ALL_TOOLS),
+                    item['hour'],
+                    count=item['count'],
+                )
+            with transaction.atomic(using=reporting_db()):
+                HourlyCount.objects.filter(metric=metric).delete()
+                HourlyCount.merge_counts(metric, counter)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {HourlyCount.objects.count()} hourly counts'))
@@ -0,0 +1,29 @@
+"""Django management command to rebuild precomputed tool trends."""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from labs_engine.reporting.api import count_tool_trends
+from labs_engine.reporting.db import reporting_db
+from labs_engine.reporting.models import ToolTrend
+
+
+class Command(BaseCommand):
+    """Recompute ToolTrend from all recorded and archived tool usage."""
+
+    help = (
+        'Rebuild the tool counts and trending scores used to rank tools.'
+        ' Trends are updated on ingest, so this is only needed once after'
+        ' upgrading to a release with trends, or after changing'
+        ' REPORTING_TRENDING_HALF_LIFE_DAYS.'
+    )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        counter = count_tool_trends()
+        with transaction.atomic(using=reporting_db()):
+            ToolTrend.objects.all().delete()
+            ToolTrend.merge_counts(counter)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt trends for {ToolTrend.objects.count()} lab tools'))
@@ -0,0 +1,206 @@
+"""Django management command to ingest live nginx logs as they are written."""
+
+import os
+import signal
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from labs_engine.reporting.db import reporting_db
+from labs_engine.reporting.funnel import FunnelTracker
+from labs_engine.reporting.log_formats import LOG_FORMATS
+from labs_engine.reporting.models import LabFunnel, LogCheckpoint
+from labs_engine.reporting.nginx_logs import (
+    AUTO_DETECT,
+    LOG_TYPE,
+    LogParser,
+    LogWriter,
+    track_funnel,
+)
+from labs_engine.reporting.tail import LogTailer
+
+
+class LogSource:
+    """A tailed log file and the records parsed since the last checkpoint."""
+
+    def __init__(self, path, log_type, log_format, start_at_end):
+        """Resume tailing from the stored checkpoint, if any."""
+        path = os.path.abspath(path)
+        checkpoint = LogCheckpoint.objects.filter(path=path).first()
+        self.log_type = log_type
+        self.tailer = LogTailer(
+            path,
+            inode=checkpoint.inode if checkpoint else None,
+            offset=checkpoint.offset if checkpoint else 0,
+            start_at_end=start_at_end,
+        )
+        self.parser = LogParser(log_type, log_format)
+        self.records = []
+        self.checkpoint = (
+            (checkpoint.inode, checkpoint.offset) if checkpoint else None)
+
+    def read(self):
+        """Parse new lines and return the number read."""
+        lines = self.tailer.read_lines()
+        self.records += self.parser.parse(lines)
+        return len(lines)
+
+    @property
+    def dirty(self):
+        """Return True if there is anything to commit."""
+        if self.tailer.inode is None:
+            # The file hasn't been opened yet
+            return False
+        return bool(self.records) or (
+            self.tailer.position != self.checkpoint)
+
+
+class Command(BaseCommand):
+    """Tail nginx log files and import new lines continuously."""
+
+    help = (
+        'Tail the nginx welcome and tool logs and import new lines in'
+        ' micro-batches. Follows logrotate and checkpoints the position in'
+        ' each file, so restarts neither lose nor double-count lines. When'
+        ' both logs are tailed, lab visits which lead to tool launches are'
+        ' counted in the LabFunnel rollup.'
+    )
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--welcome',
+            type=str,
+            help='Path of the nginx log of welcome page requests',
+        )
+        parser.add_argument(
+            '--tool',
+            type=str,
+            help='Path of the nginx log of tool requests',
+        )
+        parser.add_argument(
+            '--format',
+            type=str,
+            choices=[AUTO_DETECT, *LOG_FORMATS],
+            default=AUTO_DETECT,
+            help='Log format of the files (default: detect)',
+        )
+        parser.add_argument(
+            '--flush-interval',
+            type=float,
+            default=5.0,
+            help='Seconds between database writes (default: 5)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait for new lines when idle (default: 1)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Write early when this many records are waiting',
+        )
+        parser.add_argument(
+            '--from-start',
+            action='store_true',
+            help=(
+                'Import lines already in files that have no checkpoint.'
+                ' By default only lines written from now on are imported'
+            ),
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Import all available lines and exit',
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        self.verbosity = options['verbosity']
+        paths = {
+            LOG_TYPE.WELCOME: options['welcome'],
+            LOG_TYPE.TOOL: options['tool'],
+        }
+        if not any(paths.values()):
+            raise CommandError('Provide --welcome and/or --tool log paths')
+
+        sources = [
+            LogSource(
+                path,
+                log_type,
+                options['format'],
+                start_at_end=not options['from_start'],
+            )
+            for log_type, path in paths.items()
+            if path
+        ]
+        for source in sources:
+            self.stdout.write(f'Tailing {source.tailer.path}')
+        self.funnel = (
+            FunnelTracker(
+                settings.REPORTING_FUNNEL_WINDOW_MINUTES,
+                settings.REPORTING_FUNNEL_MAX_CLIENTS,
+            )
+            if len(sources) == len(paths)
+            else None
+        )
+
+        self.running = True
+        if not options['once']:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        last_commit = time.monotonic()
+        try:
+            while self.running:
+                lines_read = sum(source.read() for source in sources)
+                pending = sum(len(source.records) for source in sources)
+                due = (
+                    time.monotonic() - last_commit
+                    >= options['flush_interval'])
+                if due or pending >= options['batch_size']:
+                    self.commit(sources, options['batch_size'])
+                    last_commit = time.monotonic()
+                if options['once'] and not lines_read:
+                    break
+                if not lines_read:
+                    time.sleep(options['poll_interval'])
+            self.commit(sources, options['batch_size'])
+        finally:
+            for source in sources:
+                source.tailer.close()
+
+    def stop(self, signum, frame):
+        """Stop after the current micro-batch."""
+        self.running = False
+
+    def commit(self, sources, batch_size):
+        """Write parsed records and checkpoints in one transaction."""
+        sources = [source for source in sources if source.dirty]
+        if not sources:
+            return
+        with transaction.atomic(using=reporting_db()):
+            for source in sources:
+                writer = LogWriter(source.log_type, batch_size=batch_size)
+                writer.write_many(source.records)
+                writer.close()
+                inode, offset = source.tailer.position
+                LogCheckpoint.objects.update_or_create(
+                    path=source.tailer.path,
+                    defaults={'inode': inode, 'offset': offset},
+                )
+            if self.funnel is not None:
+                track_funnel(
+                    self.funnel, *(source.records for source in sources))
+                LabFunnel.merge_counts(self.funnel.pop_counts())
+        for source in sources:
+            if source.records and self.verbosity > 1:
+                self.stdout.write(
+                    f'{source.tailer.path}:'
+                    f' imported {len(source.records)} records')
+            source.records = []
+            source.checkpoint = source.tailer.position
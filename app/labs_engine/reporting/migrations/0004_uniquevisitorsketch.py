@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0003_toolusage_tool_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UniqueVisitorSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lab_name', models.CharField(help_text='Name of the lab visited', max_length=255)),
+                ('date', models.DateField(help_text='Date (UTC) of the visits')),
+                ('registers', models.BinaryField(help_text='HyperLogLog registers')),
+            ],
+            options={
+                'verbose_name': 'Unique Visitor Sketch',
+                'verbose_name_plural': 'Unique Visitor Sketches',
+                'constraints': [models.UniqueConstraint(fields=('lab_name', 'date'), name='unique_visitor_sketch_lab_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0004_uniquevisitorsketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(help_text='Path of the log file being tailed', max_length=512, unique=True)),
+                ('inode', models.BigIntegerField(help_text='Inode of the file when the offset was recorded')),
+                ('offset', models.BigIntegerField(default=0, help_text='Byte offset of the next unread line')),
+                ('modified', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Log Checkpoint',
+                'verbose_name_plural': 'Log Checkpoints',
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:05
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_tokens(apps, schema_editor):
+    """Replace stored plain tokens with their SHA-256 hash."""
+    APIToken = apps.get_model('reporting', 'APIToken')
+    for token in APIToken.objects.all():
+        token.prefix = token.token_hash[:8]
+        token.token_hash = hashlib.sha256(
+            token.token_hash.encode('utf-8')).hexdigest()
+        token.save(update_fields=['prefix', 'token_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0005_logcheckpoint'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='apitoken',
+            old_name='token',
+            new_name='token_hash',
+        ),
+        migrations.AlterField(
+            model_name='apitoken',
+            name='token_hash',
+            field=models.CharField(editable=False, help_text='SHA-256 hash of the API token', max_length=64, unique=True),
+        ),
+        migrations.AddField(
+            model_name='apitoken',
+            name='prefix',
+            field=models.CharField(blank=True, editable=False, help_text='First characters of the token, to identify it', max_length=8),
+        ),
+        # Plain tokens can't be recovered from their hash
+        migrations.RunPython(hash_tokens),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:45
+#
+# ToolTrend starts empty. Run the rebuild_tool_trends management command to
+# count existing events into it - until then the tools API counts events.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0006_apitoken_token_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ToolTrend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lab_name', models.CharField(blank=True, help_text='Name of the lab, or empty for all labs', max_length=255)),
+                ('tool_id', models.CharField(help_text='Tool ID without version', max_length=512)),
+                ('tool_name', models.CharField(blank=True, default='', help_text='Parsed tool name for display', max_length=512)),
+                ('count', models.BigIntegerField(default=0, help_text='All-time number of uses')),
+                ('log_score', models.FloatField(help_text='Log of the decayed trending score relative to the epoch')),
+                ('last_used', models.DateTimeField(help_text='Timestamp of the latest use')),
+            ],
+            options={
+                'verbose_name': 'Tool Trend',
+                'verbose_name_plural': 'Tool Trends',
+                'indexes': [models.Index(fields=['lab_name', '-log_score'], name='tool_trend_lab_score'), models.Index(fields=['lab_name', '-count'], name='tool_trend_lab_count')],
+                'constraints': [models.UniqueConstraint(fields=('lab_name', 'tool_id'), name='unique_tool_trend_lab_tool')],
+            },
+        ),
+    ]
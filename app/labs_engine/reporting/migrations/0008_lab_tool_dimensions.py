@@ -0,0 +1,134 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_dimensions(apps, schema_editor):
+    """Create Lab/Tool rows and point existing events at them.
+
+    Each event table is updated with a single correlated subquery on the
+    new (unique, indexed) dimension tables.
+    """
+    Lab = apps.get_model('reporting', 'Lab')
+    Tool = apps.get_model('reporting', 'Tool')
+    LabVisit = apps.get_model('reporting', 'LabVisit')
+    ToolUsage = apps.get_model('reporting', 'ToolUsage')
+
+    lab_names = (
+        set(LabVisit.objects.values_list('lab_name', flat=True).distinct())
+        | set(ToolUsage.objects.values_list('lab_name', flat=True).distinct())
+    )
+    Lab.objects.bulk_create(
+        [Lab(name=name) for name in lab_names],
+        ignore_conflicts=True,
+    )
+    tools = dict(
+        ToolUsage.objects.values_list('legacy_tool_id', 'tool_name')
+        .distinct()
+    )
+    Tool.objects.bulk_create(
+        [
+            Tool(tool_id=tool_id, name=name)
+            for tool_id, name in tools.items()
+        ],
+        ignore_conflicts=True,
+    )
+
+    lab_pk = Lab.objects.filter(
+        name=models.OuterRef('lab_name')).values('pk')[:1]
+    LabVisit.objects.update(lab=models.Subquery(lab_pk))
+    ToolUsage.objects.update(
+        lab=models.Subquery(lab_pk),
+        tool=models.Subquery(
+            Tool.objects.filter(
+                tool_id=models.OuterRef('legacy_tool_id')).values('pk')[:1]
+        ),
+    )
+
+
+def populate_names(apps, schema_editor):
+    """Copy lab and tool names back onto events."""
+    Lab = apps.get_model('reporting', 'Lab')
+    Tool = apps.get_model('reporting', 'Tool')
+    LabVisit = apps.get_model('reporting', 'LabVisit')
+    ToolUsage = apps.get_model('reporting', 'ToolUsage')
+
+    lab_name = Lab.objects.filter(
+        pk=models.OuterRef('lab_id')).values('name')[:1]
+    tool = Tool.objects.filter(pk=models.OuterRef('tool_id'))
+    LabVisit.objects.update(lab_name=models.Subquery(lab_name))
+    ToolUsage.objects.update(
+        lab_name=models.Subquery(lab_name),
+        legacy_tool_id=models.Subquery(tool.values('tool_id')[:1]),
+        tool_name=models.Subquery(tool.values('name')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0007_tooltrend'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lab',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Name of the lab (the subdomain of its Galaxy server)', max_length=255, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Tool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tool_id', models.CharField(help_text='Tool ID from Galaxy without version', max_length=512, unique=True)),
+                ('name', models.CharField(blank=True, default='', help_text='Parsed tool name for display', max_length=512)),
+            ],
+            options={
+                'ordering': ['tool_id'],
+            },
+        ),
+        # The tool foreign key's column is named tool_id
+        migrations.RenameField(
+            model_name='toolusage',
+            old_name='tool_id',
+            new_name='legacy_tool_id',
+        ),
+        # Allow the old columns to be re-added empty when migrating backwards
+        migrations.AlterField(
+            model_name='labvisit',
+            name='lab_name',
+            field=models.CharField(help_text='Name of the lab visited', max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='toolusage',
+            name='lab_name',
+            field=models.CharField(help_text='Name of the lab where tool was used', max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='toolusage',
+            name='legacy_tool_id',
+            field=models.CharField(help_text='Full tool ID from Galaxy', max_length=512, null=True),
+        ),
+        migrations.AddField(
+            model_name='labvisit',
+            name='lab',
+            field=models.ForeignKey(help_text='Lab visited', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='visits', to='reporting.lab'),
+        ),
+        migrations.AddField(
+            model_name='toolusage',
+            name='lab',
+            field=models.ForeignKey(help_text='Lab where the tool was used', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='tool_usages', to='reporting.lab'),
+        ),
+        migrations.AddField(
+            model_name='toolusage',
+            name='tool',
+            field=models.ForeignKey(help_text='Tool used', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='usages', to='reporting.tool'),
+        ),
+        migrations.RunPython(populate_dimensions, populate_names),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0008_lab_tool_dimensions'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='labvisit',
+            name='lab_name',
+        ),
+        migrations.RemoveField(
+            model_name='toolusage',
+            name='lab_name',
+        ),
+        migrations.RemoveField(
+            model_name='toolusage',
+            name='legacy_tool_id',
+        ),
+        migrations.RemoveField(
+            model_name='toolusage',
+            name='tool_name',
+        ),
+        migrations.AlterField(
+            model_name='labvisit',
+            name='lab',
+            field=models.ForeignKey(help_text='Lab visited', on_delete=django.db.models.deletion.PROTECT, related_name='visits', to='reporting.lab'),
+        ),
+        migrations.AlterField(
+            model_name='toolusage',
+            name='lab',
+            field=models.ForeignKey(help_text='Lab where the tool was used', on_delete=django.db.models.deletion.PROTECT, related_name='tool_usages', to='reporting.lab'),
+        ),
+        migrations.AlterField(
+            model_name='toolusage',
+            name='tool',
+            field=models.ForeignKey(help_text='Tool used', on_delete=django.db.models.deletion.PROTECT, related_name='usages', to='reporting.tool'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:57
+#
+# HourlyCount starts empty. Run the rebuild_hourly_counts management command
+# to count existing events into it - until then heatmaps count events.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0009_remove_event_names'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('visits', 'Lab visits'), ('tools', 'Tool uses')], max_length=16)),
+                ('lab_name', models.CharField(blank=True, help_text='Name of the lab, or empty for all labs', max_length=255)),
+                ('tool_id', models.CharField(blank=True, help_text='Tool ID without version, or empty for all tools', max_length=512)),
+                ('hour', models.DateTimeField(help_text='Start of the hour')),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Hourly Count',
+                'verbose_name_plural': 'Hourly Counts',
+                'constraints': [models.UniqueConstraint(fields=('metric', 'lab_name', 'tool_id', 'hour'), name='unique_hourly_count')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0010_hourlycount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabFunnel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lab_name', models.CharField(max_length=255)),
+                ('date', models.DateField()),
+                ('visits', models.BigIntegerField(default=0, help_text='Number of welcome page visits')),
+                ('converted_visits', models.BigIntegerField(default=0, help_text='Visits followed by a tool launch by the same client')),
+                ('tool_launches', models.BigIntegerField(default=0, help_text='Number of tool launches')),
+                ('attributed_launches', models.BigIntegerField(default=0, help_text='Tool launches which followed a visit by the same client')),
+            ],
+            options={
+                'verbose_name': 'Lab Funnel',
+                'verbose_name_plural': 'Lab Funnels',
+                'constraints': [models.UniqueConstraint(fields=('lab_name', 'date'), name='unique_lab_funnel_lab_date')],
+            },
+        ),
+    ]
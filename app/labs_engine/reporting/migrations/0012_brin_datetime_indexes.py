@@ -0,0 +1,40 @@
+"""Add BRIN indexes on event datetimes when the database is PostgreSQL.
+
+Events are inserted in roughly time order, so a BRIN index makes date range
+scans cheap at a tiny fraction of the size and insert cost of a B-tree. Other
+databases don't support BRIN and are left unchanged.
+"""
+
+from django.db import migrations
+
+INDEXES = {
+    'reporting_labvisit': 'reporting_labvisit_datetime_brin',
+    'reporting_toolusage': 'reporting_toolusage_datetime_brin',
+}
+
+
+def create_brin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, index in INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index}'
+            f' ON {table} USING brin (datetime)')
+
+
+def drop_brin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index in INDEXES.values():
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0011_labfunnel'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_brin_indexes, drop_brin_indexes),
+    ]
@@ -1,23 +1,69 @@
-import re
+import hashlib
 import secrets
-from datetime import datetime
-from urllib.parse import urlparse
+from functools import lru_cache
+from urllib.parse import parse_qs, urlparse
 
-from django.db import models
-from django.utils import timezone
+from django.conf import settings
+from django.db import models, transaction
+
+from .db import reporting_db
+from .funnel import COUNT_FIELDS as FUNNEL_COUNT_FIELDS
+from .heatmap import ALL_TOOLS, build_heatmap, truncate_hour
+from .hll import HyperLogLog
+from .log_formats import LOG_FORMATS
+from .trending import ALL_LABS, decayed_score, logaddexp
+
+
+def insert_missing(model, rows):
+    """Insert rows for unique keys which aren't stored yet.
+
+    Row locks don't cover keys which don't exist yet, so two writers adding
+    the same key would both try to create it. Instead, writers insert empty
+    rows for every key first, ignoring conflicts, and then lock and update
+    the rows. Must be called in the same transaction as the update.
+
+    Args:
+        model: model class with a unique constraint on the rows' keys
+        rows: unsaved instances with empty counts
+    """
+    model.objects.bulk_create(rows, ignore_conflicts=True, batch_size=1000)
+
+
+def lab_name_from_hostname(hostname):
+    """Return the lab subdomain of a hostname, or None if there isn't one.
+
+    Example: proteomics.usegalaxy.org.au -> proteomics
+    """
+    if not hostname:
+        return None
+    parts = hostname.split('.')
+    if len(parts) < 3:
+        return None
+    return parts[0]
 
 
 class APIToken(models.Model):
-    """API authentication token for external services."""
+    """API authentication token for external services.
+
+    Only a SHA-256 hash of the token is stored. The plain token is available
+    as ``token`` on the instance that generated it, and must be copied by
+    the user when it is created.
+    """
     name = models.CharField(
         max_length=255,
         help_text="Descriptive name for this token",
     )
-    token = models.CharField(
+    token_hash = models.CharField(
         max_length=64,
         unique=True,
         editable=False,
-        help_text="The API token",
+        help_text="SHA-256 hash of the API token",
+    )
+    prefix = models.CharField(
+        max_length=8,
+        editable=False,
+        blank=True,
+        help_text="First characters of the token, to identify it",
     )
     created = models.DateTimeField(auto_now_add=True)
     last_used = models.DateTimeField(null=True, blank=True)
@@ -32,131 +78,87 @@ class APIToken(models.Model):
 
     def save(self, *args, **kwargs):
         """Generate token on creation."""
-        if not self.token:
+        if not self.token_hash:
             self.token = secrets.token_urlsafe(48)
+            self.token_hash = self.hash_token(self.token)
+            self.prefix = self.token[:8]
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def hash_token(token):
+        """Return the hash of a token value, as stored in token_hash."""
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
     class Meta:
         """Model metadata."""
         verbose_name = "API Token"
         verbose_name_plural = "API Tokens"
 
 
-class LabVisit(models.Model):
-    """Record of a visit to a lab report."""
+class Lab(models.Model):
+    """A lab that reporting events are recorded for."""
 
-    lab_name = models.CharField(
+    name = models.CharField(
         max_length=255,
-        help_text="Name of the lab visited",
-    )
-    datetime = models.DateTimeField(
-        help_text="Timestamp of the visit",
+        unique=True,
+        help_text="Name of the lab (the subdomain of its Galaxy server)",
     )
 
     def __str__(self):
         """Return a string representation of self."""
-        return f"LabVisit({self.lab_name} at {self.datetime})"
+        return self.name
 
     class Meta:
         """Model metadata."""
-        verbose_name = "Lab Visit"
-        verbose_name_plural = "Lab Visits"
-        ordering = ['-datetime']
+        ordering = ['name']
 
     @classmethod
-    def from_nginx_log(cls, log_entry):
+    def intern(cls, names, cache):
         """
-        Create a LabVisit instance from an Nginx log line.
-
-        Example log format:
-        116.179.33.78 - - [30/Dec/2025:13:07:59 +0000] "GET ..." 200 592
-        "https://proteomics.usegalaxy.org.au/" "Mozilla/5.0..."
+        Map lab names to primary keys, creating labs that don't exist.
 
         Args:
-            log_entry: String containing a single nginx log line
+            names: iterable of lab names
+            cache: dict of name -> pk which is read and updated in place
 
         Returns:
-            LabVisit instance or None if parsing fails
-        """
-        pattern = (
-            r'(?P<ip>[\d.]+) - - '
-            r'\[(?P<datetime>[^\]]+)\] '
-            r'"(?P<method>\w+) (?P<path>[^\s]+) HTTP/[\d.]+" '
-            r'(?P<status>\d+) (?P<size>\d+) '
-            r'"(?P<referer>[^"]*)" '
-            r'"(?P<user_agent>[^"]*)"'
-        )
-
-        match = re.match(pattern, log_entry.strip())
-        if not match:
-            return None
-
-        # Extract the referer URL to get the lab name
-        referer = match.group('referer')
-        if not referer or referer == '-':
-            return None
-
-        # Parse the lab name from the referer URL
-        # Example: https://proteomics.usegalaxy.org.au/ -> proteomics
-        parsed_url = urlparse(referer)
-        hostname = parsed_url.hostname
-        if not hostname:
-            return None
-
-        # Extract subdomain (lab name) from hostname
-        # Example: proteomics.usegalaxy.org.au -> proteomics
-        parts = hostname.split('.')
-        if len(parts) < 3:
-            return None
-        lab_name = parts[0]
-
-        # Parse the timestamp
-        # Format: 30/Dec/2025:13:07:59 +0000
-        timestamp_str = match.group('datetime')
-        dt = datetime.strptime(timestamp_str, '%d/%b/%Y:%H:%M:%S %z')
-
-        # Convert to Django timezone-aware datetime
-        dt_aware = timezone.make_aware(
-            dt.replace(tzinfo=None),
-            timezone.get_current_timezone()
-        )
-
-        return cls(
-            lab_name=lab_name,
-            datetime=dt_aware,
-        )
-
-
-class ToolUsage(models.Model):
-    """Record of a tool being used in a lab."""
+            the updated cache
+        """
+        missing = {name for name in names if name not in cache}
+        if missing:
+            cls.objects.bulk_create(
+                [cls(name=name) for name in missing],
+                ignore_conflicts=True,
+            )
+            cache.update(
+                cls.objects.filter(name__in=missing)
+                .values_list('name', 'pk')
+            )
+        return cache
+
+
+class Tool(models.Model):
+    """A Galaxy tool, identified by its tool ID without version."""
 
-    lab_name = models.CharField(
-        max_length=255,
-        help_text="Name of the lab where tool was used",
-    )
     tool_id = models.CharField(
         max_length=512,
-        help_text="Full tool ID from Galaxy",
+        unique=True,
+        help_text="Tool ID from Galaxy without version",
     )
-    tool_name = models.CharField(
+    name = models.CharField(
         max_length=512,
-        help_text="Parsed tool name for display",
         default='',
         blank=True,
-    )
-    datetime = models.DateTimeField(
-        help_text="Timestamp of the tool usage",
+        help_text="Parsed tool name for display",
     )
 
     def __str__(self):
         """Return a string representation of self."""
-        return f"ToolUsage({self.tool_id} in {self.lab_name})"
+        return self.name or self.tool_id
 
     class Meta:
         """Model metadata."""
-        verbose_name = "Tool Usage"
-        verbose_name_plural = "Tool Usages"
-        ordering = ['-datetime']
+        ordering = ['tool_id']
 
     @staticmethod
     def strip_tool_version(tool_id):
@@ -201,6 +203,157 @@ class ToolUsage(models.Model):
                 return '/'.join(parts[2:5])
         return tool_id
 
+    @classmethod
+    @lru_cache(maxsize=8192)
+    def parse_tool_id(cls, raw_tool_id):
+        """
+        Return (tool_id, name) for a tool ID as requested from Galaxy.
+
+        Memoized, since logs repeat a small number of distinct tool IDs.
+        """
+        tool_id = cls.strip_tool_version(raw_tool_id)
+        return tool_id, cls.parse_tool_name(tool_id)
+
+    @classmethod
+    def intern(cls, names, cache):
+        """
+        Map tool IDs to primary keys, creating tools that don't exist.
+
+        Args:
+            names: dict of tool_id -> name
+            cache: dict of tool_id -> pk which is read and updated in place
+
+        Returns:
+            the updated cache
+        """
+        missing = {
+            tool_id: name
+            for tool_id, name in names.items()
+            if tool_id not in cache
+        }
+        if missing:
+            cls.objects.bulk_create(
+                [
+                    cls(tool_id=tool_id, name=name)
+                    for tool_id, name in missing.items()
+                ],
+                ignore_conflicts=True,
+            )
+            cache.update(
+                cls.objects.filter(tool_id__in=missing)
+                .values_list('tool_id', 'pk')
+            )
+        return cache
+
+
+# Field names of events as reported (and archived), mapped to ORM lookups
+EVENT_FIELD_LOOKUPS = {
+    'lab_name': 'lab__name',
+    'tool_id': 'tool__tool_id',
+    'tool_name': 'tool__name',
+}
+
+
+class LabVisit(models.Model):
+    """Record of a visit to a lab report."""
+
+    lab = models.ForeignKey(
+        Lab,
+        on_delete=models.PROTECT,
+        related_name='visits',
+        help_text="Lab visited",
+    )
+    datetime = models.DateTimeField(
+        help_text="Timestamp of the visit",
+    )
+
+    def __str__(self):
+        """Return a string representation of self."""
+        return f"LabVisit({self.lab.name} at {self.datetime})"
+
+    class Meta:
+        """Model metadata."""
+        verbose_name = "Lab Visit"
+        verbose_name_plural = "Lab Visits"
+        ordering = ['-datetime']
+
+    @classmethod
+    def from_nginx_log(cls, log_entry):
+        """
+        Create a LabVisit instance from an Nginx log line.
+
+        Example log format:
+        116.179.33.78 - - [30/Dec/2025:13:07:59 +0000] "GET ..." 200 592
+        "https://proteomics.usegalaxy.org.au/" "Mozilla/5.0..."
+
+        Args:
+            log_entry: String containing a single nginx "combined" log line
+
+        Returns:
+            Unsaved LabVisit instance (with an unsaved Lab) or None if
+            parsing fails
+        """
+        entry = LOG_FORMATS['combined'].parse(log_entry.strip())
+        if not entry:
+            return None
+        return cls.from_log_entry(entry)
+
+    @classmethod
+    def from_log_entry(cls, entry):
+        """
+        Create a LabVisit instance from a parsed log entry.
+
+        Args:
+            entry: LogEntry parsed by one of ``log_formats.LOG_FORMATS``
+
+        Returns:
+            Unsaved LabVisit instance (with an unsaved Lab) or None if the
+            referer is not a lab
+        """
+        # Parse the lab name from the referer URL
+        # Example: https://proteomics.usegalaxy.org.au/ -> proteomics
+        referer = entry.referer
+        if not referer or referer == '-':
+            return None
+        lab_name = lab_name_from_hostname(urlparse(referer).hostname)
+        if not lab_name:
+            return None
+
+        return cls(
+            lab=Lab(name=lab_name),
+            datetime=entry.datetime,
+        )
+
+
+class ToolUsage(models.Model):
+    """Record of a tool being used in a lab."""
+
+    lab = models.ForeignKey(
+        Lab,
+        on_delete=models.PROTECT,
+        related_name='tool_usages',
+        help_text="Lab where the tool was used",
+    )
+    tool = models.ForeignKey(
+        Tool,
+        on_delete=models.PROTECT,
+        related_name='usages',
+        help_text="Tool used",
+    )
+    datetime = models.DateTimeField(
+        help_text="Timestamp of the tool usage",
+    )
+
+    def __str__(self):
+        """Return a string representation of self."""
+        return f"ToolUsage({self.tool.tool_id} in {self.lab.name})"
+
+    class Meta:
+        """Model metadata."""
+        verbose_name = "Tool Usage"
+        verbose_name_plural = "Tool Usages"
+        ordering = ['-datetime']
+
     @classmethod
     def from_nginx_log(cls, log_entry):
         """
@@ -211,68 +364,522 @@ class ToolUsage(models.Model):
         "https://genome.usegalaxy.org.au/?tool_id=..." "Mozilla/5.0..."
 
         Args:
-            log_entry: String containing a single nginx log line
+            log_entry: String containing a single nginx "combined" log line
 
         Returns:
-            ToolUsage instance or None if parsing fails
+            Unsaved ToolUsage instance (with an unsaved Lab and Tool) or None
+            if parsing fails
         """
-        from urllib.parse import parse_qs
+        entry = LOG_FORMATS['combined'].parse(log_entry.strip())
+        if not entry:
+            return None
+        return cls.from_log_entry(entry)
 
-        pattern = (
-            r'(?P<ip>[\d.]+) - - '
-            r'\[(?P<datetime>[^\]]+)\] '
-            r'"(?P<method>\w+) (?P<path>[^\s]+) HTTP/[\d.]+" '
-            r'(?P<status>\d+) (?P<size>\d+) '
-            r'"(?P<referer>[^"]*)" '
-            r'"(?P<user_agent>[^"]*)"'
-        )
+    @classmethod
+    def from_log_entry(cls, entry):
+        """
+        Create a ToolUsage instance from a parsed log entry.
 
-        match = re.match(pattern, log_entry.strip())
-        if not match:
-            return None
+        Args:
+            entry: LogEntry parsed by one of ``log_formats.LOG_FORMATS``
 
-        # Extract the referer URL to get the lab name and tool_id
-        referer = match.group('referer')
+        Returns:
+            Unsaved ToolUsage instance (with an unsaved Lab and Tool) or None
+            if the referer has no lab or tool_id
+        """
+        referer = entry.referer
         if not referer or referer == '-':
             return None
 
-        # Parse the URL
+        # Parse the lab name and tool_id from the referer URL
+        # Example: https://genome.usegalaxy.org.au/?tool_id=... -> genome
         parsed_url = urlparse(referer)
-        hostname = parsed_url.hostname
-        if not hostname:
-            return None
-
-        # Extract subdomain (lab name) from hostname
-        # Example: genome.usegalaxy.org.au -> genome
-        parts = hostname.split('.')
-        if len(parts) < 3:
+        lab_name = lab_name_from_hostname(parsed_url.hostname)
+        if not lab_name:
             return None
-        lab_name = parts[0]
-
-        # Extract tool_id from query parameters
-        query_params = parse_qs(parsed_url.query)
-        tool_id_list = query_params.get('tool_id', [])
+        tool_id_list = parse_qs(parsed_url.query).get('tool_id', [])
         if not tool_id_list:
             return None
-        tool_id_raw = tool_id_list[0]
 
         # Strip version from tool_id
-        tool_id = cls.strip_tool_version(tool_id_raw)
+        tool_id, tool_name = Tool.parse_tool_id(tool_id_list[0])
+
+        return cls(
+            lab=Lab(name=lab_name),
+            tool=Tool(tool_id=tool_id, name=tool_name),
+            datetime=entry.datetime,
+        )
+
+
+class UniqueVisitorSketch(models.Model):
+    """HyperLogLog sketch of unique visitors to a lab on one day.
+
+    Visitors are identified by IP address and user agent, which are only
+    ever hashed into the sketch registers - no PII is stored.
+    """
+
+    lab_name = models.CharField(
+        max_length=255,
+        help_text="Name of the lab visited",
+    )
+    date = models.DateField(
+        help_text="Date (UTC) of the visits",
+    )
+    registers = models.BinaryField(
+        help_text="HyperLogLog registers",
+    )
+
+    def __str__(self):
+        """Return a string representation of self."""
+        return f"UniqueVisitorSketch({self.lab_name} on {self.date})"
+
+    class Meta:
+        """Model metadata."""
+        verbose_name = "Unique Visitor Sketch"
+        verbose_name_plural = "Unique Visitor Sketches"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['lab_name', 'date'],
+                name='unique_visitor_sketch_lab_date',
+            ),
+        ]
+
+    @property
+    def sketch(self):
+        """Return the stored registers as a HyperLogLog sketch."""
+        return HyperLogLog(self.registers)
 
-        # Parse the timestamp
-        # Format: 04/Jan/2026:07:05:12 +0000
-        timestamp_str = match.group('datetime')
-        dt = datetime.strptime(timestamp_str, '%d/%b/%Y:%H:%M:%S %z')
+    @classmethod
+    def merge_sketches(cls, sketches):
+        """
+        Merge in-memory sketches into the stored sketches.
+
+        Args:
+            sketches: dict of (lab_name, date) -> HyperLogLog
+        """
+        if not sketches:
+            return
+        labs = {lab_name for lab_name, _ in sketches}
+        dates = {date for _, date in sketches}
+        with transaction.atomic(using=reporting_db()):
+            insert_missing(cls, [
+                cls(
+                    lab_name=lab_name,
+                    date=date,
+                    registers=HyperLogLog().to_bytes(),
+                )
+                for lab_name, date in sketches
+            ])
+            records = [
+                record
+                for record in cls.objects.select_for_update().filter(
+                    lab_name__in=labs,
+                    date__in=dates,
+                )
+                if (record.lab_name, record.date) in sketches
+            ]
+            for record in records:
+                sketch = sketches[(record.lab_name, record.date)]
+                record.registers = sketch.merge(record.sketch).to_bytes()
+            cls.objects.bulk_update(records, ['registers'])
+
+    @classmethod
+    def estimate(cls, start_date, end_date, lab_name=None):
+        """
+        Estimate unique visitors per lab over a date range.
 
-        # Convert to Django timezone-aware datetime
-        dt_aware = timezone.make_aware(
-            dt.replace(tzinfo=None),
-            timezone.get_current_timezone()
+        Returns:
+            tuple of (daily, totals) where daily is a dict of
+            lab_name -> {date: count} and totals is a dict of
+            lab_name -> count for the whole range.
+        """
+        queryset = cls.objects.filter(
+            date__gte=start_date,
+            date__lte=end_date,
         )
+        if lab_name:
+            queryset = queryset.filter(lab_name=lab_name)
+
+        daily = {}
+        merged = {}
+        for record in queryset.iterator():
+            sketch = record.sketch
+            daily.setdefault(record.lab_name, {})[record.date] = (
+                sketch.count())
+            if record.lab_name in merged:
+                merged[record.lab_name].merge(sketch)
+            else:
+                merged[record.lab_name] = sketch
+        totals = {
+            lab: sketch.count()
+            for lab, sketch in merged.items()
+        }
+        return daily, totals
+
+
+class ToolTrend(models.Model):
+    """Precomputed all-time count and trending score of a tool in a lab.
+
+    Updated incrementally on ingest by ``LogWriter``. Rows with an empty
+    lab_name aggregate all labs. See ``trending`` for how the score is
+    stored.
+    """
+
+    ALL_LABS = ALL_LABS
 
-        return cls(
-            lab_name=lab_name,
-            tool_id=tool_id,
-            tool_name=cls.parse_tool_name(tool_id),
-            datetime=dt_aware,
+    lab_name = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Name of the lab, or empty for all labs",
+    )
+    tool_id = models.CharField(
+        max_length=512,
+        help_text="Tool ID without version",
+    )
+    tool_name = models.CharField(
+        max_length=512,
+        default='',
+        blank=True,
+        help_text="Parsed tool name for display",
+    )
+    count = models.BigIntegerField(
+        default=0,
+        help_text="All-time number of uses",
+    )
+    log_score = models.FloatField(
+        help_text="Log of the decayed trending score relative to the epoch",
+    )
+    last_used = models.DateTimeField(
+        help_text="Timestamp of the latest use",
+    )
+
+    def __str__(self):
+        """Return a string representation of self."""
+        return f"ToolTrend({self.tool_id} in {self.lab_name or 'all labs'})"
+
+    class Meta:
+        """Model metadata."""
+        verbose_name = "Tool Trend"
+        verbose_name_plural = "Tool Trends"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['lab_name', 'tool_id'],
+                name='unique_tool_trend_lab_tool',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['lab_name', '-log_score'],
+                name='tool_trend_lab_score',
+            ),
+            models.Index(
+                fields=['lab_name', '-count'],
+                name='tool_trend_lab_count',
+            ),
+        ]
+
+    def score(self, now):
+        """Return the trending score at datetime ``now``."""
+        return decayed_score(
+            self.log_score,
+            now,
+            settings.REPORTING_TRENDING_HALF_LIFE_DAYS,
+        )
+
+    @classmethod
+    def merge_counts(cls, counts):
+        """
+        Add counts from a ``trending.TrendCounter`` to the stored trends.
+
+        Args:
+            counts: TrendCounter of tool uses to add
+        """
+        if not counts:
+            return
+        entries = dict(counts.items())
+        labs = {lab_name for lab_name, _ in entries}
+        tool_ids = {tool_id for _, tool_id in entries}
+        with transaction.atomic(using=reporting_db()):
+            # Empty rows have a count of 0, and their log_score is unused
+            insert_missing(cls, [
+                cls(
+                    lab_name=lab_name,
+                    tool_id=tool_id,
+                    tool_name=tool_name,
+                    count=0,
+                    log_score=0,
+                    last_used=last_used,
+                )
+                for (lab_name, tool_id), (tool_name, _, _, last_used) in (
+                    entries.items()
+                )
+            ])
+            records = [
+                record
+                for record in cls.objects.select_for_update().filter(
+                    lab_name__in=labs,
+                    tool_id__in=tool_ids,
+                )
+                if (record.lab_name, record.tool_id) in entries
+            ]
+            for record in records:
+                tool_name, count, log_score, last_used = entries[
+                    (record.lab_name, record.tool_id)]
+                record.tool_name = tool_name
+                record.log_score = (
+                    logaddexp(record.log_score, log_score)
+                    if record.count else log_score)
+                record.count += count
+                record.last_used = max(record.last_used, last_used)
+            cls.objects.bulk_update(
+                records,
+                ['tool_name', 'count', 'log_score', 'last_used'],
+                batch_size=1000,
+            )
+
+    @classmethod
+    def top(cls, lab_name=None, limit=None, trending=False):
+        """
+        Return the top tools in a lab, or in all labs.
+
+        Args:
+            lab_name: name of the lab, or None for all labs
+            limit: maximum number of tools to return
+            trending: rank by trending score instead of all-time count
+
+        Returns:
+            QuerySet of ToolTrend
+        """
+        queryset = cls.objects.filter(lab_name=lab_name or cls.ALL_LABS)
+        if trending:
+            queryset = queryset.order_by('-log_score')
+        else:
+            queryset = queryset.order_by('-count', 'tool_id')
+        return queryset[:limit]
+
+
+class HourlyCount(models.Model):
+    """Rollup of the number of lab visits or tool uses in an hour.
+
+    Updated incrementally on ingest by ``LogWriter`` and used for hour of
+    day by weekday heatmaps. Rows with an empty lab_name aggregate all labs,
+    and rows with an empty tool_id aggregate all tools (see ``heatmap``).
+    """
+
+    VISITS = 'visits'
+    TOOLS = 'tools'
+    METRIC_CHOICES = (
+        (VISITS, 'Lab visits'),
+        (TOOLS, 'Tool uses'),
+    )
+    ALL_LABS = ALL_LABS
+    ALL_TOOLS = ALL_TOOLS
+
+    metric = models.CharField(
+        max_length=16,
+        choices=METRIC_CHOICES,
+    )
+    lab_name = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Name of the lab, or empty for all labs",
+    )
+    tool_id = models.CharField(
+        max_length=512,
+        blank=True,
+        help_text="Tool ID without version, or empty for all tools",
+    )
+    hour = models.DateTimeField(
+        help_text="Start of the hour",
+    )
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        """Return a string representation of self."""
+        return (
+            f"HourlyCount({self.metric} in {self.lab_name or 'all labs'}"
+            f" at {self.hour})")
+
+    class Meta:
+        """Model metadata."""
+        verbose_name = "Hourly Count"
+        verbose_name_plural = "Hourly Counts"
+        constraints = [
+            # Also the index for heatmap range queries
+            models.UniqueConstraint(
+                fields=['metric', 'lab_name', 'tool_id', 'hour'],
+                name='unique_hourly_count',
+            ),
+        ]
+
+    @classmethod
+    def merge_counts(cls, metric, counts):
+        """
+        Add counts from a ``heatmap.HourlyCounter`` to the stored counts.
+
+        Args:
+            metric: HourlyCount.VISITS or HourlyCount.TOOLS
+            counts: HourlyCounter of events to add
+        """
+        if not counts:
+            return
+        entries = dict(counts.items())
+        hours = [hour for _, _, hour in entries]
+        with transaction.atomic(using=reporting_db()):
+            insert_missing(cls, [
+                cls(
+                    metric=metric,
+                    lab_name=lab_name,
+                    tool_id=tool_id,
+                    hour=hour,
+                    count=0,
+                )
+                for lab_name, tool_id, hour in entries
+            ])
+            records = [
+                record
+                for record in cls.objects.select_for_update().filter(
+                    metric=metric,
+                    lab_name__in={lab_name for lab_name, _, _ in entries},
+                    tool_id__in={tool_id for _, tool_id, _ in entries},
+                    hour__gte=min(hours),
+                    hour__lte=max(hours),
+                )
+                if (record.lab_name, record.tool_id, record.hour) in entries
+            ]
+            for record in records:
+                record.count += entries[
+                    (record.lab_name, record.tool_id, record.hour)]
+            cls.objects.bulk_update(records, ['count'], batch_size=1000)
+
+    @classmethod
+    def heatmap(cls, metric, lab_name=None, tool_id=None, start=None,
+                end=None, tz=None):
+        """
+        Return a weekday by hour of day matrix of event counts.
+
+        Args:
+            metric: HourlyCount.VISITS or HourlyCount.TOOLS
+            lab_name: name of the lab, or None for all labs
+            tool_id: tool ID, or None for all tools
+            start: optional datetime lower bound (inclusive)
+            end: optional datetime upper bound (inclusive)
+            tz: tzinfo of the weekdays and hours (default: UTC)
+
+        Returns:
+            list of 7 rows (Monday first) of 24 counts (midnight first)
+        """
+        queryset = cls.objects.filter(
+            metric=metric,
+            lab_name=lab_name or cls.ALL_LABS,
+            tool_id=tool_id or cls.ALL_TOOLS,
         )
+        if start:
+            queryset = queryset.filter(hour__gte=truncate_hour(start))
+        if end:
+            queryset = queryset.filter(hour__lte=end)
+        return build_heatmap(
+            queryset.values_list('hour', 'count').iterator(), tz)
+
+
+class LabFunnel(models.Model):
+    """Daily rollup of lab visits which led to tool launches.
+
+    Updated by the ``tail_logs`` command, which feeds welcome and tool
+    records to a ``funnel.FunnelTracker`` in a single pass. Visits and
+    attributed launches are counted on the date of the visit.
+    """
+
+    lab_name = models.CharField(max_length=255)
+    date = models.DateField()
+    visits = models.BigIntegerField(
+        default=0,
+        help_text="Number of welcome page visits",
+    )
+    converted_visits = models.BigIntegerField(
+        default=0,
+        help_text="Visits followed by a tool launch by the same client",
+    )
+    tool_launches = models.BigIntegerField(
+        default=0,
+        help_text="Number of tool launches",
+    )
+    attributed_launches = models.BigIntegerField(
+        default=0,
+        help_text="Tool launches which followed a visit by the same client",
+    )
+
+    def __str__(self):
+        """Return a string representation of self."""
+        return f"LabFunnel({self.lab_name} on {self.date})"
+
+    class Meta:
+        """Model metadata."""
+        verbose_name = "Lab Funnel"
+        verbose_name_plural = "Lab Funnels"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['lab_name', 'date'],
+                name='unique_lab_funnel_lab_date',
+            ),
+        ]
+
+    @classmethod
+    def merge_counts(cls, counts):
+        """
+        Add counts from ``funnel.FunnelTracker.pop_counts()``.
+
+        Args:
+            counts: dict of count fields keyed by (lab_name, date)
+        """
+        if not counts:
+            return
+        with transaction.atomic(using=reporting_db()):
+            insert_missing(cls, [
+                cls(lab_name=lab_name, date=date) for lab_name, date in counts
+            ])
+            records = [
+                record
+                for record in cls.objects.select_for_update().filter(
+                    lab_name__in={lab_name for lab_name, _ in counts},
+                    date__in={date for _, date in counts},
+                )
+                if (record.lab_name, record.date) in counts
+            ]
+            for record in records:
+                fields = counts[(record.lab_name, record.date)]
+                for field, count in fields.items():
+                    setattr(record, field, getattr(record, field) + count)
+            cls.objects.bulk_update(records, FUNNEL_COUNT_FIELDS)
+
+
+class LogCheckpoint(models.Model):
+    """Position reached by the ``tail_logs`` command in a live log file.
+
+    Saved in the same transaction as the records parsed up to that
+    position, so that restarting the tailer never loses or double-counts
+    log lines.
+    """
+
+    path = models.CharField(
+        max_length=512,
+        unique=True,
+        help_text="Path of the log file being tailed",
+    )
+    inode = models.BigIntegerField(
+        help_text="Inode of the file when the offset was recorded",
+    )
+    offset = models.BigIntegerField(
+        default=0,
+        help_text="Byte offset of the next unread line",
+    )
+    modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """Return a string representation of self."""
+        return f"LogCheckpoint({self.path} at {self.offset})"
+
+    class Meta:
+        """Model metadata."""
+        verbose_name = "Log Checkpoint"
+        verbose_name_plural = "Log Checkpoints"
@@ -1,12 +1,62 @@
-"""Process Nginx log files."""
-
-from .models import LabVisit, ToolUsage
+"""Process Nginx log files.
+
+Parsing and writing are separate so that log lines can be parsed anywhere
+(e.g. in worker processes) while a single ``LogWriter`` inserts records into
+the database in large batches:
+
+    parser = LogParser(LOG_TYPE.WELCOME)
+    writer = LogWriter(LOG_TYPE.WELCOME)
+    for record in parser.parse(log_file):
+        writer.write(record)
+    writer.close()
+"""
+
+import gzip
+import heapq
+import io
+from collections import namedtuple
+from itertools import chain
+from operator import attrgetter
+from pathlib import Path
+
+import zstandard
+from django.conf import settings
+from django.db import transaction
+
+from .bots import is_bot
+from .cache import bump_data_version
+from .db import copy_rows, is_postgresql, reporting_db
+from .heatmap import ALL_TOOLS, HourlyCounter
+from .hll import HyperLogLog
+from .log_formats import DETECT_SAMPLE_LINES, detect_format, get_format
+from .models import (
+    HourlyCount,
+    Lab,
+    LabVisit,
+    Tool,
+    ToolTrend,
+    ToolUsage,
+    UniqueVisitorSketch,
+)
+from .trending import TrendCounter
 
 WELCOME_LOG_STRING = '/static/welcome'
 IGNORE_LOG_LINES = (
     'www.usegalaxy',
     'galaxy.usegalaxy',
-    'AhrefsBot',
+)
+MAX_REPORTED_ERRORS = 10
+AUTO_DETECT = 'auto'
+
+# Parsed log lines. ``client`` identifies the client (IP address and user
+# agent) for unique visitor estimation and is never stored.
+VisitRecord = namedtuple(
+    'VisitRecord',
+    ['lab_name', 'datetime', 'client'],
+)
+ToolRecord = namedtuple(
+    'ToolRecord',
+    ['lab_name', 'tool_id', 'tool_name', 'datetime', 'client'],
 )
 
 
@@ -33,129 +83,336 @@ class LOG_TYPE:
         return None
 
 
-def import_nginx_log(log_file, log_type):
-    if log_type == LOG_TYPE.WELCOME:
-        return parse_welcome_log(log_file)
-    elif log_type == LOG_TYPE.TOOL:
-        return parse_tool_log(log_file)
+class LogParser:
+    """Parse Nginx log lines into records without touching the database.
 
+    The log format is detected from the first lines of each file unless one
+    is given by name (see ``log_formats.LOG_FORMATS``). Relevant lines which
+    don't match the format are counted as unmatched rather than silently
+    dropped, so that a misconfigured ``log_format`` is obvious in the import
+    results.
+    """
 
-def parse_welcome_log(log_file, batch_size=1000):
+    def __init__(self, log_type, log_format=None):
+        """Initialize parser and counters for the given log type."""
+        self.log_type = log_type
+        self.log_format = (
+            get_format(log_format)
+            if log_format and log_format != AUTO_DETECT
+            else None
+        )
+        self.lines_processed = 0
+        self.lines_matched = 0
+        self.lines_unmatched = 0
+        self.records_parsed = 0
+        self.bots_skipped = 0
+        self.errors = []
+        self.total_errors = 0
+
+    def parse(self, log_file):
+        """Yield a record for each relevant line in the log file."""
+        if self.log_type == LOG_TYPE.WELCOME:
+            is_relevant = _is_welcome_line
+            make_record = _welcome_record
+        else:
+            is_relevant = _is_tool_line
+            make_record = _tool_record
+
+        lines = (
+            line.decode('utf-8') if isinstance(line, bytes) else line
+            for line in log_file
+        )
+        if self.log_format is None:
+            sample = []
+            content_lines = 0
+            for line in lines:
+                sample.append(line)
+                if line.strip():
+                    content_lines += 1
+                    if content_lines == DETECT_SAMPLE_LINES:
+                        break
+            if not content_lines:
+                # Nothing to detect the format from yet e.g. an idle poll
+                # when tailing, so detect it from the next lines instead
+                self.lines_processed += len(sample)
+                return
+            self.log_format = detect_format(sample)
+            lines = chain(sample, lines)
+        parse_entry = self.log_format.parse
+
+        for line in lines:
+            self.lines_processed += 1
+            if not is_relevant(line):
+                continue
+
+            try:
+                entry = parse_entry(line)
+                if entry is None:
+                    self.lines_unmatched += 1
+                    continue
+                self.lines_matched += 1
+                if is_bot(entry.user_agent):
+                    self.bots_skipped += 1
+                    continue
+                record = make_record(entry)
+            except Exception as e:
+                self.total_errors += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append({
+                        'line': self.lines_processed,
+                        'error': str(e),
+                    })
+                continue
+
+            if record:
+                self.records_parsed += 1
+                yield record
+
+    def stats(self):
+        """Return parsing statistics as a dict."""
+        return {
+            'log_format': self.log_format.name if self.log_format else None,
+            'lines_processed': self.lines_processed,
+            'lines_matched': self.lines_matched,
+            'lines_unmatched': self.lines_unmatched,
+            'records_parsed': self.records_parsed,
+            'bots_skipped': self.bots_skipped,
+            'errors': self.errors,
+            'total_errors': self.total_errors,
+        }
+
+
+class LogWriter:
+    """Write parsed log records to the database in batches.
+
+    Each batch is inserted in its own transaction, together with its
+    contribution to the rollups, so that a failure never leaves events
+    without rollups or the reverse. Call ``close()`` once all records have
+    been written to flush the final batch.
+    """
+
+    def __init__(self, log_type, batch_size=1000):
+        """Initialize an empty writer for the given log type."""
+        self.log_type = log_type
+        self.batch_size = batch_size
+        self.records_created = 0
+        self._batch = []
+        # Primary keys of Lab and Tool rows by name, so that each is only
+        # looked up once per writer
+        self._lab_ids = {}
+        self._tool_ids = {}
+        self._reset_rollups()
+
+    def write(self, record):
+        """Queue a record for insertion."""
+        self._batch.append(record)
+        if self.log_type == LOG_TYPE.WELCOME:
+            key = (record.lab_name, record.datetime.date())
+            if key not in self._sketches:
+                self._sketches[key] = HyperLogLog()
+            self._sketches[key].add(record.client)
+            self._hours.add(record.lab_name, ALL_TOOLS, record.datetime)
+        else:
+            self._trends.add(
+                record.lab_name,
+                record.tool_id,
+                record.tool_name,
+                record.datetime,
+            )
+            self._hours.add(record.lab_name, record.tool_id, record.datetime)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, records):
+        """Queue many records for insertion."""
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        """Insert queued records and merge their rollups in a transaction.
+
+        Records are loaded with COPY when the reporting database is
+        PostgreSQL.
+        """
+        if not self._batch:
+            return
+        with transaction.atomic(using=reporting_db()):
+            lab_ids = Lab.intern(
+                {record.lab_name for record in self._batch},
+                self._lab_ids,
+            )
+            if self.log_type == LOG_TYPE.WELCOME:
+                model = LabVisit
+                fields = ('lab', 'datetime')
+                rows = [
+                    (lab_ids[record.lab_name], record.datetime)
+                    for record in self._batch
+                ]
+            else:
+                tool_ids = Tool.intern(
+                    {
+                        record.tool_id: record.tool_name
+                        for record in self._batch
+                    },
+                    self._tool_ids,
+                )
+                model = ToolUsage
+                fields = ('lab', 'tool', 'datetime')
+                rows = [
+                    (
+                        lab_ids[record.lab_name],
+                        tool_ids[record.tool_id],
+                        record.datetime,
+                    )
+                    for record in self._batch
+                ]
+            if is_postgresql():
+                copy_rows(model, fields, rows)
+            else:
+                model.objects.bulk_create([
+                    model(**{
+                        model._meta.get_field(name).attname: value
+                        for name, value in zip(fields, row)
+                    })
+                    for row in rows
+                ])
+            UniqueVisitorSketch.merge_sketches(self._sketches)
+            ToolTrend.merge_counts(self._trends)
+            HourlyCount.merge_counts(
+                HourlyCount.VISITS
+                if self.log_type == LOG_TYPE.WELCOME
+                else HourlyCount.TOOLS,
+                self._hours,
+            )
+            bump_data_version()
+        self.records_created += len(self._batch)
+        self._batch = []
+        self._reset_rollups()
+
+    def close(self):
+        """Flush remaining records."""
+        self.flush()
+
+    def _reset_rollups(self):
+        """Start counting the rollups of the next batch."""
+        # Unique visitor sketches for each (lab_name, date)
+        self._sketches = {}
+        self._trends = TrendCounter(
+            settings.REPORTING_TRENDING_HALF_LIFE_DAYS)
+        self._hours = HourlyCounter()
+
+
+def track_funnel(funnel, *records):
+    """Feed welcome and tool records to a ``funnel.FunnelTracker``.
+
+    Args:
+        funnel: FunnelTracker to update
+        records: iterables of VisitRecord or ToolRecord, each in time order
+    """
+    for record in heapq.merge(*records, key=attrgetter('datetime')):
+        if isinstance(record, ToolRecord):
+            funnel.launch(record.lab_name, record.client, record.datetime)
+        else:
+            funnel.visit(record.lab_name, record.client, record.datetime)
+
+
+def import_nginx_log(log_file, log_type, batch_size=1000, log_format=None):
     """
     Import and process an Nginx log file.
 
     Args:
-        log_file: Django UploadedFile instance containing the log data
+        log_file: iterable of log lines e.g. a Django UploadedFile instance
+        log_type: LOG_TYPE constant
         batch_size: Number of records to create in each bulk insert
+        log_format: Name of the log format, or None to detect it
 
     Returns:
         dict: Processing results containing statistics and status
     """
-    lines_processed = 0
-    visits_created = 0
-    errors = []
-    visits_batch = []
-
-    for line in log_file:
-        if isinstance(line, bytes):
-            line = line.decode('utf-8')
+    parser = LogParser(log_type, log_format)
+    writer = LogWriter(log_type, batch_size=batch_size)
+    for record in parser.parse(log_file):
+        writer.write(record)
+    writer.close()
+    return build_result(log_type, parser.stats(), writer.records_created)
 
-        lines_processed += 1
 
-        if WELCOME_LOG_STRING not in line or _ignore_line(line):
-            continue
-
-        try:
-            visit = LabVisit.from_nginx_log(line)
-
-            if visit:
-                visits_batch.append(visit)
+def parse_welcome_log(log_file, batch_size=1000):
+    """Import and process an Nginx welcome page log file."""
+    return import_nginx_log(log_file, LOG_TYPE.WELCOME, batch_size)
 
-                if len(visits_batch) >= batch_size:
-                    LabVisit.objects.bulk_create(visits_batch)
-                    visits_created += len(visits_batch)
-                    visits_batch = []
 
-        except Exception as e:
-            errors.append({
-                'line': lines_processed,
-                'error': str(e),
-            })
+def parse_tool_log(log_file, batch_size=1000):
+    """Import and process an Nginx tool usage log file."""
+    return import_nginx_log(log_file, LOG_TYPE.TOOL, batch_size)
 
-    if visits_batch:
-        LabVisit.objects.bulk_create(visits_batch)
-        visits_created += len(visits_batch)
 
+def build_result(log_type, stats, records_created):
+    """Build the import result returned to API and command line users."""
+    lines_processed = stats['lines_processed']
+    if log_type == LOG_TYPE.WELCOME:
+        created_key = 'visits_created'
+        created_label = 'visit'
+    else:
+        created_key = 'tool_usages_created'
+        created_label = 'tool usage'
     return {
-        'status': 'success' if not errors else 'partial',
+        'status': (
+            'success'
+            if not (stats['total_errors'] or stats['lines_unmatched'])
+            else 'partial'
+        ),
+        'log_format': stats['log_format'],
         'lines_processed': lines_processed,
-        'visits_created': visits_created,
-        'errors': errors[:10],  # Limit to first 10 errors
-        'total_errors': len(errors),
+        'lines_matched': stats['lines_matched'],
+        'lines_unmatched': stats['lines_unmatched'],
+        'match_rate': round(match_rate(stats), 4),
+        created_key: records_created,
+        'bots_skipped': stats['bots_skipped'],
+        'errors': stats['errors'],
+        'total_errors': stats['total_errors'],
         'message': (
             f'Successfully processed {lines_processed} log lines, '
-            f'created {visits_created} visit records'
+            f'created {records_created} {created_label} records'
         ),
     }
 
 
-def parse_tool_log(log_file, batch_size=1000):
-    """
-    Import and process an Nginx tool usage log file.
+def parse_log_file(path, log_type, log_format=None):
+    """Parse a log file from disk without touching the database.
 
-    Args:
-        log_file: Django UploadedFile instance containing the log data
-        batch_size: Number of records to create in each bulk insert
+    This is safe to run in a worker process.
 
     Returns:
-        dict: Processing results containing statistics and status
+        tuple of (records, stats)
     """
-    lines_processed = 0
-    tool_usages_created = 0
-    errors = []
-    tool_usages_batch = []
-
-    for line in log_file:
-        if isinstance(line, bytes):
-            line = line.decode('utf-8')
-
-        lines_processed += 1
-
-        if _ignore_line(line) or 'tool_id=' not in line:
-            continue
+    parser = LogParser(log_type, log_format)
+    with open_log(path) as log_file:
+        records = list(parser.parse(log_file))
+    return records, parser.stats()
 
-        try:
-            tool_usage = ToolUsage.from_nginx_log(line)
 
-            if tool_usage:
-                tool_usages_batch.append(tool_usage)
+def open_log(path):
+    """Open a log file for reading text lines.
 
-                if len(tool_usages_batch) >= batch_size:
-                    ToolUsage.objects.bulk_create(tool_usages_batch)
-                    tool_usages_created += len(tool_usages_batch)
-                    tool_usages_batch = []
-
-        except Exception as e:
-            errors.append({
-                'line': lines_processed,
-                'error': str(e),
-            })
+    Files ending with .gz or .zst are decompressed transparently.
+    """
+    path = Path(path)
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    if path.suffix == '.zst':
+        return io.TextIOWrapper(
+            zstandard.ZstdDecompressor().stream_reader(path.open('rb')),
+            encoding='utf-8',
+            errors='replace',
+        )
+    return path.open('r', encoding='utf-8', errors='replace')
 
-    if tool_usages_batch:
-        ToolUsage.objects.bulk_create(tool_usages_batch)
-        tool_usages_created += len(tool_usages_batch)
 
-    return {
-        'status': 'success' if not errors else 'partial',
-        'lines_processed': lines_processed,
-        'tool_usages_created': tool_usages_created,
-        'errors': errors[:10],  # Limit to first 10 errors
-        'total_errors': len(errors),
-        'message': (
-            f'Successfully processed {lines_processed} log lines, '
-            f'created {tool_usages_created} tool usage records'
-        ),
-    }
+def match_rate(stats):
+    """Return the fraction of relevant lines that matched the log format."""
+    relevant = stats['lines_matched'] + stats['lines_unmatched']
+    return stats['lines_matched'] / relevant if relevant else 1.0
 
 
 def _ignore_line(line):
@@ -166,3 +423,43 @@ def _ignore_line(line):
         if ignore_str in line:
             return True
     return False
+
+
+def _is_welcome_line(line):
+    """Cheap substring check for welcome page requests before parsing."""
+    return WELCOME_LOG_STRING in line and not _ignore_line(line)
+
+
+def _is_tool_line(line):
+    """Cheap substring check for tool requests before parsing."""
+    return 'tool_id=' in line and not _ignore_line(line)
+
+
+def _welcome_record(entry):
+    visit = LabVisit.from_log_entry(entry)
+    if visit:
+        return VisitRecord(
+            visit.lab.name,
+            visit.datetime,
+            _client_key(entry),
+        )
+
+
+def _tool_record(entry):
+    tool_usage = ToolUsage.from_log_entry(entry)
+    if tool_usage:
+        return ToolRecord(
+            tool_usage.lab.name,
+            tool_usage.tool.tool_id,
+            tool_usage.tool.name,
+            tool_usage.datetime,
+            _client_key(entry),
+        )
+
+
+def _client_key(entry):
+    """Identify the client of a log entry by IP address and user agent.
+
+    This is only used as input to a HyperLogLog sketch and is never stored.
+    """
+    return f'{entry.ip} {entry.user_agent}'
@@ -138,7 +138,10 @@ function createChartTitle(text) {
   return titleDiv;
 }
 
-function renderVisitsChart(data) {
+const VISITS_HEADING = 'A visit is counted each time a user accesses the Galaxy homepage (A.K.A "Welcome page") through a Galaxy Lab subdomain.';
+const VISITORS_HEADING = "Unique visitors are estimated per day from anonymised client fingerprints (IP address and browser). Totals for the selected date range are shown next to each Lab name.";
+
+function renderVisitsChart(data, heading = VISITS_HEADING) {
   const chartEl = elements.chart();
 
   if (data.traces.length === 0) {
@@ -152,9 +155,12 @@ function renderVisitsChart(data) {
   data.traces.forEach((trace, index) => {
     const chartId = `lab-chart-${index}`;
     const chartDiv = createChartElement(chartId);
-    const titleText = trace.name.charAt(0).toUpperCase() + trace.name.substring(1);
+    let titleText = trace.name.charAt(0).toUpperCase() + trace.name.substring(1);
+    if (data.totals && trace.name in data.totals) {
+      titleText += ` (~${data.totals[trace.name]} unique visitors)`;
+    }
     const titleDiv = createChartTitle(titleText);
-    setChartHeading('A visit is counted each time a user accesses the Galaxy homepage (A.K.A "Welcome page") through a Galaxy Lab subdomain.');
+    setChartHeading(heading);
 
     chartEl.appendChild(titleDiv);
     chartEl.appendChild(chartDiv);
@@ -248,6 +254,8 @@ function renderChart(data) {
     renderVisitsChart(data);
   } else if (state.currentMetric === "tools") {
     renderToolsChart(data);
+  } else if (state.currentMetric === "visitors") {
+    renderVisitsChart(data, VISITORS_HEADING);
   }
   // Add more metric types here as needed
 }
@@ -0,0 +1,143 @@
+"""Generate synthetic nginx logs for benchmarking log ingestion and reports.
+
+Lines are written in the nginx "combined" format in time order, like a real
+access log. Lab, tool and client popularity follow a Zipf-like distribution
+so that a few labs and tools account for most requests, and a fraction of
+requests come from bots, which ingestion should skip.
+"""
+
+import gzip
+import random
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from pathlib import Path
+
+BROWSER_USER_AGENTS = (
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36'
+    ' (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:121.0)'
+    ' Gecko/20100101 Firefox/121.0',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    ' (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15'
+    ' (KHTML, like Gecko) Version/17.2 Safari/605.1.15',
+)
+BOT_USER_AGENTS = (
+    'Mozilla/5.0 (compatible; AhrefsBot/7.0; +http://ahrefs.com/robot/)',
+    'Mozilla/5.0 (compatible; Googlebot/2.1;'
+    ' +http://www.google.com/bot.html)',
+    'python-requests/2.31.0',
+    'curl/8.4.0',
+)
+DOMAIN = 'usegalaxy.org.au'
+TOOL_VERSIONS = ('1.0.0', '1.1.0', '2.0.0+galaxy1')
+
+
+def _zipf_weights(n):
+    """Return cumulative weights for n items ranked by popularity."""
+    return list(accumulate(1 / rank for rank in range(1, n + 1)))
+
+
+class LogGenerator:
+    """Generate synthetic welcome page and tool request log lines."""
+
+    def __init__(
+        self,
+        labs=20,
+        tools=500,
+        clients=5000,
+        bot_ratio=0.1,
+        days=90,
+        end=None,
+        seed=None,
+    ):
+        """Create a generator.
+
+        Args:
+            labs: number of distinct labs
+            tools: number of distinct tools
+            clients: number of distinct (IP address, user agent) clients
+            bot_ratio: fraction of requests made by bots
+            days: number of days spanned by the generated lines
+            end: datetime of the last line (default: now)
+            seed: random seed, for repeatable output
+        """
+        self.labs = [f'lab{i}' for i in range(1, labs + 1)]
+        self.tools = [
+            f'toolshed.g2.bx.psu.edu/repos/owner{i % 50}/tool{i}/tool{i}'
+            for i in range(1, tools + 1)
+        ]
+        self.clients = [
+            (
+                f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}',
+                BROWSER_USER_AGENTS[i % len(BROWSER_USER_AGENTS)],
+            )
+            for i in range(clients)
+        ]
+        self.bot_ratio = bot_ratio
+        self.end = end or datetime.now(timezone.utc)
+        self.start = self.end - timedelta(days=days)
+        self._random = random.Random(seed)
+        self._lab_weights = _zipf_weights(len(self.labs))
+        self._tool_weights = _zipf_weights(len(self.tools))
+        self._client_weights = _zipf_weights(len(self.clients))
+
+    def welcome_lines(self, n):
+        """Yield n welcome page request lines in time order."""
+        for dt in self._timestamps(n):
+            lab = self._choose(self.labs, self._lab_weights)
+            yield self._line(
+                dt,
+                'GET /static/welcome.html HTTP/1.1',
+                f'https://{lab}.{DOMAIN}/',
+            )
+
+    def tool_lines(self, n):
+        """Yield n tool request lines in time order."""
+        for dt in self._timestamps(n):
+            lab = self._choose(self.labs, self._lab_weights)
+            tool = self._choose(self.tools, self._tool_weights)
+            version = self._random.choice(TOOL_VERSIONS)
+            yield self._line(
+                dt,
+                'POST /api/tools HTTP/1.1',
+                f'https://{lab}.{DOMAIN}/?tool_id={tool}/{version}',
+            )
+
+    def _timestamps(self, n):
+        """Yield n evenly spread, jittered datetimes from start to end."""
+        step = (self.end - self.start) / max(n, 1)
+        for i in range(n):
+            yield self.start + step * (i + self._random.random())
+
+    def _choose(self, items, cum_weights):
+        return self._random.choices(items, cum_weights=cum_weights)[0]
+
+    def _line(self, dt, request, referer):
+        """Format a log line in the nginx "combined" format."""
+        if self._random.random() < self.bot_ratio:
+            ip = f'192.0.2.{self._random.randrange(1, 255)}'
+            user_agent = self._random.choice(BOT_USER_AGENTS)
+        else:
+            ip, user_agent = self._choose(self.clients, self._client_weights)
+        return (
+            f'{ip} - - [{dt:%d/%b/%Y:%H:%M:%S +0000}] "{request}" 200'
+            f' {self._random.randrange(200, 5000)} "{referer}"'
+            f' "{user_agent}"\n'
+        )
+
+
+def write_log(path, lines):
+    """Write lines to a log file, gzipped if the path ends with .gz.
+
+    Returns:
+        Number of lines written
+    """
+    path = Path(path)
+    opener = gzip.open if path.suffix == '.gz' else open
+    count = 0
+    with opener(path, 'wt', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line)
+            count += 1
+    return count
@@ -0,0 +1,161 @@
+"""Follow growing log files across logrotate.
+
+A ``LogTailer`` returns the complete lines appended to a file since its last
+position, which is identified by the file's inode and byte offset so that it
+can be checkpointed and resumed:
+
+- When the file is rotated (renamed and replaced) the rest of the old file is
+  read before following the new one. If the tailer was stopped when the file
+  was rotated, the old file is found by inode among the rotated siblings
+  e.g. ``access.log.1``.
+- When the file is truncated in place (``copytruncate``) it is read from the
+  start.
+"""
+
+import glob
+import logging
+import os
+
+MAX_READ_BYTES = 8 * 1024 * 1024
+
+logger = logging.getLogger('django')
+
+
+class LogTailer:
+    """Read lines appended to a log file, following rotation."""
+
+    def __init__(self, path, inode=None, offset=0, start_at_end=False):
+        """Create a tailer for the given path.
+
+        Args:
+            path: path of the live log file
+            inode: inode of the file at a checkpoint, if any
+            offset: byte offset of the next unread line at the checkpoint
+            start_at_end: with no checkpoint, skip lines already in the file
+        """
+        self.path = str(path)
+        self.inode = inode
+        self.offset = offset
+        self.start_at_end = start_at_end
+        self._file = None
+        self._draining = False
+
+    @property
+    def position(self):
+        """Return (inode, offset) of the next unread line."""
+        return self.inode, self.offset
+
+    def read_lines(self, max_bytes=MAX_READ_BYTES):
+        """Return complete lines appended since the last read.
+
+        A trailing partial line is left to be read once it is complete.
+        """
+        if self._file is None and not self._open():
+            return []
+
+        lines = self._read(max_bytes)
+        if lines and self.offset < self._size():
+            # More to read - don't check for rotation until caught up
+            return lines
+
+        if self._draining or self._is_rotated():
+            rest = self._read(max_bytes)
+            lines += rest
+            if rest and self.offset < self._size():
+                self._draining = True
+                return lines
+            # Any remaining bytes are an incomplete final line
+            logger.info(f'Log file rotated: {self.path}')
+            self.close()
+            self.inode = None
+            self.offset = 0
+            self.start_at_end = False
+            self._draining = False
+            if self._open():
+                lines += self._read(max_bytes)
+        elif self._size() < self.offset:
+            logger.info(f'Log file truncated: {self.path}')
+            self.offset = 0
+            lines += self._read(max_bytes)
+        return lines
+
+    def close(self):
+        """Close the open file, if any."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        """Open the file at the current position.
+
+        Returns:
+            True if a file was opened
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+
+        if self.inode is None:
+            self.inode = stat.st_ino
+            self.offset = stat.st_size if self.start_at_end else 0
+            self._file = open(self.path, 'rb')
+            return True
+
+        if stat.st_ino == self.inode:
+            self._file = open(self.path, 'rb')
+            return True
+
+        # Rotated since the checkpoint - resume the old file if we can find it
+        rotated = self._find_rotated()
+        if rotated:
+            logger.info(f'Resuming rotated log file: {rotated}')
+            self._file = open(rotated, 'rb')
+            self._draining = True
+            return True
+
+        logger.warning(
+            f'Rotated log file for {self.path} not found - lines written'
+            ' after the checkpoint and before rotation were not imported')
+        self.inode = stat.st_ino
+        self.offset = 0
+        self._file = open(self.path, 'rb')
+        return True
+
+    def _find_rotated(self):
+        """Find a rotated sibling of the file with the checkpoint inode."""
+        for path in sorted(glob.glob(glob.escape(self.path) + '?*')):
+            try:
+                if os.stat(path).st_ino == self.inode:
+                    return path
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _read(self, max_bytes):
+        """Read complete lines from the current offset."""
+        self._file.seek(self.offset)
+        data = self._file.read(max_bytes)
+        end = data.rfind(b'\n') + 1
+        if not end:
+            if len(data) < max_bytes:
+                return []
+            # A single line longer than max_bytes
+            end = len(data)
+        self.offset += end
+        lines = data[:end].decode('utf-8', errors='replace').split('\n')
+        if not lines[-1]:
+            lines.pop()
+        return lines
+
+    def _size(self):
+        """Return the size of the open file."""
+        return os.fstat(self._file.fileno()).st_size
+
+    def _is_rotated(self):
+        """Return True if the path now refers to a different file."""
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except FileNotFoundError:
+            # Renamed but not yet replaced
+            return False
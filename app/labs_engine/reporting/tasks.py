@@ -0,0 +1,51 @@
+"""RQ background tasks for log ingestion."""
+
+import logging
+from pathlib import Path
+
+from rq import get_current_job
+
+from .nginx_logs import LogParser, LogWriter, build_result, open_log
+
+logger = logging.getLogger('django')
+
+PROGRESS_EVERY_LINES = 10000
+
+
+def run_import_logs(path: str, log_type: str, log_format=None) -> dict:
+    """Import a spooled log upload in a background worker.
+
+    Progress (the parser statistics so far) is published to the job's meta
+    as ``progress`` every ``PROGRESS_EVERY_LINES`` lines. The spooled file is
+    deleted when the import finishes or fails.
+
+    Returns the same result dict as ``nginx_logs.import_nginx_log``.
+    """
+    job = get_current_job()
+    parser = LogParser(log_type, log_format)
+    writer = LogWriter(log_type)
+
+    def publish_progress():
+        if job:
+            job.meta['progress'] = parser.stats()
+            job.save_meta()
+
+    def lines(log_file):
+        for i, line in enumerate(log_file, 1):
+            if i % PROGRESS_EVERY_LINES == 0:
+                publish_progress()
+            yield line
+
+    logger.info("RQ worker: importing %s log %s", log_type, path)
+    try:
+        with open_log(path) as log_file:
+            for record in parser.parse(lines(log_file)):
+                writer.write(record)
+        writer.close()
+    except Exception:
+        logger.exception("RQ worker: log import failed for %s", path)
+        raise
+    finally:
+        publish_progress()
+        Path(path).unlink(missing_ok=True)
+    return build_result(log_type, parser.stats(), writer.records_created)
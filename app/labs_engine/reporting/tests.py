@@ -1,3 +1,1012 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import Mock, patch
+from datetime import date, timedelta
+from pathlib import Path
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from django.http import JsonResponse
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from labs_engine.app.test import TestCase
+from labs_engine.labs.models import CachedLab
+from . import archive
+from .auth import authenticated, last_used, token_cache
+from .bots import is_bot
+from .db import (
+    REPORTING_DB_ALIAS,
+    ReportingRouter,
+    copy_rows,
+    is_postgresql,
+    reporting_db,
+)
+from .funnel import FunnelTracker
+from .heatmap import HourlyCounter, truncate_hour
+from .hll import HyperLogLog
+from .log_formats import detect_format
+from .management.commands.tail_logs import LogSource
+from .models import (
+    APIToken,
+    HourlyCount,
+    Lab,
+    LabFunnel,
+    LabVisit,
+    Tool,
+    ToolTrend,
+    ToolUsage,
+    UniqueVisitorSketch,
+)
+from .nginx_logs import (
+    LOG_TYPE,
+    LogParser,
+    LogWriter,
+    parse_tool_log,
+    parse_welcome_log,
+)
+from .tasks import run_import_logs
+from .trending import TrendCounter
+
+TEST_TOOL_ID = 'toolshed.g2.bx.psu.edu/repos/iuc/fastp/fastp'
+TEST_BROWSER_UA = (
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36'
+    ' (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+TEST_BOT_UA = (
+    'Mozilla/5.0 (compatible; AhrefsBot/7.0; +http://ahrefs.com/robot/)')
+TEST_WELCOME_LOG_LINE = (
+    '116.179.33.78 - - [30/Dec/2025:13:07:59 +0000]'
+    ' "GET /static/welcome.html HTTP/1.1" 200 592'
+    ' "https://proteomics.usegalaxy.org.au/" "{user_agent}"'
+)
+
+
+def merge_interleaved(model, first, second):
+    """Run two merges as if ``second`` commits while ``first`` is running.
+
+    ``second`` runs just before ``first`` first inserts rows, i.e. after
+    ``first`` may have looked for the rows it needs to update.
+    """
+    bulk_create = model.objects.bulk_create
+    interleaved = []
+
+    def bulk_create_after_second(*args, **kwargs):
+        if not interleaved:
+            interleaved.append(True)
+            second()
+        return bulk_create(*args, **kwargs)
+
+    with patch.object(model.objects, 'bulk_create', bulk_create_after_second):
+        first()
+
+
+class ArchiveTestCase(TestCase):
+    """Test archiving of old reporting events to Parquet."""
+
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.old = self.now - timedelta(days=400)
+        genome = Lab.objects.create(name='genome')
+        proteomics = Lab.objects.create(name='proteomics')
+        tool = Tool.objects.create(
+            tool_id=TEST_TOOL_ID,
+            name=Tool.parse_tool_name(TEST_TOOL_ID),
+        )
+        LabVisit.objects.bulk_create(
+            [LabVisit(lab=genome, datetime=self.old)] * 3
+            + [LabVisit(lab=proteomics, datetime=self.old)]
+            + [LabVisit(lab=genome, datetime=self.now)] * 2
+        )
+        ToolUsage.objects.bulk_create([
+            ToolUsage(lab=genome, tool=tool, datetime=self.old),
+        ] * 2)
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(settings.REPORTING_ARCHIVE_ROOT, ignore_errors=True)
+
+    def test_it_archives_old_events(self):
+        call_command('archive_events', days=365, stdout=StringIO())
+        self.assertEqual(LabVisit.objects.count(), 2)
+        self.assertEqual(ToolUsage.objects.count(), 0)
+        self.assertTrue(archive.exists(LabVisit))
+        self.assertEqual(
+            archive.labs(LabVisit),
+            {'genome', 'proteomics'},
+        )
+        counts = archive.count_events(LabVisit, ('lab_name',))
+        self.assertEqual(
+            {row['lab_name']: row['count'] for row in counts},
+            {'genome': 3, 'proteomics': 1},
+        )
+
+    def test_usage_api_reads_archived_events(self):
+        archive.archive_events(LabVisit, self.now - timedelta(days=365))
+        archive.archive_events(ToolUsage, self.now - timedelta(days=365))
+        response = self.client.get(
+            '/reporting/api/usage?metric=visits&lab=genome&days=500')
+        self.assertEqual(response.status_code, 200)
+        traces = response.json()['traces']
+        self.assertEqual(len(traces), 1)
+        self.assertEqual(sum(traces[0]['y']), 5)
+
+        response = self.client.get('/reporting/api/tools?window=500')
+        tools = response.json()['tools']
+        self.assertEqual(tools[0]['tool_id'], TEST_TOOL_ID)
+        self.assertEqual(tools[0]['count'], 2)
+
+    def test_archive_range_filter(self):
+        archive.archive_events(LabVisit, self.now - timedelta(days=365))
+        counts = archive.count_events(
+            LabVisit,
+            ('date',),
+            start=self.now - timedelta(days=30),
+            end=self.now,
+        )
+        self.assertEqual(counts, [])
+
+    def test_interrupted_archive_is_recovered(self):
+        before = self.now - timedelta(days=365)
+        with patch.object(archive, '_promote', side_effect=OSError):
+            with self.assertRaises(OSError):
+                archive.archive_events(LabVisit, before)
+        # The rows are deleted but their files are still hidden
+        self.assertEqual(LabVisit.objects.count(), 2)
+        self.assertFalse(archive.exists(LabVisit))
+
+        # A crash before the delete committed leaves rows and a hidden file
+        with patch.object(archive.transaction, 'atomic', side_effect=OSError):
+            with self.assertRaises(OSError):
+                archive.archive_events(ToolUsage, before)
+        self.assertEqual(ToolUsage.objects.count(), 2)
+
+        self.assertEqual(archive.archive_events(LabVisit, before), 0)
+        counts = archive.count_events(LabVisit, ('lab_name',))
+        self.assertEqual(
+            {row['lab_name']: row['count'] for row in counts},
+            {'genome': 3, 'proteomics': 1},
+        )
+        self.assertEqual(archive.archive_events(ToolUsage, before), 2)
+        self.assertEqual(
+            archive.count_events(ToolUsage, ()), [{'count': 2}])
+        self.assertFalse(list(archive.archive_dir(ToolUsage).glob('**/.*')))
+
+
+class ReportingRouterTestCase(TestCase):
+    """Test routing of reporting models to the reporting database."""
+
+    def setUp(self):
+        super().setUp()
+        self.router = ReportingRouter()
+
+    def test_without_reporting_database(self):
+        with patch('labs_engine.reporting.db.reporting_db',
+                   return_value=DEFAULT_DB_ALIAS):
+            self.assertEqual(
+                self.router.db_for_read(LabVisit), DEFAULT_DB_ALIAS)
+            self.assertEqual(
+                self.router.db_for_write(APIToken), DEFAULT_DB_ALIAS)
+            self.assertIsNone(
+                self.router.allow_migrate(DEFAULT_DB_ALIAS, 'reporting'))
+            self.assertIsNone(
+                self.router.allow_migrate(DEFAULT_DB_ALIAS, 'labs'))
+
+    def test_with_reporting_database(self):
+        with patch('labs_engine.reporting.db.reporting_db',
+                   return_value=REPORTING_DB_ALIAS):
+            self.assertEqual(
+                self.router.db_for_read(LabVisit), REPORTING_DB_ALIAS)
+            self.assertEqual(
+                self.router.db_for_write(APIToken), REPORTING_DB_ALIAS)
+            self.assertIsNone(self.router.db_for_read(CachedLab))
+            self.assertIsNone(self.router.db_for_write(CachedLab))
+            self.assertTrue(
+                self.router.allow_migrate(REPORTING_DB_ALIAS, 'reporting'))
+            self.assertFalse(
+                self.router.allow_migrate(DEFAULT_DB_ALIAS, 'reporting'))
+            self.assertFalse(
+                self.router.allow_migrate(REPORTING_DB_ALIAS, 'labs'))
+            self.assertIsNone(
+                self.router.allow_migrate(DEFAULT_DB_ALIAS, 'labs'))
+
+    def test_relations(self):
+        lab = Lab(name='genome')
+        self.assertTrue(
+            self.router.allow_relation(lab, LabVisit(lab=lab)))
+        self.assertIsNone(
+            self.router.allow_relation(lab, CachedLab()))
+
+    @skipUnless(is_postgresql(), 'requires a PostgreSQL reporting database')
+    def test_copy_rows(self):
+        lab = Lab.objects.create(name='genome')
+        now = timezone.now()
+        copy_rows(
+            LabVisit,
+            ('lab', 'datetime'),
+            [(lab.id, now), (lab.id, now - timedelta(hours=1))],
+        )
+        self.assertEqual(
+            sorted(LabVisit.objects.values_list('datetime', flat=True)),
+            [now - timedelta(hours=1), now],
+        )
+
+
+class APITokenAuthTestCase(TestCase):
+    """Test API token authentication."""
+
+    def setUp(self):
+        super().setUp()
+        token_cache.clear()
+        self.token = APIToken.objects.create(name='galaxy')
+        self.view = authenticated(lambda request: JsonResponse({}))
+
+    def request(self, token_value):
+        request = RequestFactory().post(
+            '/reporting/api/upload', headers={'X-API-KEY': token_value})
+        return self.view(request)
+
+    def test_tokens_are_stored_hashed(self):
+        self.assertEqual(len(self.token.token), 64)
+        stored = APIToken.objects.get()
+        self.assertNotEqual(stored.token_hash, self.token.token)
+        self.assertEqual(
+            stored.token_hash, APIToken.hash_token(self.token.token))
+        self.assertEqual(stored.prefix, self.token.token[:8])
+
+    def test_authentication_is_cached(self):
+        self.assertEqual(self.request('invalid').status_code, 401)
+        self.assertEqual(self.request(self.token.token).status_code, 200)
+        with self.assertNumQueries(0, using=reporting_db()):
+            self.assertEqual(
+                self.request(self.token.token).status_code, 200)
+
+    def test_deactivated_token_is_rejected(self):
+        self.assertEqual(self.request(self.token.token).status_code, 200)
+        stored = APIToken.objects.get()
+        stored.is_active = False
+        stored.save()
+        self.assertEqual(self.request(self.token.token).status_code, 401)
+
+    def test_last_used_is_written_behind(self):
+        self.request(self.token.token)
+        last_used.flush()
+        self.assertIsNotNone(APIToken.objects.get().last_used)
+
+    def test_last_used_is_written_in_one_query(self):
+        other = APIToken.objects.create(name='other')
+        self.request(self.token.token)
+        self.request(other.token)
+        with self.assertNumQueries(1, using=reporting_db()):
+            last_used.flush()
+        self.assertFalse(
+            APIToken.objects.filter(last_used__isnull=True).exists())
+        with self.assertNumQueries(0, using=reporting_db()):
+            last_used.flush()
+
+    def test_failed_flush_keeps_last_used(self):
+        self.request(self.token.token)
+        last_used.interval = 0
+        try:
+            with patch.object(
+                APIToken.objects,
+                'bulk_update',
+                side_effect=DatabaseError('database is locked'),
+            ):
+                self.assertEqual(
+                    self.request(self.token.token).status_code, 200)
+        finally:
+            last_used.interval = settings.API_TOKEN_LAST_USED_FLUSH_SECONDS
+        self.assertIsNone(APIToken.objects.get().last_used)
+        last_used.flush()
+        self.assertIsNotNone(APIToken.objects.get().last_used)
+
+
+class BotClassifierTestCase(TestCase):
+    """Test user agent classification."""
+
+    def test_it_classifies_user_agents(self):
+        self.assertFalse(is_bot(TEST_BROWSER_UA))
+        self.assertFalse(is_bot(
+            'Mozilla/5.0 (Linux; Android 10; Cubot X30) AppleWebKit/537.36'))
+        self.assertTrue(is_bot(TEST_BOT_UA))
+        self.assertTrue(is_bot(
+            'Mozilla/5.0 (compatible; Googlebot/2.1;'
+            ' +http://www.google.com/bot.html)'))
+        self.assertTrue(is_bot('python-requests/2.31.0'))
+        self.assertTrue(is_bot('curl/8.4.0'))
+        self.assertTrue(is_bot('-'))
+
+    def test_ingestion_skips_bots(self):
+        lines = [
+            TEST_WELCOME_LOG_LINE.format(user_agent=TEST_BROWSER_UA),
+            TEST_WELCOME_LOG_LINE.format(user_agent=TEST_BOT_UA),
+        ]
+        result = parse_welcome_log(lines)
+        self.assertEqual(result['visits_created'], 1)
+        self.assertEqual(result['bots_skipped'], 1)
+        self.assertEqual(LabVisit.objects.get().lab.name, 'proteomics')
+
+    def test_it_imports_without_django(self):
+        # scripts/user_metrics.py uses the classifier outside of Django
+        env = {
+            key: value for key, value in os.environ.items()
+            if key != 'DJANGO_SETTINGS_MODULE'
+        }
+        result = subprocess.run(
+            [
+                sys.executable,
+                '-c',
+                'import sys, labs_engine.reporting.bots;'
+                ' sys.exit("django" in sys.modules)',
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        self.assertEqual(result.returncode, 0)
+
+
+class LogFormatTestCase(TestCase):
+    """Test parsing and detection of log formats."""
+
+    def json_line(self, **fields):
+        return json.dumps({
+            'remote_addr': '2001:db8::1',
+            'time_iso8601': '2025-12-30T23:07:59+10:00',
+            'request': 'GET /static/welcome.html HTTP/1.1',
+            'status': '200',
+            'http_referer': 'https://genome.usegalaxy.org.au/',
+            'http_user_agent': TEST_BROWSER_UA,
+            **fields,
+        })
+
+    def test_it_parses_ipv6_combined_lines(self):
+        line = TEST_WELCOME_LOG_LINE.replace(
+            '116.179.33.78', '2001:db8:85a3::8a2e:370:7334',
+        ).format(user_agent=TEST_BROWSER_UA)
+        result = parse_welcome_log([line])
+        self.assertEqual(result['log_format'], 'combined')
+        self.assertEqual(result['visits_created'], 1)
+
+    def test_it_detects_and_parses_json_lines(self):
+        lines = [
+            self.json_line(),
+            self.json_line(
+                request='GET /api/tools?x=1 HTTP/1.1',
+                http_referer=(
+                    'https://genome.usegalaxy.org.au/?tool_id='
+                    + TEST_TOOL_ID + '/1.0.0'),
+            ),
+        ]
+        self.assertEqual(detect_format(lines).name, 'json')
+        result = parse_welcome_log(lines)
+        self.assertEqual(result['log_format'], 'json')
+        self.assertEqual(result['visits_created'], 1)
+        visit = LabVisit.objects.get()
+        self.assertEqual(visit.lab.name, 'genome')
+        # Timestamps are converted to UTC from the logged offset
+        self.assertEqual(visit.datetime.hour, 13)
+
+        result = parse_tool_log(lines)
+        self.assertEqual(result['tool_usages_created'], 1)
+        self.assertEqual(ToolUsage.objects.get().tool.tool_id, TEST_TOOL_ID)
+
+    def test_it_reports_unmatched_lines(self):
+        line = TEST_WELCOME_LOG_LINE.format(user_agent=TEST_BROWSER_UA)
+        lines = [line] * 3 + ['garbled /static/welcome.html line', '']
+        result = parse_welcome_log(lines)
+        self.assertEqual(result['status'], 'partial')
+        self.assertEqual(result['lines_processed'], 5)
+        self.assertEqual(result['lines_matched'], 3)
+        self.assertEqual(result['lines_unmatched'], 1)
+        self.assertEqual(result['match_rate'], 0.75)
+
+
+@override_settings(NOCACHE=False)
+class ReportCacheTestCase(TestCase):
+    """Test caching of usage and CSV reports between imports."""
+
+    USAGE_URL = (
+        '/reporting/api/usage?metric=visits'
+        '&start_date=2025-12-01&end_date=2025-12-31')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.line = TEST_WELCOME_LOG_LINE.format(user_agent=TEST_BROWSER_UA)
+        with self.captureOnCommitCallbacks(
+                using=reporting_db(), execute=True):
+            parse_welcome_log([self.line])
+
+    def tearDown(self):
+        cache.clear()
+        super().tearDown()
+
+    def get_total(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return sum(response.json()['traces'][0]['y'])
+
+    def test_reports_are_cached_until_import(self):
+        self.assertEqual(self.get_total(self.USAGE_URL), 1)
+        with self.assertNumQueries(0, using=reporting_db()):
+            self.assertEqual(self.get_total(self.USAGE_URL), 1)
+            # Irrelevant parameters share the cached result
+            self.assertEqual(
+                self.get_total(self.USAGE_URL + '&tool=all&lab=all'), 1)
+
+        with self.captureOnCommitCallbacks(
+                using=reporting_db(), execute=True):
+            parse_welcome_log([self.line])
+        self.assertEqual(self.get_total(self.USAGE_URL), 2)
+
+        csv_url = self.USAGE_URL.replace('api/usage', 'api/download-csv')
+        self.assertIn(
+            '2025-12-30,proteomics,2',
+            self.client.get(csv_url).content.decode())
+        with self.assertNumQueries(0, using=reporting_db()):
+            self.client.get(csv_url)
+
+    def test_day_windows_are_snapped_to_day_boundaries(self):
+        data = self.client.get(
+            '/reporting/api/usage?metric=visits&days=7').json()
+        today = timezone.localdate()
+        self.assertEqual(
+            data['start_date'],
+            f'{today - timedelta(days=7)}T00:00:00+00:00')
+        self.assertEqual(data['end_date'], f'{today}T23:59:59+00:00')
+
+
+class TrendingToolsTestCase(TestCase):
+    """Test precomputed top tools and trending scores."""
+
+    OLD_TOOL_ID = 'toolshed.g2.bx.psu.edu/repos/devteam/bwa/bwa'
+
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        lines = (
+            [self.tool_line(self.OLD_TOOL_ID, now - timedelta(days=60))] * 5
+            + [self.tool_line(TEST_TOOL_ID, now - timedelta(hours=1))] * 2
+            + [self.tool_line(TEST_TOOL_ID, now, lab='proteomics')]
+        )
+        parse_tool_log(lines)
+
+    def tool_line(self, tool_id, dt, lab='genome'):
+        return (
+            f'10.0.0.1 - - [{dt:%d/%b/%Y:%H:%M:%S +0000}]'
+            ' "POST /api/tools HTTP/1.1" 200 592'
+            f' "https://{lab}.usegalaxy.org.au/?tool_id={tool_id}/1.0"'
+            f' "{TEST_BROWSER_UA}"'
+        )
+
+    def get_tools(self, query=''):
+        response = self.client.get(f'/reporting/api/tools?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['tools']
+
+    def test_tools_are_ranked_by_count_or_trend(self):
+        tools = self.get_tools('lab=genome')
+        self.assertEqual(
+            [(t['tool_id'], t['count']) for t in tools],
+            [(self.OLD_TOOL_ID, 5), (TEST_TOOL_ID, 2)],
+        )
+        tools = self.get_tools('window=trending')
+        self.assertEqual(tools[0]['tool_id'], TEST_TOOL_ID)
+        self.assertEqual(tools[0]['count'], 3)
+        self.assertAlmostEqual(tools[0]['score'], 3, delta=0.1)
+        self.assertLess(tools[1]['score'], 1)
+
+        self.assertEqual(len(self.get_tools('limit=1')), 1)
+        tools = self.get_tools('window=30')
+        self.assertEqual([t['tool_id'] for t in tools], [TEST_TOOL_ID])
+        response = self.client.get('/reporting/api/tools?window=soon')
+        self.assertEqual(response.status_code, 400)
+
+    def test_ingest_interns_labs_and_tools(self):
+        self.assertEqual(
+            set(Lab.objects.values_list('name', flat=True)),
+            {'genome', 'proteomics'},
+        )
+        self.assertEqual(Tool.objects.count(), 2)
+        self.assertEqual(
+            Tool.objects.get(tool_id=TEST_TOOL_ID).name, 'iuc/fastp/fastp')
+        response = self.client.get(
+            '/reporting/api/download-csv?metric=tools&days=90')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            f'genome,{TEST_TOOL_ID},2', response.content.decode())
+
+    def test_rebuild_matches_incremental_trends(self):
+        now = timezone.now()
+        incremental = {
+            (t.lab_name, t.tool_id): t for t in ToolTrend.objects.all()}
+        call_command('rebuild_tool_trends', stdout=StringIO())
+        rebuilt = {
+            (t.lab_name, t.tool_id): t for t in ToolTrend.objects.all()}
+        self.assertEqual(rebuilt.keys(), incremental.keys())
+        for key, trend in rebuilt.items():
+            self.assertEqual(trend.count, incremental[key].count)
+            # Rebuilt scores have daily resolution
+            self.assertAlmostEqual(
+                trend.score(now),
+                incremental[key].score(now),
+                delta=incremental[key].score(now) * 0.1,
+            )
+
+    def test_tools_are_counted_from_events_until_trends_are_built(self):
+        expected = {
+            query: self.get_tools(query)
+            for query in ('lab=genome', 'window=trending', 'limit=1')
+        }
+        ToolTrend.objects.all().delete()
+        for query, tools in expected.items():
+            rebuilt = self.get_tools(query)
+            self.assertEqual(
+                [(t['tool_id'], t['count']) for t in rebuilt],
+                [(t['tool_id'], t['count']) for t in tools],
+            )
+
+    def test_concurrent_merges_of_a_new_tool(self):
+        now = timezone.now()
+
+        def merge():
+            counts = TrendCounter(settings.REPORTING_TRENDING_HALF_LIFE_DAYS)
+            counts.add('genome', 'new/tool', 'new', now)
+            ToolTrend.merge_counts(counts)
+
+        merge_interleaved(ToolTrend, merge, merge)
+        trends = ToolTrend.objects.filter(tool_id='new/tool')
+        self.assertEqual(len(trends), 2)  # genome and all labs
+        for trend in trends:
+            self.assertEqual(trend.count, 2)
+            self.assertAlmostEqual(trend.score(now), 2, delta=0.01)
+
+
+class UniqueVisitorsTestCase(TestCase):
+    """Test unique visitor estimation with HyperLogLog sketches."""
+
+    def test_hll_estimate_and_merge(self):
+        a = HyperLogLog()
+        b = HyperLogLog()
+        for i in range(20000):
+            a.add(f'client-{i}')
+        for i in range(10000, 30000):
+            b.add(f'client-{i}')
+        self.assertAlmostEqual(a.count(), 20000, delta=20000 * 0.05)
+        restored = HyperLogLog(a.to_bytes())
+        self.assertEqual(restored.count(), a.count())
+        self.assertAlmostEqual(
+            restored.merge(b).count(), 30000, delta=30000 * 0.05)
+
+    def test_ingestion_estimates_unique_visitors(self):
+        lines = [
+            TEST_WELCOME_LOG_LINE.format(user_agent=TEST_BROWSER_UA),
+            TEST_WELCOME_LOG_LINE.format(user_agent=TEST_BROWSER_UA),
+            TEST_WELCOME_LOG_LINE.replace('116.179.33.78', '10.0.0.1')
+            .format(user_agent=TEST_BROWSER_UA),
+        ]
+        parse_welcome_log(lines)
+        # Re-importing the same lines must not inflate unique visitors
+        parse_welcome_log(lines)
+        response = self.client.get(
+            '/reporting/api/usage?metric=visitors'
+            '&start_date=2025-12-01&end_date=2025-12-31')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['totals'], {'proteomics': 2})
+        self.assertEqual(sum(data['traces'][0]['y']), 2)
+
+    def test_concurrent_merges_of_a_new_day(self):
+        def merge(client):
+            sketch = HyperLogLog()
+            sketch.add(client)
+            UniqueVisitorSketch.merge_sketches(
+                {('genome', date(2025, 12, 30)): sketch})
+
+        merge_interleaved(
+            UniqueVisitorSketch,
+            lambda: merge('client-1'),
+            lambda: merge('client-2'),
+        )
+        self.assertEqual(UniqueVisitorSketch.objects.get().sketch.count(), 2)
+
+
+class HeatmapTestCase(TestCase):
+    """Test hourly rollups and traffic heatmaps."""
+
+    URL = (
+        '/reporting/api/heatmap?start_date=2025-12-01&end_date=2025-12-31')
+
+    def setUp(self):
+        super().setUp()
+        # Tuesday 30 December 2025, 13:07 UTC
+        parse_welcome_log(
+            [TEST_WELCOME_LOG_LINE.format(user_agent=TEST_BROWSER_UA)] * 2)
+        parse_tool_log([
+            '10.0.0.1 - - [30/Dec/2025:13:30:00 +0000]'
+            ' "POST /api/tools HTTP/1.1" 200 592'
+            f' "https://genome.usegalaxy.org.au/?tool_id={TEST_TOOL_ID}/1.0"'
+            f' "{TEST_BROWSER_UA}"'
+        ])
+
+    def get_heatmap(self, query=''):
+        response = self.client.get(f'{self.URL}&{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_heatmap_counts_by_weekday_and_hour(self):
+        with self.assertNumQueries(1, using=reporting_db()):
+            data = self.get_heatmap('metric=visits')
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['z'][1][13], 2)
+        data = self.get_heatmap('metric=visits&tz=Australia/Brisbane')
+        self.assertEqual(data['z'][1][23], 2)
+        data = self.get_heatmap(f'metric=tools&lab=genome&tool={TEST_TOOL_ID}')
+        self.assertEqual(data['z'][1][13], 1)
+        data = self.get_heatmap('metric=tools&lab=other')
+        self.assertEqual(data['total'], 0)
+        response = self.client.get(f'{self.URL}&tz=Mars/Olympus')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rebuild_matches_incremental_counts(self):
+        def counts():
+            return set(HourlyCount.objects.values_list(
+                'metric', 'lab_name', 'tool_id', 'hour', 'count'))
+
+        incremental = counts()
+        self.assertEqual(len(incremental), 6)
+        call_command('rebuild_hourly_counts', stdout=StringIO())
+        self.assertEqual(counts(), incremental)
+
+    def test_events_are_counted_until_rollups_are_built(self):
+        queries = (
+            'metric=visits',
+            'metric=visits&tz=Australia/Brisbane',
+            'metric=visits&tool=all&lab=genome',
+            f'metric=tools&lab=genome&tool={TEST_TOOL_ID}',
+            f'metric=visits&tool={TEST_TOOL_ID}',
+        )
+        expected = {query: self.get_heatmap(query) for query in queries}
+        HourlyCount.objects.all().delete()
+        for query, data in expected.items():
+            self.assertEqual(self.get_heatmap(query)['z'], data['z'])
+
+    def test_each_batch_commits_with_its_rollups(self):
+        line = TEST_WELCOME_LOG_LINE.format(user_agent=TEST_BROWSER_UA)
+        records = list(LogParser(LOG_TYPE.WELCOME).parse([line] * 2))
+        writer = LogWriter(LOG_TYPE.WELCOME, batch_size=1)
+        writer.write(records[0])
+        with patch.object(
+            HourlyCount.objects, 'bulk_update', side_effect=DatabaseError,
+        ):
+            with self.assertRaises(DatabaseError):
+                writer.write(records[1])
+        self.assertEqual(LabVisit.objects.count(), 3)
+        data = self.get_heatmap('metric=visits')
+        self.assertEqual(data['total'], 3)
+
+    def test_concurrent_merges_of_a_new_hour(self):
+        def merge():
+            counts = HourlyCounter()
+            counts.add('genome', HourlyCount.ALL_TOOLS, now)
+            HourlyCount.merge_counts(HourlyCount.VISITS, counts)
+
+        now = timezone.now()
+        merge_interleaved(HourlyCount, merge, merge)
+        counts = HourlyCount.objects.filter(hour=truncate_hour(now))
+        self.assertEqual(len(counts), 2)  # genome and all labs
+        for count in counts:
+            self.assertEqual(count.count, 2)
+
+
+class ImportLogsCommandTestCase(TestCase):
+    """Test bulk import of log files from disk."""
+
+    def setUp(self):
+        super().setUp()
+        self.log_dir = Path(tempfile.mkdtemp())
+        line = TEST_WELCOME_LOG_LINE.format(user_agent=TEST_BROWSER_UA)
+        (self.log_dir / 'access.log').write_text(line + '\n')
+        with gzip.open(self.log_dir / 'access.log.1.gz', 'wt') as f:
+            f.write((line + '\n') * 3)
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def test_it_imports_globs_and_directories(self):
+        stdout = StringIO()
+        call_command(
+            'import_logs',
+            str(self.log_dir / 'access.log*'),
+            str(self.log_dir),
+            type='visit',
+            workers=1,
+            stdout=stdout,
+        )
+        # Duplicate matches from the glob and directory are imported once
+        self.assertEqual(LabVisit.objects.count(), 4)
+        output = stdout.getvalue()
+        self.assertIn('access.log.1.gz [combined]: 3 lines', output)
+        self.assertIn('Log format: combined\n', output)
+        self.assertIn('lines/sec', output)
+
+
+class BenchmarkCommandTestCase(TestCase):
+    """Test synthetic log generation and the reporting benchmark."""
+
+    def setUp(self):
+        super().setUp()
+        self.log_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def test_generated_logs_can_be_imported(self):
+        call_command(
+            'generate_logs',
+            welcome=str(self.log_dir / 'welcome.log.gz'),
+            tool=str(self.log_dir / 'tool.log'),
+            lines=200,
+            bot_ratio=0.25,
+            seed=1,
+            stdout=StringIO(),
+        )
+        call_command(
+            'import_logs',
+            str(self.log_dir / 'tool.log'),
+            type='tool',
+            workers=1,
+            stdout=StringIO(),
+        )
+        call_command(
+            'import_logs',
+            str(self.log_dir / 'welcome.log.gz'),
+            type='visit',
+            workers=1,
+            stdout=StringIO(),
+        )
+        tool_usages = ToolUsage.objects.count()
+        visits = LabVisit.objects.count()
+        self.assertAlmostEqual(tool_usages, 150, delta=30)
+        self.assertAlmostEqual(visits, 150, delta=30)
+
+    def test_benchmark_writes_json_and_rolls_back(self):
+        output = self.log_dir / 'benchmark.json'
+        call_command(
+            'benchmark_reporting',
+            rows=[100, 300],
+            repeat=1,
+            output=str(output),
+            seed=1,
+            stdout=StringIO(),
+        )
+        results = json.loads(output.read_text())
+        # Bots are skipped at random, so the data size is approximate
+        for run, rows in zip(results['runs'], (100, 300), strict=True):
+            self.assertAlmostEqual(run['rows'], rows, delta=rows * 0.2)
+        run = results['runs'][-1]
+        self.assertGreater(
+            run['ingestion'][LOG_TYPE.TOOL]['lines_per_second'], 0)
+        self.assertEqual(
+            {endpoint['status'] for endpoint in run['endpoints'].values()},
+            {200},
+        )
+        self.assertEqual(
+            run['csv_peak_memory_bytes'].keys(),
+            {'visits', 'tools', 'visitors'},
+        )
+        self.assertFalse(LabVisit.objects.exists())
+
+
+class TailLogsCommandTestCase(TestCase):
+    """Test live tailing of log files across rotation and restarts."""
+
+    def setUp(self):
+        super().setUp()
+        self.log_dir = Path(tempfile.mkdtemp())
+        self.log_path = self.log_dir / 'welcome.log'
+        self.line = TEST_WELCOME_LOG_LINE.format(user_agent=TEST_BROWSER_UA)
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def append(self, path, count, partial=''):
+        with open(path, 'a') as f:
+            f.write((self.line + '\n') * count + partial)
+
+    def tail(self):
+        call_command(
+            'tail_logs',
+            welcome=str(self.log_path),
+            from_start=True,
+            once=True,
+            stdout=StringIO(),
+        )
+        return LabVisit.objects.count()
+
+    def test_it_resumes_from_checkpoint(self):
+        self.append(self.log_path, 2, partial=self.line[:20])
+        self.assertEqual(self.tail(), 2)
+        # Restarting doesn't re-import lines, and the partial line is
+        # imported once it is complete
+        self.assertEqual(self.tail(), 2)
+        with open(self.log_path, 'a') as f:
+            f.write(self.line[20:] + '\n')
+        self.assertEqual(self.tail(), 3)
+
+    def test_it_follows_rotation(self):
+        self.append(self.log_path, 2)
+        self.assertEqual(self.tail(), 2)
+        # Lines written before rotation are read from the rotated file
+        self.append(self.log_path, 1)
+        self.log_path.rename(self.log_dir / 'welcome.log.1')
+        self.append(self.log_path, 3)
+        self.assertEqual(self.tail(), 6)
+        self.assertEqual(self.tail(), 6)
+
+    def test_it_follows_truncation(self):
+        self.append(self.log_path, 2)
+        self.assertEqual(self.tail(), 2)
+        self.log_path.write_text('')
+        self.append(self.log_path, 1)
+        self.assertEqual(self.tail(), 3)
+
+    def test_it_detects_format_after_an_idle_poll(self):
+        line = json.dumps({
+            'remote_addr': '116.179.33.78',
+            'time_iso8601': '2025-12-30T13:07:59+00:00',
+            'request': 'GET /static/welcome.html HTTP/1.1',
+            'status': '200',
+            'http_referer': 'https://proteomics.usegalaxy.org.au/',
+            'http_user_agent': TEST_BROWSER_UA,
+        }) + '\n'
+        self.log_path.write_text(line)
+        source = LogSource(
+            str(self.log_path), LOG_TYPE.WELCOME, 'auto', start_at_end=True)
+        try:
+            self.assertEqual(source.read(), 0)
+            with open(self.log_path, 'a') as f:
+                f.write(line * 2)
+            self.assertEqual(source.read(), 2)
+        finally:
+            source.tailer.close()
+        self.assertEqual(source.parser.log_format.name, 'json')
+        self.assertEqual(len(source.records), 2)
+        self.assertEqual(source.parser.lines_unmatched, 0)
+
+
+class FunnelTestCase(TestCase):
+    """Test correlation of lab visits with tool launches."""
+
+    def setUp(self):
+        super().setUp()
+        self.log_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def tool_line(self, time, ip='116.179.33.78', lab='proteomics'):
+        return (
+            f'{ip} - - [30/Dec/2025:{time} +0000]'
+            ' "POST /api/tools HTTP/1.1" 200 592'
+            f' "https://{lab}.usegalaxy.org.au/?tool_id={TEST_TOOL_ID}/1.0"'
+            f' "{TEST_BROWSER_UA}"\n'
+        )
+
+    def test_tracker_window_is_bounded(self):
+        tracker = FunnelTracker(window_minutes=30, max_entries=2)
+        start = timezone.now()
+        for i in range(3):
+            tracker.visit('genome', f'client-{i}', start)
+        self.assertEqual(len(tracker), 2)
+        # The oldest visit was dropped, and late launches don't convert
+        tracker.launch('genome', 'client-0', start)
+        tracker.launch('genome', 'client-1', start + timedelta(hours=1))
+        tracker.launch('genome', 'client-2', start + timedelta(minutes=5))
+        (counts,) = tracker.pop_counts().values()
+        self.assertEqual(counts['visits'], 3)
+        self.assertEqual(counts['converted_visits'], 1)
+        self.assertEqual(counts['tool_launches'], 3)
+
+    def test_concurrent_merges_of_a_new_day(self):
+        def merge():
+            LabFunnel.merge_counts({
+                ('genome', date(2025, 12, 30)): {
+                    'visits': 2,
+                    'converted_visits': 1,
+                },
+            })
+
+        merge_interleaved(LabFunnel, merge, merge)
+        funnel = LabFunnel.objects.get()
+        self.assertEqual((funnel.visits, funnel.converted_visits), (4, 2))
+
+    def test_tail_logs_counts_conversions(self):
+        welcome_log = self.log_dir / 'welcome.log'
+        tool_log = self.log_dir / 'tool.log'
+        visit = TEST_WELCOME_LOG_LINE.format(user_agent=TEST_BROWSER_UA)
+        welcome_log.write_text(
+            visit + '\n' + visit.replace('116.179.33.78', '10.0.0.1') + '\n')
+        tool_log.write_text(
+            self.tool_line('13:20:00')
+            + self.tool_line('13:25:00')
+            + self.tool_line('13:26:00', ip='10.0.0.1', lab='genome')
+            + self.tool_line('15:00:00')
+        )
+        call_command(
+            'tail_logs',
+            welcome=str(welcome_log),
+            tool=str(tool_log),
+            from_start=True,
+            once=True,
+            stdout=StringIO(),
+        )
+        funnel = LabFunnel.objects.get(lab_name='proteomics')
+        self.assertEqual(
+            (
+                funnel.visits,
+                funnel.converted_visits,
+                funnel.tool_launches,
+                funnel.attributed_launches,
+            ),
+            (2, 1, 3, 2),
+        )
+        response = self.client.get(
+            '/reporting/api/funnel?start_date=2025-12-01&end_date=2025-12-31')
+        self.assertEqual(response.status_code, 200)
+        labs = {lab['lab_name']: lab for lab in response.json()['labs']}
+        self.assertEqual(labs['proteomics']['conversion_rate'], 0.5)
+        self.assertIsNone(labs['genome']['conversion_rate'])
+
+
+class UploadLogsTestCase(TestCase):
+    """Test queueing of uploaded logs for import by a worker."""
+
+    def setUp(self):
+        super().setUp()
+        token_cache.clear()
+        self.token = APIToken.objects.create(name='galaxy')
+
+    @patch('labs_engine.reporting.api.django_rq.get_queue')
+    def test_upload_is_spooled_and_imported_by_worker(self, get_queue):
+        get_queue.return_value.enqueue.return_value = Mock(id='abc123')
+        line = TEST_WELCOME_LOG_LINE.format(user_agent=TEST_BROWSER_UA)
+        response = self.client.post(
+            '/reporting/api/logs/upload',
+            {
+                'log_type': 'nginx_welcome',
+                'file': SimpleUploadedFile(
+                    'access.log.gz', gzip.compress((line + '\n').encode())),
+            },
+            headers={'X-API-KEY': self.token.token},
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['job_id'], 'abc123')
+        self.assertEqual(
+            response.json()['status_url'],
+            '/reporting/api/logs/status/abc123')
+        self.assertEqual(LabVisit.objects.count(), 0)
+
+        func, path, log_type, log_format = (
+            get_queue.return_value.enqueue.call_args.args)
+        self.assertIs(func, run_import_logs)
+        self.assertTrue(path.endswith('.gz'))
+        result = run_import_logs(path, log_type, log_format)
+        self.assertEqual(result['visits_created'], 1)
+        self.assertEqual(LabVisit.objects.count(), 1)
+        self.assertFalse(Path(path).exists())
@@ -0,0 +1,73 @@
+"""Exponentially decayed "trending" scores for tools.
+
+The trending score of a tool at time ``now`` is the sum over its uses at
+times ``t`` of ``exp(-rate * (now - t))``, where ``rate = ln(2) / half_life``
+i.e. a use counts half as much after each half-life.
+
+Scores are stored relative to a fixed epoch as ``log(sum(exp(rate * (t -
+EPOCH))))``, which doesn't change as time passes. That means new uses can be
+added incrementally, and tools can be ranked by the stored value without
+decaying every score to the current time first. The log keeps the value in
+range of a float however far ``t`` is from the epoch.
+"""
+
+import math
+from datetime import datetime, timezone
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+ALL_LABS = ''
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def log_weight(dt, half_life_days):
+    """Return the log weight of one use at datetime ``dt``."""
+    rate = math.log(2) / (half_life_days * SECONDS_PER_DAY)
+    return rate * (dt - EPOCH).total_seconds()
+
+
+def logaddexp(a, b):
+    """Return log(exp(a) + exp(b)) without overflow."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def decayed_score(log_score, now, half_life_days):
+    """Return the trending score at ``now`` from a stored log score."""
+    return math.exp(log_score - log_weight(now, half_life_days))
+
+
+class TrendCounter:
+    """Accumulate tool use counts and log scores per (lab_name, tool_id).
+
+    Every use is also counted under ``ALL_LABS``.
+    """
+
+    def __init__(self, half_life_days):
+        """Create an empty counter."""
+        self.half_life_days = half_life_days
+        # (lab_name, tool_id) -> [tool_name, count, log_score, last_used]
+        self._counts = {}
+
+    def add(self, lab_name, tool_id, tool_name, dt, count=1):
+        """Count ``count`` uses of a tool at datetime ``dt``."""
+        weight = log_weight(dt, self.half_life_days) + math.log(count)
+        for key in ((lab_name, tool_id), (ALL_LABS, tool_id)):
+            entry = self._counts.get(key)
+            if entry is None:
+                self._counts[key] = [tool_name, count, weight, dt]
+            else:
+                entry[1] += count
+                entry[2] = logaddexp(entry[2], weight)
+                entry[3] = max(entry[3], dt)
+
+    def items(self):
+        """Return accumulated entries keyed by (lab_name, tool_id)."""
+        return self._counts.items()
+
+    def __bool__(self):
+        """Return True if anything has been counted."""
+        return bool(self._counts)
@@ -8,6 +8,13 @@ urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     path('api/usage', api.get_usage_data, name='usage_data'),
     path('api/tools', api.get_tools_list, name='tools_list'),
+    path('api/heatmap', api.get_heatmap_data, name='heatmap_data'),
+    path('api/funnel', api.get_funnel_data, name='funnel_data'),
     path('api/logs/upload', api.upload_logs, name='upload_logs'),
+    path(
+        'api/logs/status/<str:job_id>',
+        api.import_job_status,
+        name='import_job_status',
+    ),
     path('api/download-csv', api.download_csv, name='download_csv'),
 ]
@@ -1,7 +1,8 @@
 from django.shortcuts import render
 from django.db import models
 
-from .models import LabVisit, ToolUsage
+from . import archive
+from .models import Lab, LabVisit, ToolUsage
 
 
 def dashboard(request):
@@ -16,11 +17,23 @@ def dashboard(request):
         max_date=models.Max('datetime'),
     )
 
+    # Older events may have been moved to the archive
+    for model, data_range in (
+        (LabVisit, visit_range),
+        (ToolUsage, tool_range),
+    ):
+        if archived_min := archive.earliest(model):
+            data_range['min_date'] = archived_min
+            data_range['max_date'] = data_range['max_date'] or archived_min
+
     # Get list of labs for dropdown
-    labs = list(
-        LabVisit.objects.values_list('lab_name', flat=True)
-        .distinct()
-        .order_by('lab_name')
+    labs = sorted(
+        set(
+            Lab.objects.filter(visits__isnull=False)
+            .values_list('name', flat=True)
+            .distinct()
+        )
+        | archive.labs(LabVisit)
     )
 
     context = {
@@ -3,6 +3,19 @@
 from urllib.parse import urlparse, parse_qs
 
 
+def raw_github_url(url):
+    """Convert a GitHub web URL to the raw URL for fetching the file.
+
+    e.g. https://github.com/org/repo/blob/main/base.yml ->
+    https://raw.githubusercontent.com/org/repo/main/base.yml
+    """
+    if '//github.com' in url:
+        url = (
+            url.replace('github.com', 'raw.githubusercontent.com')
+            .replace('/blob/', '/'))
+    return url
+
+
 class EmbeddedYouTubeUrl:
     """Class to format youtube video URLs.
 
@@ -13,18 +13,12 @@ from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
 
+from labs_engine.reporting.bots import is_bot, user_agent_from_log_line
+
 
 DATA_DIR = Path('~/Downloads/labs_nginx_logs').expanduser()
 VISITS_PATH = DATA_DIR / 'labs-welcome-combined.log'
 CSV_VISITS = DATA_DIR / 'lab_visits.csv'
-BOTS_PATTERNS = [
-    r'googlebot/[\d.]+',
-    r'ahrefsbot/[\d.]+',
-    r'bitsightbot/[\d.]*',
-    r'bingbot/[\d.]+   ',
-    r'search\.marginalia\.nu',
-    r'\(.*?Android.*?\)\s.*?googlebot/[\d.]+',
-]
 LABS_TO_PLOT = [
     'https://genome.usegalaxy.org.au',
     'https://proteomics.usegalaxy.org.au',
@@ -60,7 +54,7 @@ def get_lab_name(line):
     if not lab_name:
         return None
 
-    if re.search(r'\b(?:' + '|'.join(BOTS_PATTERNS) + r')\b', line):
+    if is_bot(user_agent_from_log_line(line)):
         return None
 
     return lab_name.group(0)